@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class ProductsConfig(AppConfig):
     name = 'apps.products'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from database.mongo import add_event_listener
+        from .perf import MongoCommandTimer, install_db_wrapper
+        from .slow_queries import SlowMongoCommandLogger, install_slow_query_wrapper
+
+        connection_created.connect(install_db_wrapper, dispatch_uid='products_perf_db_wrapper')
+        connection_created.connect(install_slow_query_wrapper, dispatch_uid='products_slow_query_wrapper')
+        for listener in (MongoCommandTimer, SlowMongoCommandLogger):
+            if listener is not None:
+                add_event_listener(listener())
@@ -0,0 +1,195 @@
+"""
+Avatar storage kept outside profile rows.
+Uploaded images (usually base64 data URLs from the profile page) are written once to
+a storage backend under a content-hashed name, along with a few resized thumbnails.
+Profiles and Mongo users then only carry the short, immutable URL, which is served
+with long-lived cache headers.
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+DATA_URL_RE = re.compile(r'^data:(?P<type>image/[a-z0-9.+-]+);base64,(?P<data>.+)$', re.IGNORECASE | re.DOTALL)
+# <digest>.<ext> for originals, <digest>-<size>.<ext> for thumbnails
+AVATAR_NAME_RE = re.compile(r'^[0-9a-f]{32}(-\d{1,4})?\.(png|jpg|gif|webp)$')
+
+
+class AvatarError(ValueError):
+    """Raised when an uploaded avatar cannot be decoded or stored."""
+
+
+class AvatarStorage(ABC):
+    """
+    Minimal storage interface for avatar files.
+    Subclass and point AVATAR_STORAGE_BACKEND at it for object storage.
+    """
+
+    @abstractmethod
+    def exists(self, name):
+        ...
+
+    @abstractmethod
+    def save(self, name, data, content_type):
+        ...
+
+    @abstractmethod
+    def open(self, name):
+        """Return the stored bytes or None if the file does not exist."""
+
+    def url(self, name):
+        return f"{settings.AVATAR_URL}{name}"
+
+
+class LocalAvatarStorage(AvatarStorage):
+    """Stores avatars on the local filesystem under AVATAR_ROOT."""
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.AVATAR_ROOT)
+
+    def _path(self, name):
+        return self.root / name
+
+    def exists(self, name):
+        return self._path(name).exists()
+
+    def save(self, name, data, content_type):
+        self.root.mkdir(parents=True, exist_ok=True)
+        # A unique temp file per call: threads saving the same digest must not share one.
+        with tempfile.NamedTemporaryFile(dir=self.root, prefix=f".{name}.", suffix='.tmp', delete=False) as tmp:
+            tmp.write(data)
+        try:
+            # Atomic rename so concurrent readers never see a partial file.
+            os.replace(tmp.name, self._path(name))
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+
+    def open(self, name):
+        try:
+            return self._path(name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+
+_storage = None
+
+
+def get_avatar_storage():
+    """Return the configured storage backend (instantiated once per process)."""
+    global _storage
+    if _storage is None:
+        backend = getattr(settings, 'AVATAR_STORAGE_BACKEND', 'apps.products.avatars.LocalAvatarStorage')
+        _storage = import_string(backend)()
+    return _storage
+
+
+def is_data_url(value):
+    return isinstance(value, str) and value[:5].lower() == 'data:'
+
+
+def decode_data_url(value):
+    """Decode a base64 image data URL into (bytes, extension)."""
+    match = DATA_URL_RE.match(value.strip())
+    if not match:
+        raise AvatarError('Avatar must be a base64 image data URL')
+    ext = EXTENSIONS.get(match.group('type').lower())
+    if not ext:
+        raise AvatarError('Unsupported avatar image type')
+    try:
+        data = base64.b64decode(match.group('data'), validate=False)
+    except (binascii.Error, ValueError):
+        raise AvatarError('Avatar image data is not valid base64')
+    if not data:
+        raise AvatarError('Avatar image is empty')
+    if len(data) > settings.AVATAR_MAX_UPLOAD_BYTES:
+        raise AvatarError('Avatar image is too large')
+    return data, ext
+
+
+def _render_thumbnail(image, size):
+    thumb = image.copy()
+    thumb.thumbnail((size, size))
+    buffer = io.BytesIO()
+    thumb.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def store_avatar(data, ext):
+    """
+    Persist an avatar and its thumbnails; returns the URL profiles should carry.
+    Content-addressed, so re-uploading the same image is a no-op.
+    """
+    storage = get_avatar_storage()
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    sizes = tuple(getattr(settings, 'AVATAR_THUMBNAIL_SIZES', ()) or ())
+
+    if Image is None or not sizes:
+        name = f"{digest}.{ext}"
+        if not storage.exists(name):
+            storage.save(name, data, CONTENT_TYPES[ext])
+        return storage.url(name)
+
+    primary = f"{digest}-{sizes[0]}.png"
+    if storage.exists(primary):
+        return storage.url(primary)
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception:
+        raise AvatarError('Avatar image could not be decoded')
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    storage.save(f"{digest}.{ext}", data, CONTENT_TYPES[ext])
+    # Write the primary size last: its presence marks the set as complete.
+    for size in reversed(sizes):
+        storage.save(f"{digest}-{size}.png", _render_thumbnail(image, size), 'image/png')
+    return storage.url(primary)
+
+
+def avatar_url_for(value):
+    """
+    Normalize an avatar field value to a URL, moving inline data URLs into storage.
+    Returns (url, migrated) where migrated is True if the value was a data URL.
+    """
+    if not is_data_url(value):
+        return value or '', False
+    data, ext = decode_data_url(value)
+    return store_avatar(data, ext), True
+
+
+def content_type_for(name):
+    return CONTENT_TYPES.get(name.rsplit('.', 1)[-1], 'application/octet-stream')
@@ -0,0 +1,218 @@
+"""
+Response compression and HTML minification.
+`CompressionMiddleware` is Django's GZipMiddleware with the knobs this site needs:
+
+* Brotli (when the `brotli` package is installed and the client accepts `br`), else gzip
+* only COMPRESSION_CONTENT_TYPES at or above COMPRESSION_MIN_BYTES; the order event
+  stream (text/event-stream) and downloads stay as they are
+* streaming responses, sync or async, compressed chunk by chunk and flushed after
+  each one, so nothing is held back
+* rendered HTML optionally run through `minify_html` first (COMPRESSION_MINIFY_HTML)
+
+gzip output carries Django's random-length filename padding (BREACH mitigation, as in
+GZipMiddleware). `python manage.py benchmark_compression` reports bytes on the wire and
+CPU per response for each encoding.
+"""
+
+import re
+import statistics
+import time
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULT_CONTENT_TYPES = (
+    'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml',
+)
+GZIP_RANDOM_BYTES = 100
+_accept_token = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*')
+# Blocks whose whitespace matters (or might) are left alone by the minifier.
+_protected = re.compile(r'(<(pre|textarea|script)\b.*?</\2\s*>|<!--\[if.*?-->)', re.I | re.S)
+_style = re.compile(r'(<style\b[^>]*>)(.*?)(</style\s*>)', re.I | re.S)
+_comment = re.compile(r'<!--.*?-->', re.S)
+_line_break = re.compile(r'[ \t\r\f\v]*\n\s*')
+
+
+def minify_html(html):
+    """
+    Drops comments and the indentation / blank lines around line breaks. Runs of spaces
+    within a line are kept (they can be inside attribute values), and so is everything in
+    <pre>, <textarea> and <script>; <style> only loses its indentation.
+    """
+    parts = _protected.split(html)
+    out = []
+    # re.split with two groups yields: text, block, tag name, text, block, tag name, ...
+    for index in range(0, len(parts), 3):
+        text = _comment.sub('', parts[index])
+        text = _style.sub(lambda m: m.group(1) + _line_break.sub('\n', m.group(2)) + m.group(3), text)
+        out.append(_line_break.sub('\n', text))
+        if index + 1 < len(parts):
+            out.append(parts[index + 1])
+    return ''.join(out).strip()
+
+
+def accepted_encoding(accept_encoding):
+    """'br' or 'gzip' (whichever the client prefers among those available), or None."""
+    weights = {}
+    for token in accept_encoding.lower().split(','):
+        match = _accept_token.fullmatch(token)
+        if not match:
+            continue
+        try:
+            weights[match.group(1)] = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+    wildcard = weights.get('*', 0)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_weight = None, 0
+    for encoding in candidates:
+        weight = weights.get(encoding, wildcard)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    return compress_string(data, max_random_bytes=GZIP_RANDOM_BYTES)
+
+
+def _brotli_chunks(chunks):
+    compressor = brotli.Compressor(quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    for chunk in chunks:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def _gzip_chunks(chunks):
+    return compress_sequence(chunks, max_random_bytes=GZIP_RANDOM_BYTES)
+
+
+async def _abrotli_chunks(chunks):
+    compressor = brotli.Compressor(quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    async for chunk in chunks:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def _agzip_chunks(chunks):
+    # gzip member header, raw deflate with a sync flush per chunk, then the trailer.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware:
+    """Compresses eligible responses (see module docstring)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'COMPRESSION_ENABLED', True)
+        self.min_bytes = getattr(settings, 'COMPRESSION_MIN_BYTES', 1024)
+        self.content_types = tuple(getattr(settings, 'COMPRESSION_CONTENT_TYPES', DEFAULT_CONTENT_TYPES))
+        self.minify = getattr(settings, 'COMPRESSION_MINIFY_HTML', False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self.process_response(request, response) if self.enabled else response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response) if self.enabled else response
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.content_types:
+            return response
+        if not response.streaming and content_type == 'text/html' and self.minify and response.status_code == 200:
+            response.content = minify_html(response.content.decode(response.charset)).encode(response.charset)
+            response.headers['Content-Length'] = str(len(response.content))
+        if not response.streaming and len(response.content) < self.min_bytes:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                wrap = _abrotli_chunks if encoding == 'br' else _agzip_chunks
+            else:
+                wrap = _brotli_chunks if encoding == 'br' else _gzip_chunks
+            response.streaming_content = wrap(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def benchmark(samples, iterations=20):
+    """
+    For each (name, bytes, is_html) sample: the size and median CPU milliseconds of every
+    encoding this process can produce, with and without minification for HTML.
+    """
+    def timed(func, data):
+        timings = []
+        for _ in range(iterations):
+            started = time.process_time()
+            result = func(data)
+            timings.append((time.process_time() - started) * 1000)
+        return result, round(statistics.median(timings), 3)
+
+    encoders = [('gzip', lambda data: compress(data, 'gzip'))]
+    if brotli is not None:
+        encoders.append(('br', lambda data: compress(data, 'br')))
+    rows = []
+    for name, body, is_html in samples:
+        variants = [('raw', body, 0.0)]
+        if is_html:
+            minified, minify_ms = timed(lambda data: minify_html(data.decode()).encode(), body)
+            variants.append(('minified', minified, minify_ms))
+        for variant, data, prep_ms in variants:
+            rows.append({'sample': name, 'variant': variant, 'encoding': 'identity', 'bytes': len(data), 'cpu_ms': prep_ms})
+            for encoding, encoder in encoders:
+                compressed, cpu_ms = timed(encoder, data)
+                rows.append({
+                    'sample': name,
+                    'variant': variant,
+                    'encoding': encoding,
+                    'bytes': len(compressed),
+                    'cpu_ms': round(prep_ms + cpu_ms, 3),
+                })
+    return rows
@@ -0,0 +1,44 @@
+"""
+Bounded data for the server-rendered customer pages.
+The profile, order-tracking and home templates only need who the customer is; orders
+are fetched by orders-manager.js from /api/orders/ a page at a time (?limit=&offset=).
+So page loads cost the same for a customer with thousands of orders as for a new one.
+`user_summary` is the Mongo user reduced to name and phone, projected in the query and
+cached for USER_SUMMARY_CACHE_SECONDS; profile updates drop it through
+`invalidate_user_summary`.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from database.models import User
+
+
+SUMMARY_FIELDS = ('email', 'firstName', 'lastName', 'phone')
+
+
+def _summary_key(email):
+    return f"user_summary:{hashlib.sha1(email.strip().lower().encode('utf-8')).hexdigest()}"
+
+
+def user_summary(email):
+    """{'email', 'firstName', 'lastName', 'phone'} for a Mongo user, or None."""
+    if not email:
+        return None
+    key = _summary_key(email)
+    summary = cache.get(key)
+    if summary is None:
+        user = User.find_by_email(email, {field: 1 for field in SUMMARY_FIELDS})
+        if not user:
+            return None
+        summary = {field: user.get(field) or '' for field in SUMMARY_FIELDS}
+        cache.set(key, summary, getattr(settings, 'USER_SUMMARY_CACHE_SECONDS', 300))
+    return summary
+
+
+def invalidate_user_summary(email):
+    if email:
+        cache.delete(_summary_key(email))
+
@@ -0,0 +1,475 @@
+"""
+Synthetic dataset generator for scale testing.
+Creates users in both stores (Mongo `users` plus Django User/UserProfile) with orders,
+payments, activities, notifications and feedback in the shapes the live code writes,
+with cart items drawn from the frontend menu (frontend/js/menu-data.js).
+
+Users are generated in chunks of `chunk_size`. Every chunk gets its own random stream
+derived from (seed, chunk index) and all timestamps count back from `until`, so the
+same arguments always produce the same rows no matter how many workers run or in
+which order chunks finish. Chunks are written by a thread pool; Mongo inserts run in
+parallel, while SQL writes are serialized on SQLite (single writer) and run in
+parallel on other backends. Everyone's password is DEFAULT_PASSWORD (hashed once).
+
+Orders only use statuses from order_status.ALLOWED_TRANSITIONS and carry the
+OrderStatusEvent history the live flow would have written. bulk_create stamps
+auto_now/auto_now_add fields with now(), so the generated timestamps are written
+back with bulk_update right after the insert.
+"""
+
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from database.models import User as MongoUser
+from database.mongo import get_database
+
+from .models import Feedback, Notification, Order, OrderStatusEvent, Payment, UserActivity, UserProfile
+from .notifications import _build_notifications, _contact_from_profile, _send_mobile
+from .order_metrics import recompute_order_metrics
+
+try:
+    import bcrypt
+except Exception:
+    bcrypt = None
+
+
+DEFAULT_PASSWORD = 'Dataset-Pass-1'
+DEFAULT_MENU_FILE = Path(settings.BASE_DIR).parent / 'frontend' / 'js' / 'menu-data.js'
+
+FIRST_NAMES = (
+    'Aarav', 'Aditi', 'Ananya', 'Arjun', 'Diya', 'Ishaan', 'Kabir', 'Kavya', 'Meera', 'Neha',
+    'Nikhil', 'Priya', 'Rahul', 'Riya', 'Rohan', 'Saanvi', 'Sara', 'Tara', 'Vihaan', 'Zoya',
+)
+LAST_NAMES = (
+    'Bose', 'Chopra', 'Das', 'Gupta', 'Iyer', 'Joshi', 'Kapoor', 'Khan', 'Menon', 'Mehta',
+    'Nair', 'Patel', 'Rao', 'Reddy', 'Sharma', 'Singh', 'Verma',
+)
+STREETS = ('MG Road', 'Park Street', 'Linking Road', 'Brigade Road', 'Anna Salai', 'FC Road')
+CITIES = ('Mumbai', 'Bengaluru', 'Delhi', 'Chennai', 'Kolkata', 'Pune', 'Hyderabad')
+# (status, weight); most history is delivered, a live tail is still in the kitchen.
+ORDER_STATUSES = (
+    ('delivered', 60), ('paid', 10), ('confirmed', 4), ('preparing', 3), ('ready', 2),
+    ('pending', 14), ('cancelled', 7),
+)
+PAID_STATUSES = ('paid', 'confirmed', 'preparing', 'ready', 'delivered')
+# The happy path through ALLOWED_TRANSITIONS and the source each step is recorded with.
+FULFILMENT_PATH = (
+    ('pending', 'checkout'), ('paid', 'payment'), ('confirmed', 'customer'),
+    ('preparing', 'customer'), ('ready', 'customer'), ('delivered', 'customer'),
+)
+# Share of pending orders whose Razorpay payment failed (the order stays pending).
+FAILED_PAYMENT_RATE = 0.3
+FEEDBACK_CATEGORIES = ('Coffee', 'Food', 'Service', 'Delivery', 'Ambience')
+FEEDBACK_MESSAGES = (
+    'Loved the coffee, will order again.',
+    'Delivery was quick and the food was still warm.',
+    'Good taste but the portion could be bigger.',
+    'Cold brew was perfect on a hot day.',
+    'Packaging could be better.',
+)
+
+_ITEM_START = re.compile(r'\{\s*id:\s*"([^"]+)"')
+_CATEGORY = re.compile(r'category:\s*"([^"]+)"')
+_FIELD = r'{}:\s*"((?:[^"\\]|\\.)*)"'
+_BASE_PRICE = re.compile(r'basePrice:\s*(\d+(?:\.\d+)?)')
+_SIZE_PRICE = re.compile(r'(\w+):\s*\{\s*price:\s*(\d+(?:\.\d+)?)')
+
+
+def load_menu(path=None):
+    """Parse the frontend menu into [{id, name, category, description, image, prices}]."""
+    text = Path(path or DEFAULT_MENU_FILE).read_text(encoding='utf-8')
+    categories = [(match.start(), match.group(1)) for match in _CATEGORY.finditer(text)]
+    starts = list(_ITEM_START.finditer(text))
+    menu = []
+    for position, match in enumerate(starts):
+        end = starts[position + 1].start() if position + 1 < len(starts) else len(text)
+        block = text[match.start():end]
+        category = ''
+        for offset, name in categories:
+            if offset > match.start():
+                break
+            category = name
+        prices = {size: Decimal(price) for size, price in _SIZE_PRICE.findall(block)}
+        base = _BASE_PRICE.search(block)
+        if not prices and base:
+            prices = {'regular': Decimal(base.group(1))}
+        if not prices:
+            continue
+        fields = {
+            key: (re.search(_FIELD.format(key), block) or [None, ''])[1]
+            for key in ('name', 'description', 'image')
+        }
+        menu.append({'id': match.group(1), 'category': category, 'prices': prices, **fields})
+    if not menu:
+        raise ValueError(f'No menu items found in {path or DEFAULT_MENU_FILE}')
+    return menu
+
+
+def _status_path(status):
+    """The (status, source) steps an order took to reach `status`, starting at pending."""
+    if status == 'cancelled':
+        return [FULFILMENT_PATH[0], ('cancelled', 'customer')]
+    steps = [name for name, _ in FULFILMENT_PATH]
+    return list(FULFILMENT_PATH[:steps.index(status) + 1])
+
+
+def _bulk_create_with_timestamps(model, objs):
+    """bulk_create `objs`, then restore the auto_now/auto_now_add values they were built with."""
+    if not objs:
+        return
+    names = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    stamps = [[getattr(obj, name) for name in names] for obj in objs]
+    model.objects.bulk_create(objs)
+    for obj, values in zip(objs, stamps):
+        for name, value in zip(names, values):
+            setattr(obj, name, value)
+    model.objects.bulk_update(objs, names, batch_size=500)
+
+
+def _split(total, parts, index):
+    """Size of part `index` when `total` is spread as evenly as possible over `parts`."""
+    return total * (index + 1) // parts - total * index // parts
+
+
+class ChunkBuilder:
+    """Builds the rows for one chunk of users; pure apart from the shared read-only inputs."""
+
+    def __init__(self, seed, index, first_number, user_count, order_count, context):
+        self.rng = random.Random(f'{seed}:{index}')
+        self.first_number = first_number
+        self.user_count = user_count
+        self.order_count = order_count
+        self.context = context
+        self.mongo_users = []
+        self.users = []
+        self.profiles = []
+        self.orders = []
+        self.status_events = []
+        self.payments = []
+        self.activities = []
+        self.notifications = []
+        self.feedback = []
+
+    def _moment(self, start, end):
+        seconds = max(int((end - start).total_seconds()), 1)
+        return start + timedelta(seconds=self.rng.randrange(seconds))
+
+    def _items(self):
+        lines = []
+        for menu_item in self.rng.sample(self.context['menu'], self.rng.choice((1, 1, 2, 2, 3, 4))):
+            size = self.rng.choice(sorted(menu_item['prices']))
+            lines.append({
+                'id': menu_item['id'],
+                'name': menu_item['name'],
+                'category': menu_item['category'],
+                'size': size,
+                'price': float(menu_item['prices'][size]),
+                'quantity': self.rng.choice((1, 1, 1, 2, 2, 3)),
+                'image': menu_item['image'],
+                'description': menu_item['description'],
+            })
+        return lines
+
+    def _user(self, number):
+        rng = self.rng
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        email = f"{self.context['prefix']}{number:07d}@{self.context['domain']}"
+        phone = f"9{rng.randrange(10 ** 9):09d}"
+        address = f"{rng.randint(1, 400)}, {rng.choice(STREETS)}, {rng.choice(CITIES)}"
+        joined = self._moment(self.context['since'], self.context['until'] - timedelta(days=1))
+        user = get_user_model()(
+            username=email,
+            email=email,
+            first_name=first_name,
+            last_name=last_name,
+            password=self.context['django_password'],
+            date_joined=joined,
+        )
+        profile = UserProfile(
+            user=user,
+            email=email,
+            first_name=first_name,
+            last_name=last_name,
+            phone=phone,
+            address=address,
+            coffee_preferences={
+                'emailNotif': rng.random() < 0.8,
+                'smsNotif': rng.random() < 0.3,
+            },
+            member_since=joined,
+            updated_at=joined,
+        )
+        self.mongo_users.append({
+            'firstName': first_name,
+            'lastName': last_name,
+            'email': email,
+            'emailLower': email.lower(),
+            'phone': phone,
+            'password': self.context['mongo_password'],
+            'createdAt': joined.replace(tzinfo=None),
+            'updatedAt': joined.replace(tzinfo=None),
+        })
+        self.users.append(user)
+        self.profiles.append(profile)
+        self.activities.append(UserActivity(user=user, email=email, action='login', metadata={}, created_at=joined))
+        return profile
+
+    def _order(self, profile, user):
+        rng = self.rng
+        created = self._moment(profile.member_since, self.context['until'])
+        updated = created + timedelta(minutes=rng.randint(1, 90))
+        items = self._items()
+        subtotal = sum(Decimal(str(line['price'])) * line['quantity'] for line in items)
+        tax = (subtotal * Decimal('0.05')).quantize(Decimal('1'))
+        total = subtotal + tax
+        status = rng.choices([name for name, _ in ORDER_STATUSES], [weight for _, weight in ORDER_STATUSES])[0]
+        paid = status in PAID_STATUSES
+        if paid:
+            payment_status = 'verified'
+        elif status == 'cancelled' or rng.random() < FAILED_PAYMENT_RATE:
+            payment_status = 'failed'
+        else:
+            payment_status = 'pending'
+        order_type = rng.choice(('delivery', 'delivery', 'in_shop'))
+        address = profile.address if order_type == 'delivery' else ''
+        client_order_id = (
+            f"CKH-{created:%Y%m%d}-"
+            f"{''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789') for _ in range(6))}"
+        )
+        name = f"{profile.first_name} {profile.last_name}"
+        order = Order(
+            user=user,
+            email=profile.email,
+            order_name=name,
+            order_email=profile.email,
+            order_phone=profile.phone,
+            order_address=address,
+            customer_name=name,
+            customer_email=profile.email,
+            customer_phone=profile.phone,
+            customer_address=address,
+            items=items,
+            total_amount=total,
+            status=status,
+            extra_fields={
+                'clientOrderId': client_order_id,
+                'orderType': order_type,
+                'deliveryAddress': address,
+                'paymentMethod': 'razorpay',
+                'paymentStatus': 'paid' if paid else payment_status,
+                'subtotal': float(subtotal),
+                'tax': float(tax),
+            },
+            created_at=created,
+            updated_at=updated,
+        )
+        path = _status_path(status)
+        step = (updated - created) / max(len(path) - 1, 1)
+        for position, (step_status, source) in enumerate(path):
+            self.status_events.append(OrderStatusEvent(
+                order=order,
+                email=profile.email,
+                from_status=path[position - 1][0] if position else '',
+                status=step_status,
+                source=source,
+                created_at=created + step * position,
+            ))
+        razorpay_order_id = f"order_{rng.getrandbits(56):014x}"
+        self.payments.append(Payment(
+            user=user,
+            order=order,
+            email=profile.email,
+            amount=total,
+            razorpay_order_id=razorpay_order_id,
+            razorpay_payment_id=f"pay_{rng.getrandbits(56):014x}" if paid else '',
+            razorpay_signature=f"{rng.getrandbits(256):064x}" if paid else '',
+            status=payment_status,
+            created_at=created,
+            updated_at=updated,
+        ))
+        self.activities.append(UserActivity(
+            user=user, email=profile.email, action='login', metadata={}, created_at=created - timedelta(minutes=5),
+        ))
+        if paid:
+            self.activities.append(UserActivity(
+                user=user,
+                email=profile.email,
+                action='payment_verified',
+                metadata={'razorpayOrderId': razorpay_order_id},
+                created_at=updated,
+            ))
+        # The live builder decides channels and skip reasons; queued rows get the outcome
+        # _deliver records (email goes out, SMS has no provider so _send_mobile fails).
+        for record in _build_notifications(
+            profile.email,
+            _contact_from_profile(profile),
+            profile,
+            category='order',
+            event='order_placed',
+            title='Order placed',
+            message=f'Your order {client_order_id} has been placed. Status: pending.',
+            payload={'orderId': client_order_id, 'status': 'pending'},
+        ):
+            if record.status == 'queued':
+                ok, reason = (True, '') if record.channel == 'email' else _send_mobile(record.message, record.phone)
+                record.status = 'sent' if ok else 'failed'
+                record.status_reason = '' if ok else reason
+                record.sent_at = created if ok else None
+            record.user = user
+            record.created_at = created
+            record.updated_at = created
+            self.notifications.append(record)
+        self.orders.append(order)
+        return order
+
+    def build(self):
+        numbers = range(self.first_number, self.first_number + self.user_count)
+        profiles = [self._user(number) for number in numbers]
+        per_user = [[] for _ in profiles]
+        for _ in range(self.order_count):
+            # Skewed towards the first users of the chunk: a few regulars, a long tail.
+            owner = int(len(profiles) * self.rng.random() ** 2)
+            per_user[owner].append(self._order(profiles[owner], self.users[owner]))
+
+        for profile, user, orders in zip(profiles, self.users, per_user):
+            active = [order for order in orders if order.status != 'cancelled']
+            total_orders = len(active)
+            total_spent = sum((order.total_amount for order in active), Decimal('0'))
+            profile.total_orders = total_orders
+            profile.total_spent = total_spent
+            profile.loyalty_points = int(total_spent // Decimal(10))
+            profile.member_tier = 'Gold' if total_orders > 20 else ('Silver' if total_orders > 10 else 'Bronze')
+            if orders:
+                latest = max(orders, key=lambda order: order.created_at)
+                profile.last_order_at = latest.created_at
+                profile.last_order_items = latest.items
+                profile.updated_at = latest.created_at
+            if orders and self.rng.random() < 0.25:
+                self.feedback.append(Feedback(
+                    user=user,
+                    email=profile.email,
+                    name=f"{profile.first_name} {profile.last_name}",
+                    category=self.rng.choice(FEEDBACK_CATEGORIES),
+                    rating=Decimal(self.rng.choice((3, 4, 4, 5, 5, 5))),
+                    message=self.rng.choice(FEEDBACK_MESSAGES),
+                    created_at=self._moment(orders[0].created_at, self.context['until']),
+                ))
+        return self
+
+    def counts(self):
+        return {
+            'users': len(self.users),
+            'orders': len(self.orders),
+            'status_events': len(self.status_events),
+            'payments': len(self.payments),
+            'activities': len(self.activities),
+            'notifications': len(self.notifications),
+            'feedback': len(self.feedback),
+        }
+
+
+def _write_chunk(chunk, sql_lock):
+    if chunk.mongo_users:
+        get_database()['users'].insert_many(chunk.mongo_users, ordered=False)
+    with sql_lock, transaction.atomic():
+        # Children pick up their parents' new primary keys from the assigned instances.
+        get_user_model().objects.bulk_create(chunk.users)
+        _bulk_create_with_timestamps(UserProfile, chunk.profiles)
+        _bulk_create_with_timestamps(Order, chunk.orders)
+        _bulk_create_with_timestamps(OrderStatusEvent, chunk.status_events)
+        _bulk_create_with_timestamps(Payment, chunk.payments)
+        _bulk_create_with_timestamps(UserActivity, chunk.activities)
+        _bulk_create_with_timestamps(Notification, chunk.notifications)
+        _bulk_create_with_timestamps(Feedback, chunk.feedback)
+
+
+def generate_dataset(
+    users=1000,
+    orders=10000,
+    seed=1,
+    chunk_size=500,
+    workers=4,
+    days=365,
+    until=None,
+    prefix='user',
+    domain='dataset.example.com',
+    menu_path=None,
+    recompute_metrics=True,
+    progress=None,
+):
+    """
+    Insert `users` users and `orders` orders (plus their related rows) and return the
+    row counts. `until` (a date, default today) anchors all timestamps; `progress` is
+    called with the running counts after each chunk.
+    """
+    user_model = get_user_model()
+    first_email = f"{prefix}{0:07d}@{domain}"
+    if user_model.objects.filter(username=first_email).exists() or MongoUser.find_by_email(first_email):
+        raise ValueError(f'{first_email} already exists; use another prefix or an empty database')
+
+    until_day = until or timezone.localdate()
+    until_at = timezone.make_aware(datetime.combine(until_day, time.min))
+    context = {
+        'menu': load_menu(menu_path),
+        'prefix': prefix,
+        'domain': domain,
+        'until': until_at,
+        'since': until_at - timedelta(days=days),
+        'django_password': make_password(DEFAULT_PASSWORD),
+        'mongo_password': (
+            bcrypt.hashpw(DEFAULT_PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            if bcrypt is not None else ''
+        ),
+    }
+    MongoUser.ensure_indexes()
+
+    chunk_count = max((users + chunk_size - 1) // chunk_size, 1) if users else 0
+    totals = dict.fromkeys(
+        ('users', 'orders', 'status_events', 'payments', 'activities', 'notifications', 'feedback'), 0,
+    )
+    totals_lock = threading.Lock()
+    sql_lock = threading.Lock() if connection.vendor == 'sqlite' else nullcontext()
+
+    def run(index):
+        first_number = users * index // chunk_count
+        chunk = ChunkBuilder(
+            seed, index, first_number, _split(users, chunk_count, index),
+            _split(orders, chunk_count, index), context,
+        ).build()
+        try:
+            _write_chunk(chunk, sql_lock)
+        finally:
+            if workers > 1:
+                connections.close_all()
+        with totals_lock:
+            for key, value in chunk.counts().items():
+                totals[key] += value
+            if progress:
+                progress(dict(totals))
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ckh-dataset') as executor:
+            list(executor.map(run, range(chunk_count)))
+    else:
+        for index in range(chunk_count):
+            run(index)
+
+    if recompute_metrics:
+        recompute_order_metrics()
+    return totals
+
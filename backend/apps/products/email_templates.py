@@ -3,6 +3,9 @@ import logging
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 
+from .metrics import EMAIL_SENDS
+from .perf import track
+
 
 logger = logging.getLogger(__name__)
 BRAND_NAME = "CoffeeKaafiHai"
@@ -98,9 +101,12 @@ def send_templated_email(
         )
         if resolved_html:
             email.attach_alternative(resolved_html, "text/html")
-        email.send(fail_silently=False)
+        with track('smtp'):
+            email.send(fail_silently=False)
+        EMAIL_SENDS.inc(result='sent')
         return True, None
     except Exception as exc:
+        EMAIL_SENDS.inc(result='failed')
         logger.exception(
             "Email send failed subject=%s recipient=%s",
             subject,
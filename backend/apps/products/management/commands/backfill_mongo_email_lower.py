@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from database.models import User
+from database.mongo import get_database
+
+
+class Command(BaseCommand):
+    help = "Store the lowercased email (emailLower) used by the staff user search on Mongo users created before it existed."
+
+    def handle(self, *args, **options):
+        User.ensure_indexes()
+        db = get_database()
+        updated = 0
+        cursor = db['users'].find({'emailLower': {'$exists': False}}, {'email': 1}).batch_size(500)
+        for user in cursor:
+            db['users'].update_one(
+                {'_id': user['_id']},
+                {'$set': {'emailLower': User.normalize_email(user.get('email'))}},
+            )
+            updated += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Mongo users updated: {updated}"))
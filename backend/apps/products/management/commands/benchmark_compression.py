@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from apps.products.compression import benchmark, brotli
+from apps.products.datasets import load_menu
+
+
+DEFAULT_TEMPLATES = ('pages/public/index.html', 'pages/staff-admin/staff-dashboard.html')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure bytes on the wire and CPU per response for identity, gzip and brotli, with and "
+        "without HTML minification. Defaults to the home page, the staff dashboard and the menu as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--template', action='append', default=[], help='Template to render (repeatable)')
+        parser.add_argument('--url', action='append', default=[],
+                            help='Fetch this URL uncompressed from a running instance (repeatable)')
+        parser.add_argument('--cookie', default='', help='Cookie header for --url (e.g. a staff sessionid)')
+        parser.add_argument('--file', action='append', default=[], help='Benchmark a file as is (repeatable)')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='Print the rows as JSON')
+
+    def handle(self, *args, **options):
+        samples = []
+        templates = options['template'] or ([] if options['url'] or options['file'] else DEFAULT_TEMPLATES)
+        request = RequestFactory().get('/')
+        for template in templates:
+            samples.append((template, render_to_string(template, request=request).encode(), True))
+        if not (options['template'] or options['url'] or options['file']):
+            samples.append(('menu.json', json.dumps(load_menu(), cls=DjangoJSONEncoder).encode(), False))
+        for url in options['url']:
+            response = requests.get(
+                url, headers={'Accept-Encoding': 'identity', 'Cookie': options['cookie']}, timeout=30,
+            )
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}")
+            samples.append((url, response.content, 'html' in response.headers.get('Content-Type', '')))
+        for path in options['file']:
+            samples.append((path, Path(path).read_bytes(), path.endswith(('.html', '.htm'))))
+
+        rows = benchmark(samples, iterations=max(options['iterations'], 1))
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('brotli is not installed; only gzip is measured'))
+        self.stdout.write(f"{'sample':<44}{'variant':<10}{'encoding':<10}{'bytes':>10}{'ratio':>8}{'cpu ms':>9}")
+        raw_sizes = {}
+        for row in rows:
+            raw = raw_sizes.setdefault(row['sample'], row['bytes'])
+            self.stdout.write(
+                f"{row['sample'][-43:]:<44}{row['variant']:<10}{row['encoding']:<10}"
+                f"{row['bytes']:>10}{row['bytes'] / raw:>8.2f}{row['cpu_ms']:>9}"
+            )
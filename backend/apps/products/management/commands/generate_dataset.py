@@ -0,0 +1,53 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.datasets import DEFAULT_PASSWORD, generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset (users in Mongo and Django, orders with menu items, "
+        "payments, activities, notifications, feedback) for scale testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=10000, help='Total orders spread over the users')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=500, help='Users per insert batch')
+        parser.add_argument('--workers', type=int, default=4, help='Batches written in parallel')
+        parser.add_argument('--days', type=int, default=365, help='History length in days')
+        parser.add_argument('--until', type=date.fromisoformat, default=None,
+                            help='Last day of history, YYYY-MM-DD (default: today; fix it for reproducible data)')
+        parser.add_argument('--prefix', default='user', help='Email local-part prefix (user0000000@...)')
+        parser.add_argument('--domain', default='dataset.example.com')
+        parser.add_argument('--menu', default=None, help='Path to menu-data.js')
+        parser.add_argument('--skip-metrics', action='store_true', help='Do not rebuild order status/daily rollups')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['orders'] < 0 or options['chunk_size'] < 1:
+            raise CommandError('--users and --chunk-size must be positive and --orders not negative')
+
+        def progress(totals):
+            self.stdout.write(f"  {totals['users']}/{options['users']} users, {totals['orders']} orders")
+
+        try:
+            totals = generate_dataset(
+                users=options['users'],
+                orders=options['orders'],
+                seed=options['seed'],
+                chunk_size=options['chunk_size'],
+                workers=options['workers'],
+                days=options['days'],
+                until=options['until'],
+                prefix=options['prefix'],
+                domain=options['domain'],
+                menu_path=options['menu'],
+                recompute_metrics=not options['skip_metrics'],
+                progress=progress if options['verbosity'] > 1 else None,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        parts = [f"{key}={value}" for key, value in totals.items()]
+        self.stdout.write(self.style.SUCCESS(f"Dataset generated: {', '.join(parts)} (password: {DEFAULT_PASSWORD})"))
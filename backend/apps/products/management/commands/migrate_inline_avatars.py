@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.avatars import avatar_url_for
+from apps.products.models import UserProfile
+from database.mongo import get_database
+
+
+class Command(BaseCommand):
+    help = "Move inline base64 avatars from Mongo users and profile rows into avatar storage."
+
+    def handle(self, *args, **options):
+        migrated = 0
+        failed = 0
+
+        db = get_database()
+        cursor = db['users'].find({'avatar': {'$regex': '^data:'}}, {'email': 1, 'avatar': 1}).batch_size(100)
+        for user in cursor:
+            try:
+                url, _ = avatar_url_for(user.get('avatar'))
+                db['users'].update_one({'_id': user['_id']}, {'$set': {'avatar': url}})
+                UserProfile.objects.filter(email=user.get('email')).update(avatar=url)
+                migrated += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Mongo avatar for {user.get('email')} failed: {e}")
+
+        profiles = UserProfile.objects.filter(avatar__startswith='data:').only('id', 'email', 'avatar')
+        for profile in profiles.iterator(chunk_size=100):
+            try:
+                url, _ = avatar_url_for(profile.avatar)
+                UserProfile.objects.filter(id=profile.id).update(avatar=url)
+                migrated += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Profile avatar for {profile.email} failed: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Avatars migrated: {migrated}, failed: {failed}"))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.products.payment_webhooks import process_webhook_events, requeue_stale_webhook_events
+
+
+class Command(BaseCommand):
+    help = "Apply queued Razorpay webhook events to payments and orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the inbox instead of exiting')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --loop')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry events that failed earlier')
+        parser.add_argument(
+            '--requeue-after', type=int, default=10,
+            help='Minutes after being claimed that events stuck in processing are requeued',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            requeued = requeue_stale_webhook_events(options['requeue_after'])
+            summary = process_webhook_events(
+                batch_size=options['batch_size'],
+                retry_failed=options['retry_failed'],
+            )
+            if summary or requeued:
+                parts = [f"{status}={count}" for status, count in sorted(summary.items())]
+                if requeued:
+                    parts.append(f"requeued={requeued}")
+                self.stdout.write(f"Webhook events: {', '.join(parts)}")
+            if not options['loop']:
+                break
+            if not summary:
+                time.sleep(options['interval'])
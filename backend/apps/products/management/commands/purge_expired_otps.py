@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.otp import DatabaseOTPStore
+
+
+class Command(BaseCommand):
+    help = "Delete expired OTP codes from the database OTP store (run periodically, e.g. hourly cron)."
+
+    def handle(self, *args, **options):
+        removed = DatabaseOTPStore().purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Expired OTP codes removed: {removed}"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.order_metrics import recompute_order_metrics
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized order status counters and daily revenue rollups (run periodically, e.g. hourly cron)."
+
+    def handle(self, *args, **options):
+        result = recompute_order_metrics()
+        self.stdout.write(self.style.SUCCESS(
+            f"Order metrics rebuilt: {result['statuses']} statuses, {result['days']} days"
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.reconciliation import reconcile_stale_payments
+
+
+class Command(BaseCommand):
+    help = "Check stale pending/processing payments against Razorpay and apply the results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=15, help='Minutes since the payment was last updated')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=4, help='Parallel gateway lookups')
+        parser.add_argument('--rate', type=float, default=10, help='Max gateway requests per second')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many payments')
+        parser.add_argument('--dry-run', action='store_true', help='Query the gateway but do not write')
+
+    def handle(self, *args, **options):
+        summary = reconcile_stale_payments(
+            older_than_minutes=options['older_than'],
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            rate=options['rate'],
+            limit=options['limit'],
+            dry_run=options['dry_run'],
+        )
+        parts = [f"{key}={value}" for key, value in summary.items()]
+        prefix = "Dry run: " if options['dry_run'] else ""
+        self.stdout.write(f"{prefix}Payment reconciliation: {', '.join(parts)}")
@@ -0,0 +1,102 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.datasets import DEFAULT_PASSWORD
+from apps.products.traffic import compare_runs, load_entries, replay
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a traffic capture (TRAFFIC_CAPTURE_FILE) against a running instance and report per-route "
+        "latency, optionally compared with a previous run. Seed the target with generate_dataset first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', nargs='?', help='Captured traffic log (omit with --compare A B)')
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='Pacing multiplier: 1 = original rate, 2 = twice as fast, 0 = unpaced')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--limit', type=int, default=None, help='Replay only the first N requests')
+        parser.add_argument('--user-prefix', default='user', help='generate_dataset --prefix of the target')
+        parser.add_argument('--user-domain', default='dataset.example.com')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--staff-email', default='')
+        parser.add_argument('--staff-password', default='')
+        parser.add_argument('--label', default='', help='Build name stored with the results')
+        parser.add_argument('--output', default='', help='Write the results JSON here')
+        parser.add_argument('--baseline', default='', help='Compare this run with a saved results JSON')
+        parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                            help='Only compare two saved results files')
+        parser.add_argument('--threshold', type=float, default=10.0, help='p95 growth (%%) counted as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            baseline, current = (self._read(path) for path in options['compare'])
+        else:
+            if not options['capture']:
+                raise CommandError('Give a capture file to replay, or --compare BASELINE CURRENT')
+            entries = load_entries(options['capture'], limit=options['limit'])
+            if not entries:
+                raise CommandError(f"No entries in {options['capture']}")
+            staff = (options['staff_email'], options['staff_password']) if options['staff_email'] else None
+            self.stdout.write(f"Replaying {len(entries)} requests against {options['base_url']}...")
+            current = replay(
+                entries,
+                options['base_url'],
+                speed=options['speed'],
+                concurrency=options['concurrency'],
+                user_prefix=options['user_prefix'],
+                user_domain=options['user_domain'],
+                password=options['password'],
+                staff=staff,
+            )
+            current['label'] = options['label']
+            self._print_run(current)
+            if options['output']:
+                Path(options['output']).write_text(json.dumps(current, indent=2))
+            baseline = self._read(options['baseline']) if options['baseline'] else None
+
+        if baseline is None:
+            return
+        rows = compare_runs(baseline, current, threshold=options['threshold'])
+        self._print_comparison(baseline, current, rows)
+        regressed = [row['route'] for row in rows if row['regressed']]
+        if regressed and options['fail_on_regression']:
+            raise CommandError(f"p95 regressed on: {', '.join(regressed)}")
+
+    def _read(self, path):
+        try:
+            return json.loads(Path(path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read results {path}: {exc}")
+
+    def _print_run(self, result):
+        self.stdout.write(
+            f"{result['requests']} requests in {result['wall_seconds']}s "
+            f"(speed={result['speed']}, max schedule lag {result['max_schedule_lag_ms']} ms)"
+        )
+        self.stdout.write(f"{'route':<44}{'count':>7}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'capt p95':>10}")
+        for route, row in result['routes'].items():
+            self.stdout.write(
+                f"{route[:43]:<44}{row['count']:>7}{row['errors']:>5}"
+                f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['captured_p95_ms']:>10}"
+            )
+
+    def _print_comparison(self, baseline, current, rows):
+        self.stdout.write(
+            f"\n{baseline.get('label') or 'baseline'} -> {current.get('label') or 'current'} (ms, change %)"
+        )
+        for row in rows:
+            if not (row['before'] and row['after']):
+                self.stdout.write(f"{row['route'][:43]:<44} only in {'current' if row['after'] else 'baseline'}")
+                continue
+            line = (
+                f"{row['route'][:43]:<44}"
+                f"p50 {row['before']['p50_ms']:>8} -> {row['after']['p50_ms']:<8} ({row['p50_change']}%)  "
+                f"p95 {row['before']['p95_ms']:>8} -> {row['after']['p95_ms']:<8} ({row['p95_change']}%)"
+            )
+            self.stdout.write(self.style.ERROR(line + '  REGRESSED') if row['regressed'] else line)
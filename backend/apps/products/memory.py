@@ -0,0 +1,297 @@
+"""
+Memory diagnostics for staff.
+Everything here is per worker process (each gunicorn worker has its own heap), and the
+expensive part, tracemalloc, only runs while switched on: start it from
+/api/staff/memory/ (or at boot with PYTHONTRACEMALLOC=<frames>), take snapshots, diff
+two of them by allocation site, then stop it again.
+
+While tracing, `MemoryMiddleware` resets the traced peak around each request and keeps
+per-route peak/net allocation stats; a request whose peak exceeds MEMORY_ALERT_BYTES is
+logged on `apps.products.memory` with its route. The peak is process-wide, so requests
+running concurrently in other threads inflate each other's numbers; treat it as an
+upper bound. The resident set size is exported to /api/metrics/ at all times.
+GET /api/staff/memory/ stays cheap; `?detail=1` adds the gc object count, which walks
+every tracked object.
+"""
+
+import gc
+import json
+import linecache
+import logging
+import os
+import threading
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+MEMORY_ALERTS = metrics.Counter(
+    'ckh_memory_alerts_total', 'Requests whose traced allocation peak exceeded MEMORY_ALERT_BYTES.', ['url_name'],
+)
+
+_lock = threading.Lock()
+GROUP_BY_CHOICES = ('lineno', 'filename', 'traceback')
+_snapshots = []  # [(id, taken_at, traced_bytes, Snapshot)], oldest first
+_route_stats = {}
+_next_id = [1]
+
+
+def rss_bytes():
+    """Current resident set size, or the peak from getrusage where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@metrics.REGISTRY.register_collector
+def process_memory():
+    yield ('ckh_process_resident_memory_bytes', 'Resident set size of the scraped worker.', 'gauge', [({}, rss_bytes())])
+
+
+# -- tracemalloc control ------------------------------------------------------------
+
+def start_tracing(frames=None):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames or getattr(settings, 'MEMORY_TRACE_FRAMES', 10))
+
+
+def stop_tracing():
+    """Stop tracing and drop stored snapshots (they are useless without a live trace to diff)."""
+    tracemalloc.stop()
+    with _lock:
+        _snapshots.clear()
+        _route_stats.clear()
+
+
+def take_snapshot():
+    if not tracemalloc.is_tracing():
+        raise RuntimeError('tracemalloc is not tracing; start it first')
+    snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+    traced_bytes = sum(trace.size for trace in snapshot.traces)
+    with _lock:
+        snapshot_id = _next_id[0]
+        _next_id[0] += 1
+        _snapshots.append((snapshot_id, datetime.now(dt_timezone.utc).isoformat(), traced_bytes, snapshot))
+        del _snapshots[:-getattr(settings, 'MEMORY_MAX_SNAPSHOTS', 5)]
+    return snapshot_id, snapshot
+
+
+def get_snapshot(snapshot_id):
+    with _lock:
+        for stored_id, _taken_at, _traced_bytes, snapshot in _snapshots:
+            if stored_id == snapshot_id:
+                return snapshot
+    return None
+
+
+def _site(traceback):
+    frame = traceback[0]
+    return {
+        'file': frame.filename,
+        'line': frame.lineno,
+        'code': linecache.getline(frame.filename, frame.lineno).strip(),
+        'stack': [f"{item.filename}:{item.lineno}" for item in traceback],
+    }
+
+
+def top_sites(snapshot, limit=20, group_by='lineno'):
+    stats = snapshot.statistics(group_by)
+    return [dict(_site(stat.traceback), size=stat.size, count=stat.count) for stat in stats[:limit]]
+
+
+def diff_sites(base, current, limit=20, group_by='lineno'):
+    """Allocation sites that grew the most between two snapshots."""
+    stats = current.compare_to(base, group_by)
+    return [
+        dict(_site(stat.traceback), size=stat.size, size_diff=stat.size_diff, count_diff=stat.count_diff)
+        for stat in stats[:limit]
+    ]
+
+
+def status(detail=False):
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    with _lock:
+        snapshots = [
+            {'id': snapshot_id, 'taken_at': taken_at, 'traced_bytes': traced_bytes}
+            for snapshot_id, taken_at, traced_bytes, _snapshot in _snapshots
+        ]
+        routes = sorted(_route_stats.items(), key=lambda item: item[1]['max_peak_bytes'], reverse=True)
+    result = {
+        'pid': os.getpid(),
+        'rss_bytes': rss_bytes(),
+        'tracing': tracing,
+        'trace_frames': tracemalloc.get_traceback_limit() if tracing else 0,
+        'traced_bytes': current,
+        'traced_peak_bytes': peak,
+        'gc_counts': gc.get_count(),
+        'snapshots': snapshots,
+        'routes': [dict(stats, route=route) for route, stats in routes[:50]],
+    }
+    if detail:
+        result['gc_objects'] = len(gc.get_objects())
+    return result
+
+
+# -- per-request peaks ------------------------------------------------------------------
+
+def _record_request(request, response, net, peak):
+    match = getattr(request, 'resolver_match', None)
+    route = (match.route if match else None) or 'unresolved'
+    with _lock:
+        stats = _route_stats.setdefault(route, {'count': 0, 'max_peak_bytes': 0, 'total_peak_bytes': 0, 'total_net_bytes': 0})
+        stats['count'] += 1
+        stats['max_peak_bytes'] = max(stats['max_peak_bytes'], peak)
+        stats['total_peak_bytes'] += peak
+        stats['total_net_bytes'] += net
+    threshold = getattr(settings, 'MEMORY_ALERT_BYTES', 50 * 1024 * 1024)
+    if peak >= threshold:
+        MEMORY_ALERTS.inc(url_name=(match.url_name if match else None) or 'unresolved')
+        logger.warning(json.dumps({
+            'event': 'memory_alert',
+            'method': request.method,
+            'route': route,
+            'status': response.status_code,
+            'peak_bytes': peak,
+            'net_bytes': net,
+            'rss_bytes': rss_bytes(),
+        }, separators=(',', ':')))
+
+
+class MemoryMiddleware:
+    """Per-request allocation peaks while tracemalloc is tracing (see module docstring)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not tracemalloc.is_tracing():
+            return self.get_response(request)
+        tracemalloc.reset_peak()
+        before, _peak = tracemalloc.get_traced_memory()
+        response = self.get_response(request)
+        self._finish(request, response, before)
+        return response
+
+    async def __acall__(self, request):
+        if not tracemalloc.is_tracing():
+            return await self.get_response(request)
+        tracemalloc.reset_peak()
+        before, _peak = tracemalloc.get_traced_memory()
+        response = await self.get_response(request)
+        self._finish(request, response, before)
+        return response
+
+    def _finish(self, request, response, before):
+        if not tracemalloc.is_tracing():  # stopped during the request
+            return
+        after, peak = tracemalloc.get_traced_memory()
+        _record_request(request, response, after - before, max(peak - before, 0))
+
+
+# -- staff API ------------------------------------------------------------------------
+
+def _int_param(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _invalid_group_by():
+    return JsonResponse({'success': False, 'message': 'groupBy must be lineno, filename or traceback'}, status=400)
+
+
+@csrf_exempt
+@login_required(login_url='/login/')
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+@require_http_methods(["GET", "POST"])
+def staff_memory(request):
+    """
+    GET: process memory status (?detail=1 adds the gc object count).
+    POST {"action": "start"|"stop"|"snapshot"}: control tracemalloc; "snapshot" also
+    returns the top allocation sites.
+    """
+    if request.method == 'GET':
+        detail = str(request.GET.get('detail') or '').lower() in ('1', 'true', 'yes')
+        return JsonResponse({'success': True, **status(detail=detail)})
+    try:
+        data = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'Invalid JSON'}, status=400)
+    action = data.get('action')
+    if action == 'start':
+        start_tracing(_int_param(data.get('frames'), None))
+        return JsonResponse({'success': True, **status()})
+    if action == 'stop':
+        stop_tracing()
+        return JsonResponse({'success': True, **status()})
+    if action == 'snapshot':
+        group_by = data.get('groupBy') or 'lineno'
+        if group_by not in GROUP_BY_CHOICES:
+            return _invalid_group_by()
+        try:
+            snapshot_id, snapshot = take_snapshot()
+        except RuntimeError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=409)
+        return JsonResponse({
+            'success': True,
+            'id': snapshot_id,
+            'top': top_sites(snapshot, limit=_int_param(data.get('limit'), 20), group_by=group_by),
+        })
+    return JsonResponse({'success': False, 'message': 'action must be start, stop or snapshot'}, status=400)
+
+
+@csrf_exempt
+@login_required(login_url='/login/')
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+@require_http_methods(["GET"])
+def staff_memory_diff(request):
+    """Top growing allocation sites between snapshot ?base= and ?current= (default: a new snapshot)."""
+    group_by = request.GET.get('groupBy') or 'lineno'
+    if group_by not in GROUP_BY_CHOICES:
+        return _invalid_group_by()
+    base = get_snapshot(_int_param(request.GET.get('base'), 0))
+    if base is None:
+        return JsonResponse({'success': False, 'message': 'Unknown base snapshot'}, status=404)
+    current_id = _int_param(request.GET.get('current'), 0)
+    if current_id:
+        current = get_snapshot(current_id)
+        if current is None:
+            return JsonResponse({'success': False, 'message': 'Unknown current snapshot'}, status=404)
+    else:
+        try:
+            current_id, current = take_snapshot()
+        except RuntimeError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=409)
+    return JsonResponse({
+        'success': True,
+        'base': _int_param(request.GET.get('base'), 0),
+        'current': current_id,
+        'diff': diff_sites(base, current, limit=_int_param(request.GET.get('limit'), 20), group_by=group_by),
+    })
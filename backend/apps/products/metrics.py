@@ -0,0 +1,294 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+Counters and histograms are kept in a plain dict per process. With METRICS_MULTIPROC_DIR
+set (gunicorn and other multi-worker servers), a background thread in each process writes
+its values to `<dir>/<pid>-<start>.json` every METRICS_FLUSH_SECONDS (requests never wait
+on the file system) and the exposition endpoint sums every file, so a scrape hitting any
+worker sees the whole server. Clear the directory when the server
+(not a single worker) starts. Gauges that live in the database, like the notification
+queue depth, are read at scrape time instead of being tracked.
+"""
+
+import atexit
+import hmac
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count
+from django.http import HttpResponse
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+logger = logging.getLogger(__name__)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._values = {}
+        self._collectors = []
+        self._started = int(time.time())
+        self._flusher_pid = None
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, func):
+        """func() -> iterable of (name, help, type, [(labels_dict, value), ...]) read at scrape time."""
+        self._collectors.append(func)
+        return func
+
+    def _update(self, key, func):
+        with self._lock:
+            self._values[key] = func(self._values.get(key))
+        self._ensure_flusher()
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {'name': name, 'labels': list(labels), 'value': value}
+                for (name, labels), value in self._values.items()
+            ]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    # -- multiprocess ---------------------------------------------------------
+
+    def _directory(self):
+        directory = getattr(settings, 'METRICS_MULTIPROC_DIR', '')
+        return Path(directory) if directory else None
+
+    def _ensure_flusher(self):
+        # One daemon thread per process; a forked worker starts its own.
+        if self._flusher_pid == os.getpid() or self._directory() is None:
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='ckh-metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(getattr(settings, 'METRICS_FLUSH_SECONDS', 5))
+            self.flush()
+
+    def flush(self):
+        """Write this process's values to its file; failures are logged, never raised."""
+        directory = self._directory()
+        if directory is None:
+            return
+        path = directory / f"{os.getpid()}-{self._started}.json"
+        tmp_path = None
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            # A unique temporary file per flush, so concurrent flushes never share one.
+            fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix='.tmp', dir=directory)
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(self.snapshot(), handle)
+            os.replace(tmp_path, path)
+        except Exception:
+            logger.exception("Metrics flush to %s failed", directory)
+            if tmp_path:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def aggregated(self):
+        """All processes' values merged: counters and histogram buckets are summed."""
+        directory = self._directory()
+        if directory is None:
+            entries = self.snapshot()
+        else:
+            self.flush()
+            entries = []
+            for path in directory.glob('*.json'):
+                try:
+                    entries.extend(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+
+        merged = {}
+        for entry in entries:
+            key = (entry['name'], tuple(entry['labels']))
+            metric = self._metrics.get(entry['name'])
+            if metric is None:
+                continue
+            merged[key] = metric.merge(merged.get(key), entry['value'])
+        return merged
+
+    # -- exposition -----------------------------------------------------------
+
+    def render(self):
+        merged = self.aggregated()
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for (metric_name, labels), value in sorted(merged.items()):
+                if metric_name == name:
+                    lines.extend(metric.samples(dict(zip(metric.label_names, labels)), value))
+        for collector in self._collectors:
+            for name, help_text, kind, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name, help_text, label_names=(), registry=None):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def _key(self, labels):
+        return self.name, tuple(str(labels.get(label, '')) for label in self.label_names)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry._update(self._key(labels), lambda value: (value or 0) + amount)
+
+    def merge(self, current, value):
+        return (current or 0) + value
+
+    def samples(self, labels, value):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, label_names, registry)
+
+    def observe(self, amount, **labels):
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if amount <= bound:
+                index = position
+                break
+
+        def update(value):
+            # [per-bucket counts (last one is +Inf), sum]
+            value = value or [[0] * (len(self.buckets) + 1), 0.0]
+            value[0][index] += 1
+            value[1] += amount
+            return value
+
+        self.registry._update(self._key(labels), update)
+
+    def merge(self, current, value):
+        if current is None:
+            return [list(value[0]), value[1]]
+        return [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1]]
+
+    def samples(self, labels, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            bucket_labels = dict(labels, le=_format_value(bound) if bound == math.inf else repr(bound))
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(float(total))}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+REQUEST_LATENCY = Histogram(
+    'ckh_http_request_duration_seconds', 'Request latency by URL name.', ['url_name'],
+)
+RESPONSES = Counter(
+    'ckh_http_responses_total', 'Responses by URL name and status code.', ['url_name', 'status'],
+)
+EMAIL_SENDS = Counter(
+    'ckh_email_sends_total', 'Outgoing emails by result (sent/failed).', ['result'],
+)
+PAYMENT_VERIFICATIONS = Counter(
+    'ckh_payment_verifications_total', 'Checkout payment verification outcomes.', ['outcome'],
+)
+
+
+def observe_request(request, response, seconds):
+    match = getattr(request, 'resolver_match', None)
+    url_name = (match.url_name if match else None) or 'unresolved'
+    REQUEST_LATENCY.observe(seconds, url_name=url_name)
+    RESPONSES.inc(url_name=url_name, status=response.status_code)
+
+
+@REGISTRY.register_collector
+def notification_queue_depth():
+    from .models import Notification
+
+    counts = dict.fromkeys((status for status, _label in Notification.STATUS_CHOICES), 0)
+    for row in Notification.objects.values('status').annotate(total=Count('id')):
+        counts[row['status']] = row['total']
+    yield (
+        'ckh_notifications',
+        'Notifications by delivery status.',
+        'gauge',
+        [({'status': status}, total) for status, total in sorted(counts.items())],
+    )
+
+
+def _scrape_allowed(request):
+    user = getattr(request, 'user', None)
+    if user and user.is_authenticated and (user.is_staff or user.is_superuser):
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+        return True
+    # REMOTE_ADDR only; behind a reverse proxy every client shares the proxy's address.
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition for staff sessions, `Authorization: Bearer <METRICS_TOKEN>`
+    or a REMOTE_ADDR listed in METRICS_ALLOWED_IPS.
+    """
+    if not _scrape_allowed(request):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
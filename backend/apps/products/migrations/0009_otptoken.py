@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('products', '0008_paymentwebhookevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OTPToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(max_length=32)),
+                ('email', models.EmailField(max_length=254)),
+                ('code', models.CharField(max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('purpose', 'email'), name='otp_token_purpose_email_uniq')],
+            },
+        ),
+    ]
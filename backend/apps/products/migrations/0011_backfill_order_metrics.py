@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def backfill_order_metrics(apps, schema_editor):
+    # 0006 created the counter tables empty. Incremental updates assume they already
+    # hold the existing orders, so fill them once here.
+    from apps.products.order_metrics import recompute_order_metrics
+
+    recompute_order_metrics(apps)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('products', '0010_order_email_recent_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_metrics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+import json
+import logging
+
+from django.db import migrations
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_string_extra_fields(apps, schema_editor):
+    # Some legacy orders hold extra_fields as a JSON-encoded string rather than an
+    # object, which key lookups like extra_fields__clientOrderId cannot see into.
+    # Strings that don't decode to an object are left exactly as they are and
+    # reported, so no legacy data is thrown away.
+    Order = apps.get_model('products', 'Order')
+    batch = []
+    skipped = []
+    for order in Order.objects.only('id', 'extra_fields').iterator(chunk_size=2000):
+        if not isinstance(order.extra_fields, str):
+            continue
+        try:
+            parsed = json.loads(order.extra_fields)
+        except (json.JSONDecodeError, TypeError):
+            parsed = None
+        if not isinstance(parsed, dict):
+            skipped.append(order.id)
+            continue
+        order.extra_fields = parsed
+        batch.append(order)
+        if len(batch) >= 500:
+            Order.objects.bulk_update(batch, ['extra_fields'])
+            batch = []
+    if batch:
+        Order.objects.bulk_update(batch, ['extra_fields'])
+    if skipped:
+        logger.warning(
+            "Left %s orders with unparseable string extra_fields untouched: ids %s",
+            len(skipped),
+            skipped[:50],
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('products', '0011_backfill_order_metrics'),
+    ]
+
+    operations = [
+        migrations.RunPython(parse_string_extra_fields, migrations.RunPython.noop),
+    ]
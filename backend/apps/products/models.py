@@ -59,6 +59,12 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # A customer's newest orders first (profile/order-tracking pages, /api/orders/ paging).
+            models.Index(fields=['email', '-created_at'], name='order_email_recent_idx'),
+        ]
+
     def __str__(self):
         return f"{self.email} - {self.id}"
 
@@ -164,6 +170,21 @@ class PasswordResetOTP(models.Model):
         return f"{self.email} - {self.otp}"
 
 
+class OTPToken(models.Model):
+    """Database fallback for the OTP store: at most one live code per (purpose, email)."""
+    purpose = models.CharField(max_length=32)
+    email = models.EmailField()
+    code = models.CharField(max_length=16)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['purpose', 'email'], name='otp_token_purpose_email_uniq'),
+        ]
+
+
 class Feedback(models.Model):
     """Persistent customer feedback stored in the database."""
     user = models.ForeignKey(
@@ -179,3 +200,66 @@ class Feedback(models.Model):
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=0)
     message = models.TextField(blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class OrderStatusCount(models.Model):
+    """Materialized number of orders per status (dashboard metrics)."""
+    status = models.CharField(max_length=32, unique=True)
+    count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.status}: {self.count}"
+
+
+class DailyOrderRollup(models.Model):
+    """Materialized per-day order and revenue totals (dashboard metrics)."""
+    date = models.DateField(unique=True)
+    orders_placed = models.IntegerField(default=0)
+    paid_orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.date} - {self.revenue}"
+
+
+class OrderStatusEvent(models.Model):
+    """Append-only order status history (one row per transition)."""
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='status_events'
+    )
+    email = models.EmailField(db_index=True)
+    from_status = models.CharField(max_length=32, blank=True, default='')
+    status = models.CharField(max_length=32)
+    source = models.CharField(max_length=32, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.order_id}: {self.from_status or '-'} -> {self.status}"
+
+
+class PaymentWebhookEvent(models.Model):
+    """Inbox of raw Razorpay webhook deliveries, applied asynchronously by a worker."""
+    STATUS_CHOICES = (
+        ('received', 'Received'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    )
+    event_id = models.CharField(max_length=128, unique=True)
+    event = models.CharField(max_length=64, db_index=True)
+    body = models.TextField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='received', db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.CharField(max_length=200, blank=True, default='')
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # When a worker last moved the event to 'processing'; stale claims are requeued.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.event} - {self.event_id}"
@@ -38,24 +38,32 @@ def _normalize_prefs(prefs):
     }
 
 
-def _get_contact_info(email):
-    profile = UserProfile.objects.filter(email=email).first()
+def _contact_from_profile(profile):
+    return {
+        'email': profile.email,
+        'phone': profile.phone or '',
+        'prefs': profile.coffee_preferences or {},
+    }
+
+
+def _contact_from_mongo(email, mongo_user):
+    mongo_user = mongo_user or {}
+    return {
+        'email': mongo_user.get('email') or email,
+        'phone': mongo_user.get('phone') or '',
+        'prefs': mongo_user.get('coffeePreferences') or {},
+    }
+
+
+def _get_contact_info(email, profile=None):
     if profile:
-        return {
-            'email': profile.email,
-            'phone': profile.phone or '',
-            'prefs': profile.coffee_preferences or {},
-        }
+        return _contact_from_profile(profile)
     try:
         mongo_user = MongoUser.find_by_email(email) or {}
     except Exception:
         logger.exception("Mongo user lookup failed for notification email=%s", email)
         mongo_user = {}
-    return {
-        'email': mongo_user.get('email') or email,
-        'phone': mongo_user.get('phone') or '',
-        'prefs': mongo_user.get('coffeePreferences') or {},
-    }
+    return _contact_from_mongo(email, mongo_user)
 
 
 def _send_email(subject, message, recipient, html=None):
@@ -78,6 +86,57 @@ def _send_mobile(message, recipient_phone):
     return False, 'sms_disabled'
 
 
+def _build_notifications(email, contact, profile, *, category, event, title, message, payload):
+    """Unsaved email and mobile Notification rows for one recipient, status set from prefs."""
+    prefs = _normalize_prefs(contact.get('prefs'))
+    records = []
+    for channel, address_key in (('email', 'email'), ('mobile', 'phone')):
+        status = 'queued' if prefs[channel] else 'skipped'
+        reason = '' if prefs[channel] else 'user_disabled'
+        if prefs[channel] and not contact.get(address_key):
+            status = 'skipped'
+            reason = f'missing_{address_key}'
+        records.append(Notification(
+            user_id=profile.user_id if profile else None,
+            email=contact.get('email') or email,
+            phone=contact.get('phone') or '',
+            channel=channel,
+            category=category,
+            event=event,
+            title=title,
+            message=message,
+            payload=payload or {},
+            status=status,
+            status_reason=reason,
+        ))
+    return records
+
+
+def _deliver(record):
+    """Attempt delivery of a queued record, updating its status fields in place."""
+    if record.status != 'queued':
+        return False
+    if record.channel == 'email':
+        ok, reason = _send_email(record.title, record.message, record.email)
+        fallback_reason = 'email_failed'
+    else:
+        ok, reason = _send_mobile(record.message, record.phone)
+        fallback_reason = 'mobile_failed'
+    record.status = 'sent' if ok else 'failed'
+    record.status_reason = '' if ok else (reason or fallback_reason)
+    record.sent_at = timezone.now() if ok else None
+    record.updated_at = timezone.now()
+    if not ok and record.channel == 'email':
+        logger.error(
+            "Notification email send failed email=%s event=%s category=%s reason=%s",
+            record.email,
+            record.event,
+            record.category,
+            record.status_reason,
+        )
+    return True
+
+
 def dispatch_notification(
     *,
     email,
@@ -93,80 +152,54 @@ def dispatch_notification(
     Returns list of Notification records created.
     """
     profile = UserProfile.objects.filter(email=email).first()
-    contact = _get_contact_info(email)
-    prefs = _normalize_prefs(contact.get('prefs'))
-    created = []
-
-    # Email channel
-    email_status = 'queued' if prefs['email'] else 'skipped'
-    email_reason = None if prefs['email'] else 'user_disabled'
-    if prefs['email'] and not contact.get('email'):
-        email_status = 'skipped'
-        email_reason = 'missing_email'
-    email_record = Notification.objects.create(
-        user=profile.user if profile else None,
-        email=contact.get('email') or email,
-        phone=contact.get('phone') or '',
-        channel='email',
-        category=category,
-        event=event,
-        title=title,
-        message=message,
-        payload=payload or {},
-        status=email_status,
-        status_reason=email_reason or '',
-    )
-    created.append(email_record)
-
-    # Mobile channel
-    mobile_status = 'queued' if prefs['mobile'] else 'skipped'
-    mobile_reason = None if prefs['mobile'] else 'user_disabled'
-    if prefs['mobile'] and not contact.get('phone'):
-        mobile_status = 'skipped'
-        mobile_reason = 'missing_phone'
-    mobile_record = Notification.objects.create(
-        user=profile.user if profile else None,
-        email=contact.get('email') or email,
-        phone=contact.get('phone') or '',
-        channel='mobile',
-        category=category,
-        event=event,
-        title=title,
-        message=message,
-        payload=payload or {},
-        status=mobile_status,
-        status_reason=mobile_reason or '',
-    )
-    created.append(mobile_record)
+    contact = _get_contact_info(email, profile)
+    created = Notification.objects.bulk_create(_build_notifications(
+        email, contact, profile,
+        category=category, event=event, title=title, message=message, payload=payload,
+    ))
 
     if send_immediately:
-        # Email delivery
-        if email_record.status == 'queued':
-            ok, reason = _send_email(title, message, email_record.email)
-            email_record.status = 'sent' if ok else 'failed'
-            email_record.status_reason = '' if ok else (reason or 'email_failed')
-            email_record.sent_at = timezone.now() if ok else None
-            email_record.save(update_fields=['status', 'status_reason', 'sent_at', 'updated_at'])
-            if not ok:
-                logger.error(
-                    "Notification email send failed email=%s event=%s category=%s reason=%s",
-                    email_record.email,
-                    event,
-                    category,
-                    email_record.status_reason,
-                )
-
-        # Mobile delivery
-        if mobile_record.status == 'queued':
-            ok, reason = _send_mobile(message, mobile_record.phone)
-            mobile_record.status = 'sent' if ok else 'failed'
-            mobile_record.status_reason = '' if ok else (reason or 'mobile_failed')
-            mobile_record.sent_at = timezone.now() if ok else None
-            mobile_record.save(update_fields=['status', 'status_reason', 'sent_at', 'updated_at'])
+        for record in created:
+            if _deliver(record):
+                record.save(update_fields=['status', 'status_reason', 'sent_at', 'updated_at'])
 
     return created
 
 
+def broadcast_notifications(emails, *, category, event, title, message, payload=None, send_immediately=True):
+    """
+    dispatch_notification for many recipients with a fixed number of queries:
+    profiles and Mongo users are fetched in one lookup each, rows are bulk inserted
+    and delivery results are written back with one bulk update.
+    Returns the number of recipients.
+    """
+    emails = list(dict.fromkeys(emails))
+    profiles = {profile.email: profile for profile in UserProfile.objects.filter(email__in=emails)}
+    missing = [email for email in emails if email not in profiles]
+    mongo_users = {}
+    if missing:
+        try:
+            mongo_users = {user.get('email'): user for user in MongoUser.find_by_emails(missing)}
+        except Exception:
+            logger.exception("Mongo user lookup failed for broadcast of %s recipients", len(missing))
+
+    records = []
+    for email in emails:
+        profile = profiles.get(email)
+        contact = _contact_from_profile(profile) if profile else _contact_from_mongo(email, mongo_users.get(email))
+        records.extend(_build_notifications(
+            email, contact, profile,
+            category=category, event=event, title=title, message=message, payload=payload,
+        ))
+    created = Notification.objects.bulk_create(records)
+
+    if send_immediately:
+        delivered = [record for record in created if _deliver(record)]
+        if delivered:
+            Notification.objects.bulk_update(delivered, ['status', 'status_reason', 'sent_at', 'updated_at'])
+    return len(emails)
+
+
 def notify_order_event(email, event, order=None, status=None):
     order_id = None
     if order is not None:
@@ -239,3 +272,27 @@ def notify_announcement(email, title, message, payload=None, send_immediately=Tr
         payload=payload or {},
         send_immediately=send_immediately,
     )
+
+
+def broadcast_offer(emails, title, message, payload=None, send_immediately=True):
+    return broadcast_notifications(
+        emails,
+        category='offer',
+        event='offer',
+        title=title,
+        message=message,
+        payload=payload or {},
+        send_immediately=send_immediately,
+    )
+
+
+def broadcast_announcement(emails, title, message, payload=None, send_immediately=True):
+    return broadcast_notifications(
+        emails,
+        category='announcement',
+        event='announcement',
+        title=title,
+        message=message,
+        payload=payload or {},
+        send_immediately=send_immediately,
+    )
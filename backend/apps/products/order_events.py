@@ -0,0 +1,382 @@
+"""
+Live order status stream (Server-Sent Events).
+`transition_order` publishes each committed OrderStatusEvent to an in-process hub that
+wakes the matching user's open streams, which then read new rows from the event table
+(ids double as SSE event ids, so `Last-Event-ID` resumes exactly). Streams also re-check
+the table on every heartbeat, which covers events written by other worker processes.
+The view is async, so under the ASGI app one idle connection costs no worker thread.
+
+Staff screens get a store-wide feed instead: one reader per process wakes on the hub's
+staff channel, waits briefly so bursts coalesce, reads the new events once and fans a
+compact diff ({"id", "new": [order summaries], "status": {orderDbId: status}}) out to
+every connected staff stream.
+"""
+
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
+
+from .models import Order, OrderStatusEvent
+
+
+EVENT_BATCH_SIZE = 100
+STAFF_CHANNEL = '*staff*'
+STAFF_DIFF_LIMIT = 500
+
+
+class OrderEventHub:
+    """Wakes asyncio listeners (possibly on other threads' loops) when an email gets an event."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = {}
+
+    def subscribe(self, email):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._listeners.setdefault(email, set()).add(waiter)
+        return waiter
+
+    def unsubscribe(self, email, waiter):
+        with self._lock:
+            waiters = self._listeners.get(email)
+            if waiters:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._listeners[email]
+
+    def publish(self, email):
+        with self._lock:
+            waiters = list(self._listeners.get(email, ()))
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed; the stream is gone and will unsubscribe itself.
+                pass
+
+    def listener_count(self):
+        with self._lock:
+            return sum(len(waiters) for waiters in self._listeners.values())
+
+
+hub = OrderEventHub()
+
+
+def publish_order_event(email):
+    """Called after commit for every new OrderStatusEvent."""
+    if email:
+        hub.publish(email)
+    hub.publish(STAFF_CHANNEL)
+
+
+def serialize_event(row):
+    return {
+        'id': row['id'],
+        'orderDbId': str(row['order_id']),
+        'status': row['status'],
+        'previousStatus': row['from_status'] or None,
+        'source': row['source'],
+        'timestamp': row['created_at'].isoformat() if row['created_at'] else None,
+    }
+
+
+def events_after(email, last_event_id, limit=EVENT_BATCH_SIZE):
+    rows = (
+        OrderStatusEvent.objects
+        .filter(email=email, id__gt=last_event_id)
+        .order_by('id')
+        .values('id', 'order_id', 'status', 'from_status', 'source', 'created_at')[:limit]
+    )
+    return [serialize_event(row) for row in rows]
+
+
+def latest_event_id(email):
+    return (
+        OrderStatusEvent.objects
+        .filter(email=email)
+        .order_by('-id')
+        .values_list('id', flat=True)
+        .first()
+    ) or 0
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: status\ndata: {json.dumps(event)}\n\n"
+
+
+def _parse_event_id(value):
+    value = str(value or '').strip()
+    return int(value) if value.isdigit() else None
+
+
+async def _stream(email, last_event_id):
+    heartbeat = getattr(settings, 'ORDER_EVENTS_HEARTBEAT_SECONDS', 15)
+    lifetime = getattr(settings, 'ORDER_EVENTS_MAX_STREAM_SECONDS', 300)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lifetime
+    waiter = hub.subscribe(email)
+    _loop, wake = waiter
+    fetch = sync_to_async(events_after)
+    try:
+        # Reconnecting clients wait this long before retrying and resume from Last-Event-ID.
+        yield f"retry: {getattr(settings, 'ORDER_EVENTS_RETRY_MS', 3000)}\n\n"
+        while True:
+            wake.clear()
+            events = await fetch(email, last_event_id)
+            for event in events:
+                last_event_id = event['id']
+                yield format_sse(event)
+            if len(events) == EVENT_BATCH_SIZE:
+                continue
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+    finally:
+        hub.unsubscribe(email, waiter)
+
+
+@require_http_methods(["GET"])
+async def order_event_stream(request):
+    """
+    Stream the signed-in user's order status events as text/event-stream.
+    Resumes after the `Last-Event-ID` header (or ?lastEventId=); without one the stream
+    starts at the current latest event, since the page already loaded /api/orders/.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'success': False, 'message': 'Authentication required'}, status=401)
+    # Same identity get_orders uses, so events match the orders' stored email.
+    email = user.email or user.username
+    if not email:
+        return JsonResponse({'success': False, 'message': 'Email is required'}, status=400)
+
+    last_event_id = _parse_event_id(request.headers.get('Last-Event-ID'))
+    if last_event_id is None:
+        last_event_id = _parse_event_id(request.GET.get('lastEventId'))
+    if last_event_id is None:
+        last_event_id = await sync_to_async(latest_event_id)(email)
+
+    response = StreamingHttpResponse(_stream(email, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ==========================================
+# STAFF ORDER FEED
+# ==========================================
+
+def _summarize_order(row):
+    extra = row['extra_fields'] if isinstance(row['extra_fields'], dict) else {}
+    items = row['items'] if isinstance(row['items'], list) else []
+    return {
+        'id': str(row['id']),
+        'orderId': extra.get('clientOrderId') or str(row['id']),
+        'email': row['email'],
+        'name': row['order_name'] or row['customer_name'] or '',
+        'items': len(items),
+        'total': float(row['total_amount'] or 0),
+        'status': row['status'],
+        'at': row['created_at'].isoformat() if row['created_at'] else None,
+    }
+
+
+def build_staff_diff(after_id, limit=STAFF_DIFF_LIMIT):
+    """
+    Fold events after `after_id` into one diff: summaries for orders created in the
+    range and the latest status of every other order that moved.
+    Returns (last_event_id, diff) with diff None if nothing happened, or
+    {'reset': True} if more than `limit` events are pending.
+    """
+    rows = list(
+        OrderStatusEvent.objects
+        .filter(id__gt=after_id)
+        .order_by('id')
+        .values_list('id', 'order_id', 'from_status', 'status')[:limit + 1]
+    )
+    if not rows:
+        return after_id, None
+    if len(rows) > limit:
+        # Too far behind to diff; clients reload, so skip straight to the newest event.
+        last_id = latest_staff_event_id()
+        return last_id, {'id': last_id, 'reset': True}
+
+    created = []
+    statuses = {}
+    for _event_id, order_id, from_status, status in rows:
+        if not from_status and order_id not in statuses:
+            created.append(order_id)
+        statuses[order_id] = status
+
+    new_orders = [
+        _summarize_order(row)
+        for row in Order.objects.filter(id__in=created).order_by('id').values(
+            'id', 'email', 'order_name', 'customer_name', 'items', 'total_amount',
+            'status', 'created_at', 'extra_fields',
+        )
+    ]
+    for order_id in created:
+        statuses.pop(order_id, None)
+    last_id = rows[-1][0]
+    return last_id, {
+        'id': last_id,
+        'new': new_orders,
+        'status': {str(order_id): status for order_id, status in statuses.items()},
+    }
+
+
+def latest_staff_event_id():
+    return OrderStatusEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+class StaffFeedSubscriber:
+    def __init__(self, maxsize):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, diff):
+        # Runs on the subscriber's loop; a screen that can't keep up gets one reset
+        # marker (reload the snapshot) instead of an unbounded backlog.
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'id': diff['id'], 'reset': True})
+            return
+        self.queue.put_nowait(diff)
+
+
+class StaffOrderFeed:
+    """Per-process fan-out: one reader task serves every connected staff stream."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._task = None
+        self.last_id = None
+
+    def subscribe(self, maxsize):
+        subscriber = StaffFeedSubscriber(maxsize)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._task is None or self._task.done() or self._task.get_loop().is_closed():
+                self._task = subscriber.loop.create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _broadcast(self, diff):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, diff)
+            except RuntimeError:
+                self.unsubscribe(subscriber)
+
+    async def _run(self):
+        heartbeat = getattr(settings, 'ORDER_EVENTS_HEARTBEAT_SECONDS', 15)
+        coalesce = getattr(settings, 'STAFF_FEED_COALESCE_SECONDS', 0.25)
+        waiter = hub.subscribe(STAFF_CHANNEL)
+        _loop, wake = waiter
+        try:
+            if self.last_id is None:
+                self.last_id = await sync_to_async(latest_staff_event_id)()
+            while self.subscriber_count():
+                wake.clear()
+                last_id, diff = await sync_to_async(build_staff_diff)(self.last_id)
+                if diff:
+                    self.last_id = last_id
+                    self._broadcast(diff)
+                    continue
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    # Re-read anyway: picks up events committed by other processes.
+                    continue
+                await asyncio.sleep(coalesce)
+        finally:
+            hub.unsubscribe(STAFF_CHANNEL, waiter)
+
+
+staff_feed = StaffOrderFeed()
+
+
+def format_staff_diff(diff):
+    name = 'reset' if diff.get('reset') else 'diff'
+    return f"id: {diff['id']}\nevent: {name}\ndata: {json.dumps(diff, separators=(',', ':'))}\n\n"
+
+
+async def _staff_stream(last_event_id):
+    heartbeat = getattr(settings, 'ORDER_EVENTS_HEARTBEAT_SECONDS', 15)
+    lifetime = getattr(settings, 'ORDER_EVENTS_MAX_STREAM_SECONDS', 300)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lifetime
+    subscriber = staff_feed.subscribe(getattr(settings, 'STAFF_FEED_QUEUE_SIZE', 50))
+    try:
+        yield f"retry: {getattr(settings, 'ORDER_EVENTS_RETRY_MS', 3000)}\n\n"
+        if last_event_id is None:
+            sent_id = await sync_to_async(latest_staff_event_id)()
+        else:
+            # Catch up from Last-Event-ID; diffs already queued for this range are skipped.
+            sent_id, diff = await sync_to_async(build_staff_diff)(last_event_id)
+            if diff:
+                yield format_staff_diff(diff)
+                if diff.get('reset'):
+                    return
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                diff = await asyncio.wait_for(subscriber.queue.get(), timeout=min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if diff['id'] <= sent_id and not diff.get('reset'):
+                continue
+            sent_id = diff['id']
+            yield format_staff_diff(diff)
+            if diff.get('reset'):
+                return
+    finally:
+        staff_feed.unsubscribe(subscriber)
+
+
+@require_http_methods(["GET"])
+async def staff_order_feed(request):
+    """
+    Staff-only live feed of new orders and status changes across all customers.
+    `event: diff` messages carry {"id", "new": [...], "status": {orderDbId: status}};
+    `event: reset` means the client fell too far behind and should reload its snapshot.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'success': False, 'message': 'Authentication required'}, status=401)
+    if not (user.is_staff or user.is_superuser):
+        return JsonResponse({'success': False, 'message': 'Staff access required'}, status=403)
+
+    last_event_id = _parse_event_id(request.headers.get('Last-Event-ID'))
+    if last_event_id is None:
+        last_event_id = _parse_event_id(request.GET.get('lastEventId'))
+
+    response = StreamingHttpResponse(_staff_stream(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
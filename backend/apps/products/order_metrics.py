@@ -0,0 +1,230 @@
+"""
+Materialized order metrics for the staff dashboard.
+Per-status counters and daily revenue rollups are adjusted incrementally whenever
+an order is created or changes status, so the dashboard never has to count the
+orders table. Callers run the increments inside the transaction that writes the
+order, so a failed increment rolls the write back instead of leaving the counters
+behind. `recompute_order_metrics()` rebuilds everything from scratch and is meant
+to run periodically (see the `recompute_order_metrics` management command) to
+correct any drift from bulk edits made outside these helpers.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyOrderRollup, Order, OrderStatusCount
+
+
+# Statuses that represent money actually received for an order.
+REVENUE_STATUSES = frozenset({'paid', 'confirmed', 'preparing', 'ready', 'delivered'})
+USER_COUNT_CACHE_KEY = 'order_metrics:total_users'
+USER_COUNT_CACHE_SECONDS = 60
+
+
+def _normalize_status(status):
+    return str(status or '').strip().lower() or 'pending'
+
+
+def _order_day(order):
+    created_at = getattr(order, 'created_at', None) or timezone.now()
+    return timezone.localdate(created_at)
+
+
+def _order_amount(order):
+    return Decimal(str(getattr(order, 'total_amount', None) or 0))
+
+
+def _bump_status(status, delta):
+    updated = OrderStatusCount.objects.filter(status=status).update(count=F('count') + delta)
+    if not updated:
+        OrderStatusCount.objects.get_or_create(status=status)
+        OrderStatusCount.objects.filter(status=status).update(count=F('count') + delta)
+
+
+def _bump_day(day, orders_placed=0, paid_orders=0, revenue=Decimal('0')):
+    changes = {
+        'orders_placed': F('orders_placed') + orders_placed,
+        'paid_orders': F('paid_orders') + paid_orders,
+        'revenue': F('revenue') + revenue,
+    }
+    updated = DailyOrderRollup.objects.filter(date=day).update(**changes)
+    if not updated:
+        DailyOrderRollup.objects.get_or_create(date=day)
+        DailyOrderRollup.objects.filter(date=day).update(**changes)
+
+
+def _count_order(order, sign):
+    status = _normalize_status(order.status)
+    paid = status in REVENUE_STATUSES
+    with transaction.atomic():
+        _bump_status(status, sign)
+        _bump_day(
+            _order_day(order),
+            orders_placed=sign,
+            paid_orders=sign if paid else 0,
+            revenue=_order_amount(order) * sign if paid else Decimal('0'),
+        )
+
+
+def record_order_created(order):
+    """Count a newly persisted order in the status counters and its day's rollup."""
+    _count_order(order, 1)
+
+
+def record_order_deleted(order):
+    """
+    Undo record_order_created for an order that is being deleted.
+    Call it in the same transaction as the delete so the counters never drift.
+    """
+    _count_order(order, -1)
+
+
+def _bump_many(model, key, deltas):
+    """Apply {key_value: {field: delta}} to many counter rows with one INSERT and one UPDATE."""
+    model.objects.bulk_create([model(**{key: value}) for value in deltas], ignore_conflicts=True)
+    fields = {field for changes in deltas.values() for field in changes}
+    model.objects.filter(**{f'{key}__in': list(deltas)}).update(**{
+        field: F(field) + Case(
+            *[When(**{key: value}, then=Value(changes.get(field, 0))) for value, changes in deltas.items()],
+            default=Value(0),
+            output_field=model._meta.get_field(field),
+        )
+        for field in fields
+    })
+
+
+def record_orders_created(orders):
+    """record_order_created for a batch of orders with a fixed number of queries."""
+    status_deltas = {}
+    day_deltas = {}
+    for order in orders:
+        status = _normalize_status(order.status)
+        paid = status in REVENUE_STATUSES
+        status_deltas.setdefault(status, {'count': 0})['count'] += 1
+        day = day_deltas.setdefault(
+            _order_day(order), {'orders_placed': 0, 'paid_orders': 0, 'revenue': Decimal('0')},
+        )
+        day['orders_placed'] += 1
+        if paid:
+            day['paid_orders'] += 1
+            day['revenue'] += _order_amount(order)
+    if not status_deltas:
+        return
+    with transaction.atomic():
+        _bump_many(OrderStatusCount, 'status', status_deltas)
+        _bump_many(DailyOrderRollup, 'date', day_deltas)
+
+
+def record_status_change(order, old_status, new_status):
+    """Move an order between status counters and adjust revenue if it crossed the paid boundary."""
+    old_status = _normalize_status(old_status)
+    new_status = _normalize_status(new_status)
+    if old_status == new_status:
+        return
+    was_paid = old_status in REVENUE_STATUSES
+    is_paid = new_status in REVENUE_STATUSES
+    with transaction.atomic():
+        _bump_status(old_status, -1)
+        _bump_status(new_status, 1)
+        if was_paid != is_paid:
+            sign = 1 if is_paid else -1
+            _bump_day(
+                _order_day(order),
+                paid_orders=sign,
+                revenue=_order_amount(order) * sign,
+            )
+
+
+def recompute_order_metrics(apps=None):
+    """
+    Rebuild status counters and daily rollups from the orders table.
+    Migrations pass their app registry so the historical models are used.
+    """
+    order_model, count_model, rollup_model = (
+        (Order, OrderStatusCount, DailyOrderRollup) if apps is None else (
+            apps.get_model('products', 'Order'),
+            apps.get_model('products', 'OrderStatusCount'),
+            apps.get_model('products', 'DailyOrderRollup'),
+        )
+    )
+    status_rows = order_model.objects.values('status').annotate(total=Count('id'))
+    counts = {}
+    for row in status_rows:
+        status = _normalize_status(row['status'])
+        counts[status] = counts.get(status, 0) + row['total']
+
+    paid_filter = Q(status__in=REVENUE_STATUSES)
+    day_rows = (
+        order_model.objects
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(
+            orders_placed=Count('id'),
+            paid_orders=Count('id', filter=paid_filter),
+            revenue=Sum('total_amount', filter=paid_filter),
+        )
+    )
+    rollups = [
+        rollup_model(
+            date=row['day'],
+            orders_placed=row['orders_placed'],
+            paid_orders=row['paid_orders'],
+            revenue=row['revenue'] or Decimal('0'),
+        )
+        for row in day_rows
+        if row['day'] is not None
+    ]
+
+    with transaction.atomic():
+        count_model.objects.all().delete()
+        count_model.objects.bulk_create(
+            [count_model(status=status, count=total) for status, total in counts.items()]
+        )
+        rollup_model.objects.all().delete()
+        rollup_model.objects.bulk_create(rollups)
+
+    return {'statuses': len(counts), 'days': len(rollups)}
+
+
+def _total_users():
+    total = cache.get(USER_COUNT_CACHE_KEY)
+    if total is None:
+        total = get_user_model().objects.count()
+        cache.set(USER_COUNT_CACHE_KEY, total, USER_COUNT_CACHE_SECONDS)
+    return total
+
+
+def get_order_metrics(days=14):
+    """
+    Return the materialized dashboard metrics as a JSON-serializable dict.
+    Reads only the small counter/rollup tables (migration 0011 backfilled them).
+    """
+    counters = {row.status: row.count for row in OrderStatusCount.objects.all()}
+
+    since = timezone.localdate() - timedelta(days=max(days, 1) - 1)
+    daily = [
+        {
+            'date': row.date.isoformat(),
+            'ordersPlaced': row.orders_placed,
+            'paidOrders': row.paid_orders,
+            'revenue': float(row.revenue),
+        }
+        for row in DailyOrderRollup.objects.filter(date__gte=since).order_by('date')
+    ]
+
+    return {
+        'totalOrders': sum(counters.values()),
+        'pendingOrders': counters.get('pending', 0),
+        'completedOrders': counters.get('paid', 0),
+        'statusCounts': counters,
+        'totalUsers': _total_users(),
+        'daily': daily,
+        'generatedAt': timezone.now().isoformat(),
+    }
@@ -0,0 +1,145 @@
+"""
+Order status state machine.
+Every status change goes through `transition_order`, which validates the move against
+ALLOWED_TRANSITIONS, applies it with a conditional `UPDATE ... WHERE status=<old>`
+(so concurrent writers can never silently overwrite each other) and appends one
+`OrderStatusEvent` row instead of rewriting a history list inside `extra_fields`;
+the dashboard counters are adjusted in the same transaction.
+"""
+
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderStatusEvent
+from .order_events import publish_order_event
+from .order_metrics import record_status_change
+
+
+CANCELLED_ALIASES = ('cancelled', 'canceled', 'cancel')
+FINAL_STATUSES = frozenset({'delivered', 'cancelled'})
+ALLOWED_TRANSITIONS = {
+    'pending': frozenset({'processing', 'paid', 'confirmed', 'preparing', 'ready', 'delivered', 'cancelled'}),
+    'processing': frozenset({'pending', 'paid', 'confirmed', 'preparing', 'ready', 'delivered', 'cancelled'}),
+    'paid': frozenset({'confirmed', 'preparing', 'ready', 'delivered', 'cancelled'}),
+    'confirmed': frozenset({'preparing', 'ready', 'delivered', 'cancelled'}),
+    'preparing': frozenset({'ready', 'delivered', 'cancelled'}),
+    'ready': frozenset({'delivered', 'cancelled'}),
+    'delivered': frozenset(),
+    'cancelled': frozenset(),
+}
+ORDER_STATUSES = tuple(ALLOWED_TRANSITIONS)
+logger = logging.getLogger(__name__)
+
+
+class TransitionError(Exception):
+    """Base error for rejected status transitions."""
+
+
+class InvalidTransition(TransitionError):
+    """The state machine does not allow moving between these statuses."""
+
+
+class StaleTransition(TransitionError):
+    """The order's status changed underneath us (lost the conditional update)."""
+
+
+def normalize_status(status):
+    status = str(status or '').strip().lower()
+    if status in CANCELLED_ALIASES:
+        return 'cancelled'
+    return status or 'pending'
+
+
+def can_transition(current, new):
+    current = normalize_status(current)
+    new = normalize_status(new)
+    if new not in ALLOWED_TRANSITIONS:
+        return False
+    # Legacy rows may carry statuses outside the machine; let them join it.
+    allowed = ALLOWED_TRANSITIONS.get(current)
+    if allowed is None:
+        return True
+    return new in allowed
+
+
+def _publish_on_commit(email):
+    transaction.on_commit(lambda: publish_order_event(email))
+
+
+def record_initial_status(order, source=''):
+    """Append the first history event for a freshly created order."""
+    event = OrderStatusEvent.objects.create(
+        order_id=order.id,
+        email=order.email,
+        from_status='',
+        status=normalize_status(order.status),
+        source=source,
+    )
+    _publish_on_commit(order.email)
+    return event
+
+
+def transition_order(order, new_status, source=''):
+    """
+    Move `order` to `new_status` atomically.
+    Returns the created OrderStatusEvent, or None if the order already had that status.
+    Raises InvalidTransition or StaleTransition; on success `order` is updated in memory.
+    """
+    stored_status = order.status
+    current = normalize_status(stored_status)
+    new = normalize_status(new_status)
+    if current == new:
+        return None
+    if not can_transition(current, new):
+        raise InvalidTransition(f'Cannot change status from {current} to {new}')
+
+    now = timezone.now()
+    with transaction.atomic():
+        updated = (
+            Order.objects
+            .filter(id=order.id, status=stored_status)
+            .update(status=new, updated_at=now)
+        )
+        if not updated:
+            raise StaleTransition(f'Order {order.id} status changed concurrently')
+        event = OrderStatusEvent.objects.create(
+            order_id=order.id,
+            email=order.email,
+            from_status=current,
+            status=new,
+            source=source,
+        )
+        # Counters move in the same transaction: if they fail, the transition rolls back.
+        record_status_change(order, current, new)
+        _publish_on_commit(order.email)
+
+    order.status = new
+    order.updated_at = now
+    return event
+
+
+def status_history(orders):
+    """
+    Return {order_id: [{'status', 'timestamp'}, ...]} for the given orders.
+    Legacy `extra_fields.trackingHistory` entries come first, then the event table.
+    """
+    history = {}
+    for order in orders:
+        extra = order.extra_fields if isinstance(order.extra_fields, dict) else {}
+        legacy = extra.get('trackingHistory')
+        history[order.id] = list(legacy) if isinstance(legacy, list) else []
+
+    events = (
+        OrderStatusEvent.objects
+        .filter(order_id__in=list(history))
+        .order_by('id')
+        .values_list('order_id', 'status', 'created_at')
+    )
+    for order_id, status, created_at in events:
+        history[order_id].append({
+            'status': status,
+            'timestamp': created_at.isoformat() if created_at else None,
+        })
+    return history
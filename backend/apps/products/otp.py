@@ -0,0 +1,184 @@
+"""
+One-time password service shared by every OTP flow.
+Codes live in a TTL-keyed store holding at most one live code per (purpose, email):
+issuing replaces the previous code, expiry is left to the store, and each check
+counts the attempt with a single atomic increment before the code is compared.
+The cache store (Redis when REDIS_URL is set) is preferred; the database store is
+the fallback for deployments without a shared cache, and its abandoned expired rows
+are removed by the periodic `purge_expired_otps` command.
+"""
+
+import hmac
+import random
+from abc import ABC, abstractmethod
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OTPToken
+
+
+PASSWORD_RESET = 'password_reset'
+# /api/send-otp-email/ + /api/validate-otp/ codes; never accepted by a password reset.
+EMAIL_VERIFICATION = 'email_verification'
+OTP_MISSING = 'missing'
+OTP_LOCKED = 'too_many_attempts'
+OTP_INVALID = 'invalid'
+OTP_ERROR_MESSAGES = {
+    OTP_MISSING: 'OTP not found or expired',
+    OTP_LOCKED: 'Too many attempts',
+    OTP_INVALID: 'Invalid OTP',
+}
+
+
+class OTPStore(ABC):
+    """
+    Storage interface for OTPs.
+    `check` returns None when the code matches, otherwise one of the OTP_* reasons.
+    """
+
+    @abstractmethod
+    def issue(self, purpose, email, code, ttl_seconds):
+        ...
+
+    @abstractmethod
+    def check(self, purpose, email, code, max_attempts, consume=False):
+        ...
+
+    @abstractmethod
+    def revoke(self, purpose, email):
+        ...
+
+
+class CacheOTPStore(OTPStore):
+    """Keeps the code and its attempt counter as two cache keys sharing one TTL."""
+
+    def _keys(self, purpose, email):
+        key = f"otp:{purpose}:{email}"
+        return key, f"{key}:attempts"
+
+    def issue(self, purpose, email, code, ttl_seconds):
+        code_key, attempts_key = self._keys(purpose, email)
+        cache.set_many({code_key: code, attempts_key: 0}, timeout=ttl_seconds)
+
+    def check(self, purpose, email, code, max_attempts, consume=False):
+        code_key, attempts_key = self._keys(purpose, email)
+        try:
+            attempts = cache.incr(attempts_key)
+        except ValueError:
+            return OTP_MISSING
+        if attempts > max_attempts:
+            return OTP_LOCKED
+        stored = cache.get(code_key)
+        if stored is None:
+            return OTP_MISSING
+        if not hmac.compare_digest(str(stored), code):
+            return OTP_INVALID
+        # delete() reports whether this caller removed the key, so a code is consumed once.
+        if consume and not cache.delete(code_key):
+            return OTP_MISSING
+        if consume:
+            cache.delete(attempts_key)
+        return None
+
+    def revoke(self, purpose, email):
+        cache.delete_many(list(self._keys(purpose, email)))
+
+
+class DatabaseOTPStore(OTPStore):
+    """Stores codes in OTPToken rows, one per (purpose, email), using conditional updates."""
+
+    def issue(self, purpose, email, code, ttl_seconds):
+        # The upsert replaces this (purpose, email)'s previous row, expired or not; other
+        # expired rows are left to purge_expired (the purge_expired_otps command).
+        now = timezone.now()
+        OTPToken.objects.bulk_create(
+            [OTPToken(
+                purpose=purpose,
+                email=email,
+                code=code,
+                attempts=0,
+                created_at=now,
+                expires_at=now + timedelta(seconds=ttl_seconds),
+            )],
+            update_conflicts=True,
+            unique_fields=['purpose', 'email'],
+            update_fields=['code', 'attempts', 'created_at', 'expires_at'],
+        )
+
+    def check(self, purpose, email, code, max_attempts, consume=False):
+        now = timezone.now()
+        tokens = OTPToken.objects.filter(purpose=purpose, email=email)
+        counted = (
+            tokens
+            .filter(expires_at__gt=now, attempts__lt=max_attempts)
+            .update(attempts=F('attempts') + 1)
+        )
+        if not counted:
+            token = tokens.values_list('expires_at', flat=True).first()
+            if token is None:
+                return OTP_MISSING
+            if token <= now:
+                tokens.filter(expires_at__lte=now).delete()
+                return OTP_MISSING
+            return OTP_LOCKED
+
+        stored = tokens.values_list('code', flat=True).first()
+        if stored is None:
+            return OTP_MISSING
+        if not hmac.compare_digest(stored, code):
+            return OTP_INVALID
+        if consume and not tokens.filter(code=stored).delete()[0]:
+            return OTP_MISSING
+        return None
+
+    def revoke(self, purpose, email):
+        OTPToken.objects.filter(purpose=purpose, email=email).delete()
+
+    def purge_expired(self):
+        """Delete every expired row; returns how many were removed."""
+        return OTPToken.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def get_otp_store():
+    backend = getattr(settings, 'OTP_STORE_BACKEND', 'apps.products.otp.DatabaseOTPStore')
+    return import_string(backend)()
+
+
+def _normalize_email(email):
+    return str(email or '').strip().lower()
+
+
+def generate_code():
+    return f"{random.SystemRandom().randint(0, 999999):06d}"
+
+
+def issue_otp(email, purpose=PASSWORD_RESET, code=None, ttl_minutes=None):
+    """Store a new code for email (replacing any previous one) and return it."""
+    code = str(code or generate_code()).strip()
+    if ttl_minutes is None:
+        ttl_minutes = getattr(settings, 'PASSWORD_RESET_OTP_EXPIRY_MINUTES', 5)
+    get_otp_store().issue(purpose, _normalize_email(email), code, int(ttl_minutes * 60))
+    return code
+
+
+def check_otp(email, code, purpose=PASSWORD_RESET, consume=False):
+    """
+    Check a submitted code. Every check counts toward PASSWORD_RESET_OTP_MAX_ATTEMPTS.
+    With consume=True a matching code is removed so it can only be used once.
+    Returns (valid, reason) where reason is None or one of the OTP_* constants.
+    """
+    code = str(code or '').strip()
+    if not code:
+        return False, OTP_INVALID
+    max_attempts = getattr(settings, 'PASSWORD_RESET_OTP_MAX_ATTEMPTS', 5)
+    reason = get_otp_store().check(purpose, _normalize_email(email), code, max_attempts, consume=consume)
+    return reason is None, reason
+
+
+def revoke_otp(email, purpose=PASSWORD_RESET):
+    get_otp_store().revoke(purpose, _normalize_email(email))
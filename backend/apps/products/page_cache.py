@@ -0,0 +1,119 @@
+"""
+Full-page cache for the anonymous public and auth pages.
+Those templates render to the same bytes for every anonymous visitor (the CSRF token
+travels in a cookie, never in the markup), so `cache_anonymous_page` keeps the rendered
+body in a small per-process memory tier backed by the default cache (Redis when
+REDIS_URL is set, so one worker's render serves them all).
+
+* Keys combine the path, a hash of the template source and PAGE_CACHE_RELEASE, so a
+  deploy that changes a template (or sets a new release id) never serves stale pages.
+* A hit still calls `get_token`, so CsrfViewMiddleware issues the visitor's own CSRF
+  cookie exactly as `ensure_csrf_cookie` would on a render.
+* Requests with a logged-in user or a session email always render dynamically.
+"""
+
+import hashlib
+import threading
+import time
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import get_template
+
+from . import metrics
+
+
+PAGE_CACHE_REQUESTS = metrics.Counter(
+    'ckh_page_cache_requests_total', 'Anonymous page requests by cache result.', ['result'],
+)
+_local = {}  # key -> (expires_at, entry), per process
+_local_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _template_hash(template_name):
+    return hashlib.sha1(get_template(template_name).template.source.encode('utf-8')).hexdigest()[:12]
+
+
+def template_version(template_name):
+    if settings.DEBUG:
+        _template_hash.cache_clear()
+    return _template_hash(template_name)
+
+
+def page_key(path, template_name):
+    release = getattr(settings, 'PAGE_CACHE_RELEASE', '')
+    return f"page_cache:{release}:{template_version(template_name)}:{path}"
+
+
+def is_anonymous(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return False
+    # Customer logins are recorded in the session ('email'), not always as a Django user.
+    return not request.session.get('email')
+
+
+def _get(key):
+    now = time.monotonic()
+    with _local_lock:
+        local = _local.get(key)
+    if local is not None and local[0] > now:
+        return local[1], 'local'
+    entry = cache.get(key)
+    if entry is not None:
+        _store_local(key, entry)
+        return entry, 'shared'
+    return None, 'miss'
+
+
+def _store_local(key, entry):
+    timeout = getattr(settings, 'PAGE_CACHE_LOCAL_SECONDS', 30)
+    limit = getattr(settings, 'PAGE_CACHE_LOCAL_ENTRIES', 64)
+    with _local_lock:
+        if len(_local) >= limit and key not in _local:
+            _local.pop(min(_local, key=lambda k: _local[k][0]))
+        _local[key] = (time.monotonic() + timeout, entry)
+
+
+def clear_local():
+    with _local_lock:
+        _local.clear()
+
+
+def cache_anonymous_page(template_name):
+    """Serve the view's anonymous GET/HEAD renders from the page cache."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                not getattr(settings, 'PAGE_CACHE_ENABLED', True)
+                or request.method not in ('GET', 'HEAD')
+                or not is_anonymous(request)
+            ):
+                return view(request, *args, **kwargs)
+
+            key = page_key(request.path, template_name)
+            entry, source = _get(key)
+            if entry is not None:
+                PAGE_CACHE_REQUESTS.inc(result=source)
+                get_token(request)
+                response = HttpResponse(entry['content'], content_type=entry['content_type'])
+                response['X-Page-Cache'] = 'hit'
+                return response
+
+            PAGE_CACHE_REQUESTS.inc(result='miss')
+            response = view(request, *args, **kwargs)
+            # ensure_csrf_cookie has set this visitor's CSRF cookie by now; only the body is kept.
+            other_cookies = set(response.cookies) - {settings.CSRF_COOKIE_NAME}
+            if response.status_code == 200 and not response.streaming and not other_cookies:
+                entry = {'content': response.content, 'content_type': response['Content-Type']}
+                cache.set(key, entry, getattr(settings, 'PAGE_CACHE_SECONDS', 600))
+                _store_local(key, entry)
+                response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
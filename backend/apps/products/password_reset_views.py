@@ -1,7 +1,5 @@
 import json
-import random
 import logging
-from datetime import timedelta
 from zoneinfo import ZoneInfo
 
 from django.conf import settings
@@ -11,7 +9,8 @@ from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-from .models import PasswordResetOTP
+from .otp import OTP_ERROR_MESSAGES, check_otp, issue_otp
+from .ratelimit import rate_limit
 from .email_templates import send_templated_email
 from database.models import User as MongoUser
 
@@ -22,7 +21,6 @@ except Exception:
 
 
 OTP_EXPIRY_MINUTES = getattr(settings, 'PASSWORD_RESET_OTP_EXPIRY_MINUTES', 5)
-OTP_MAX_ATTEMPTS = getattr(settings, 'PASSWORD_RESET_OTP_MAX_ATTEMPTS', 5)
 logger = logging.getLogger(__name__)
 
 
@@ -35,23 +33,6 @@ def _get_user_by_email(email):
     return user_model.objects.filter(email__iexact=email).first()
 
 
-def _invalidate_existing_otps(email):
-    PasswordResetOTP.objects.filter(email__iexact=email, is_used=False).update(is_used=True)
-
-
-def _create_otp_record(user, email):
-    otp = f"{random.SystemRandom().randint(0, 999999):06d}"
-    now = timezone.now()
-    expires_at = now + timedelta(minutes=OTP_EXPIRY_MINUTES)
-    record = PasswordResetOTP.objects.create(
-        user=user,
-        email=email,
-        otp=otp,
-        expires_at=expires_at
-    )
-    return otp, record
-
-
 def _send_otp_email(email, otp):
     subject = "Your Password Reset OTP"
 
@@ -81,46 +62,9 @@ def _send_otp_email(email, otp):
         raise RuntimeError(reason or "otp_email_send_failed")
 
 
-def _get_latest_active_otp(email):
-    return (
-        PasswordResetOTP.objects
-        .filter(email__iexact=email, is_used=False)
-        .order_by('-created_at')
-        .first()
-    )
-
-
-def _is_expired(record):
-    return record.expires_at and record.expires_at <= timezone.now()
-
-
-def _register_failed_attempt(record):
-    record.attempts = (record.attempts or 0) + 1
-    record.last_attempt_at = timezone.now()
-    if record.attempts >= OTP_MAX_ATTEMPTS:
-        record.is_used = True
-    record.save(update_fields=['attempts', 'last_attempt_at', 'is_used'])
-
-
-def _validate_otp(record, otp):
-    if not record:
-        return False, "OTP not found"
-    if _is_expired(record):
-        record.is_used = True
-        record.save(update_fields=['is_used'])
-        return False, "OTP expired"
-    if record.attempts >= OTP_MAX_ATTEMPTS:
-        record.is_used = True
-        record.save(update_fields=['is_used'])
-        return False, "Too many attempts"
-    if record.otp != str(otp):
-        _register_failed_attempt(record)
-        return False, "Invalid OTP"
-    return True, None
-
-
 @csrf_exempt
 @require_http_methods(["POST"])
+@rate_limit('otp')
 def forgot_password(request):
     """
     Forgot password endpoint - sends OTP to user email.
@@ -137,9 +81,8 @@ def forgot_password(request):
         if not user:
             return JsonResponse({'message': 'Email not found'}, status=404)
 
-        # Invalidate any previous OTPs for this email to prevent reuse.
-        _invalidate_existing_otps(email)
-        otp, _record = _create_otp_record(user, email)
+        # Issuing replaces any previous OTP for this email, so old codes stop working.
+        otp = issue_otp(email, ttl_minutes=OTP_EXPIRY_MINUTES)
 
         try:
             # Send OTP to user's email using configured Gmail SMTP.
@@ -171,16 +114,10 @@ def verify_otp(request):
         if not email or not otp:
             return JsonResponse({'message': 'Email and OTP are required'}, status=400)
 
-        record = _get_latest_active_otp(email)
-        # Validate OTP against latest active record (expiry + attempt limits).
-        valid, error_message = _validate_otp(record, otp)
+        # Checks expiry and attempt limits; the code stays valid for the reset step.
+        valid, reason = check_otp(email, otp)
         if not valid:
-            return JsonResponse({'message': error_message}, status=400)
-
-        # Mark OTP as verified to support multi-step flows if needed.
-        record.is_verified = True
-        record.verified_at = timezone.now()
-        record.save(update_fields=['is_verified', 'verified_at'])
+            return JsonResponse({'message': OTP_ERROR_MESSAGES[reason]}, status=400)
 
         return JsonResponse({'message': 'OTP verified'})
 
@@ -214,11 +151,10 @@ def reset_password(request):
         if not user:
             return JsonResponse({'message': 'Email not found'}, status=404)
 
-        record = _get_latest_active_otp(email)
-        # OTP must match, be unexpired, and not exceed max attempts.
-        valid, error_message = _validate_otp(record, otp)
+        # OTP must match, be unexpired, and not exceed max attempts; it is consumed here.
+        valid, reason = check_otp(email, otp, consume=True)
         if not valid:
-            return JsonResponse({'message': error_message}, status=400)
+            return JsonResponse({'message': OTP_ERROR_MESSAGES[reason]}, status=400)
 
         # Update Django user's password securely.
         user.set_password(new_password)
@@ -234,9 +170,6 @@ def reset_password(request):
         except Exception:
             logger.exception("Mongo password sync failed for email=%s", email)
 
-        # Delete OTP record after successful reset.
-        record.delete()
-
         return JsonResponse({'message': 'Password reset successfully'})
 
     except json.JSONDecodeError:
@@ -0,0 +1,143 @@
+"""
+Razorpay webhook ingestion.
+The endpoint only verifies the HMAC signature and stores the raw delivery in the
+PaymentWebhookEvent inbox with a single insert, then returns 200. Events are applied
+to Payment/Order by `process_webhook_events`, which runs after commit in the
+background queue and from the `process_payment_webhooks` management command.
+A claim that has sat in 'processing' too long (the worker died) is put back by
+`requeue_stale_webhook_events`, judged by when it was claimed, not when it arrived.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .models import PaymentWebhookEvent
+from .tasks import defer
+from .views import _mark_payment_failed, _mark_payment_verified
+
+
+HANDLED_EVENTS = ('payment.captured', 'payment.failed', 'order.paid')
+MAX_ATTEMPTS = 5
+logger = logging.getLogger(__name__)
+
+
+def _valid_signature(body, signature):
+    secret = getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', '')
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def razorpay_webhook(request):
+    """
+    Receive a signed Razorpay webhook (payment.captured, payment.failed, order.paid).
+    Headers: X-Razorpay-Signature (HMAC-SHA256 of the body), X-Razorpay-Event-Id
+    """
+    if not getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', ''):
+        return JsonResponse({'success': False, 'message': 'Webhook secret is not configured'}, status=503)
+
+    body = request.body
+    if not _valid_signature(body, request.headers.get('X-Razorpay-Signature', '')):
+        return JsonResponse({'success': False, 'message': 'Invalid webhook signature'}, status=400)
+
+    try:
+        event = str(json.loads(body).get('event') or '')[:64]
+    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Invalid JSON'}, status=400)
+
+    event_id = request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(body).hexdigest()
+    # Redeliveries share the event id; ignore_conflicts keeps this a single INSERT.
+    PaymentWebhookEvent.objects.bulk_create(
+        [PaymentWebhookEvent(event_id=event_id[:128], event=event, body=body.decode('utf-8'))],
+        ignore_conflicts=True,
+    )
+    defer(process_webhook_events)
+    return JsonResponse({'success': True})
+
+
+def _payment_entity(payload):
+    return ((payload.get('payload') or {}).get('payment') or {}).get('entity') or {}
+
+
+def apply_webhook_event(record):
+    """Apply one inbox event to Payment/Order. Returns the final inbox status."""
+    payload = json.loads(record.body)
+    event = payload.get('event') or record.event
+    if event not in HANDLED_EVENTS:
+        return 'ignored'
+
+    payment = _payment_entity(payload)
+    razorpay_order_id = payment.get('order_id')
+    if not razorpay_order_id and event == 'order.paid':
+        razorpay_order_id = (((payload.get('payload') or {}).get('order') or {}).get('entity') or {}).get('id')
+    if not razorpay_order_id:
+        return 'ignored'
+
+    if event == 'payment.failed':
+        _mark_payment_failed(razorpay_order_id, payment.get('id') or '')
+        return 'processed'
+
+    found, _changed = _mark_payment_verified(razorpay_order_id, payment.get('id') or '')
+    return 'processed' if found else 'ignored'
+
+
+def process_webhook_events(batch_size=100, retry_failed=False):
+    """
+    Apply received inbox events in arrival order. Each row is claimed with a
+    conditional update so concurrent workers never apply the same event twice.
+    Returns a {status: count} summary.
+    """
+    statuses = ['received', 'failed'] if retry_failed else ['received']
+    summary = {}
+    ids = list(
+        PaymentWebhookEvent.objects
+        .filter(status__in=statuses, attempts__lt=MAX_ATTEMPTS)
+        .order_by('id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    for event_pk in ids:
+        claimed = (
+            PaymentWebhookEvent.objects
+            .filter(id=event_pk, status__in=statuses)
+            .update(status='processing', claimed_at=timezone.now())
+        )
+        if not claimed:
+            continue
+        record = PaymentWebhookEvent.objects.get(id=event_pk)
+        error = ''
+        try:
+            status = apply_webhook_event(record)
+        except Exception as e:
+            logger.exception("Webhook event %s failed", record.event_id)
+            status = 'failed'
+            error = str(e)[:200]
+        PaymentWebhookEvent.objects.filter(id=event_pk).update(
+            status=status,
+            error=error,
+            attempts=record.attempts + 1,
+            processed_at=timezone.now(),
+        )
+        summary[status] = summary.get(status, 0) + 1
+    return summary
+
+
+def requeue_stale_webhook_events(minutes=10):
+    """Put events claimed more than `minutes` ago and never finished back to 'received'."""
+    stale_before = timezone.now() - timedelta(minutes=minutes)
+    return (
+        PaymentWebhookEvent.objects
+        .filter(status='processing', claimed_at__lt=stale_before)
+        .update(status='received')
+    )
@@ -0,0 +1,186 @@
+"""
+Per-request performance instrumentation.
+`PerformanceMiddleware` opens a RequestTimings accumulator in a context variable; the
+hooks below add to it from wherever the time is actually spent:
+
+* ORM queries: an execute wrapper installed on every DB connection as it is created
+  (so queries from sync_to_async threads in async views are counted too)
+* MongoDB commands: a pymongo CommandListener registered on the shared MongoClient
+* SMTP sends: `track('smtp')` around EmailMessage.send in email_templates
+* Outbound HTTP: `TimedSession`, the requests session handed to the Razorpay client
+
+Each request then gets a `Server-Timing` header and one structured log line on the
+`apps.products.perf` logger with the route, status and per-category counts/times.
+"""
+
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+import requests
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+try:
+    from pymongo import monitoring
+except Exception:
+    monitoring = None
+
+
+CATEGORIES = ('db', 'mongo', 'smtp', 'http')
+logger = logging.getLogger(__name__)
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('started', 'counts', 'durations')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.counts = dict.fromkeys(CATEGORIES, 0)
+        self.durations = dict.fromkeys(CATEGORIES, 0.0)
+
+    def add(self, category, seconds):
+        self.counts[category] += 1
+        self.durations[category] += seconds
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def current_timings():
+    return _current.get()
+
+
+def record(category, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(category, seconds)
+
+
+@contextmanager
+def track(category):
+    """Attribute the time spent in the block to `category` for the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(category, time.perf_counter() - started)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    if _current.get() is None:
+        return execute(sql, params, many, context)
+    with track('db'):
+        return execute(sql, params, many, context)
+
+
+def install_db_wrapper(sender, connection, **kwargs):
+    """connection_created handler: keep the timing wrapper on every new connection."""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+if monitoring is not None:
+    class MongoCommandTimer(monitoring.CommandListener):
+        """Adds each command's server round trip to the current request's timings."""
+
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            record('mongo', event.duration_micros / 1e6)
+
+        def failed(self, event):
+            record('mongo', event.duration_micros / 1e6)
+else:
+    MongoCommandTimer = None
+
+
+class TimedSession(requests.Session):
+    """requests.Session that records outbound HTTP time for the current request."""
+
+    def request(self, *args, **kwargs):
+        with track('http'):
+            return super().request(*args, **kwargs)
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.route or match.view_name or 'unresolved'
+
+
+def server_timing_header(timings, total_ms):
+    parts = [f'total;dur={total_ms:.1f}']
+    for category in CATEGORIES:
+        count = timings.counts[category]
+        if count:
+            parts.append(f'{category};dur={timings.durations[category] * 1000:.1f};desc="{count}"')
+    return ', '.join(parts)
+
+
+def log_request(request, response, timings, total_ms):
+    entry = {
+        'event': 'request',
+        'method': request.method,
+        'route': _route(request),
+        'status': response.status_code,
+        'wall_ms': round(total_ms, 2),
+    }
+    for category in CATEGORIES:
+        entry[f'{category}_count'] = timings.counts[category]
+        entry[f'{category}_ms'] = round(timings.durations[category] * 1000, 2)
+    slow_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 1000)
+    level = logging.WARNING if total_ms >= slow_ms else logging.INFO
+    logger.log(level, json.dumps(entry, separators=(',', ':')))
+
+
+class PerformanceMiddleware:
+    """Times each request and reports where the time went (see module docstring)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERF_INSTRUMENTATION_ENABLED', True)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _finish(self, request, response, timings):
+        # For streaming responses this is the time until headers are ready.
+        total_ms = timings.elapsed_ms()
+        if getattr(settings, 'PERF_SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing_header(timings, total_ms)
+        log_request(request, response, timings, total_ms)
+        metrics.observe_request(request, response, total_ms / 1000)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
@@ -0,0 +1,296 @@
+"""
+On-demand request profiling for staff.
+A staff session that sends `X-Profile: cprofile|sample` (or `?__profile=cprofile|sample`)
+gets that one request run under a profiler; the result lands in PROFILING_SPOOL_DIR and
+the response carries `X-Profile-Id`. Requests without the flag only pay for two dict
+lookups: the user is not even checked.
+
+* cprofile: deterministic cProfile, saved as pstats (`<id>.prof`; open with snakeviz or
+  `python -m pstats`). One at a time per process, since the interpreter has one hook.
+* sample: a thread snapshots the request thread's stack every PROFILING_SAMPLE_INTERVAL_MS
+  and the stacks are saved as speedscope JSON (`<id>.speedscope.json`; drop it on
+  https://www.speedscope.app). Cheap enough for the slowest endpoints.
+
+Under ASGI a sync view runs in asgiref's thread-sensitive worker thread, not on the event
+loop, so a flagged request hands the rest of the middleware chain to a worker thread
+(`sync_to_async` around `async_to_sync`); the view then executes in the thread being
+profiled. Async views are profiled on the event loop thread, where they run.
+
+Each capture has a `<id>.meta.json` sidecar used by the staff listing; only the newest
+PROFILING_MAX_CAPTURES are kept.
+"""
+
+import cProfile
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import Resolver404, resolve
+from django.views.decorators.http import require_http_methods
+
+
+MODES = {'cprofile': '.prof', 'sample': '.speedscope.json'}
+PROFILE_PARAM = '__profile'
+CAPTURE_NAME = re.compile(r'^\d{8}T\d{12}Z-[0-9a-f]{8}\.(prof|speedscope\.json)$')
+_cprofile_lock = threading.Lock()
+
+
+def spool_dir():
+    return Path(getattr(settings, 'PROFILING_SPOOL_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer until stopped."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ckh-profile-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def speedscope(self, name):
+        """The samples as a speedscope 'sampled' profile (weights in milliseconds)."""
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.stacks.most_common():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(round(count * self.interval * 1000, 3))
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights,
+            }],
+            'name': name,
+            'exporter': 'apps.products.profiling',
+        }
+
+
+def requested_mode(request):
+    """The profiling mode asked for, or None; the staff check comes after this."""
+    mode = request.META.get('HTTP_X_PROFILE')
+    if mode is None:
+        if PROFILE_PARAM not in request.META.get('QUERY_STRING', ''):
+            return None
+        mode = request.GET.get(PROFILE_PARAM)
+    mode = (mode or '').strip().lower() or 'cprofile'
+    return mode if mode in MODES else None
+
+
+def _is_staff(user):
+    return bool(user and user.is_authenticated and (user.is_staff or user.is_superuser))
+
+
+def _is_async_view(request):
+    try:
+        match = resolve(request.path_info, getattr(request, 'urlconf', None))
+    except Resolver404:
+        return False
+    return iscoroutinefunction(match.func)
+
+
+class _Capture:
+    def __init__(self, request, mode):
+        self.request = request
+        self.mode = mode
+        # Sortable by capture time, which is what listing and pruning rely on.
+        self.id = f"{datetime.now(dt_timezone.utc):%Y%m%dT%H%M%S%fZ}-{uuid.uuid4().hex[:8]}"
+        self.profiler = None
+        self.sampler = None
+        self.error = ''
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            if not _cprofile_lock.acquire(blocking=False):
+                self.error = 'another cProfile capture is running'
+                return
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError as e:
+                _cprofile_lock.release()
+                self.profiler = None
+                self.error = str(e)
+        else:
+            interval = getattr(settings, 'PROFILING_SAMPLE_INTERVAL_MS', 1) / 1000
+            self.sampler = StackSampler(threading.get_ident(), interval).start()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            _cprofile_lock.release()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def finish(self, response):
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        self.stop()
+        if self.error:
+            response['X-Profile-Error'] = self.error
+            return response
+
+        directory = spool_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{self.id}{MODES[self.mode]}"
+        match = getattr(self.request, 'resolver_match', None)
+        title = f"{self.request.method} {self.request.path}"
+        if self.profiler is not None:
+            self.profiler.dump_stats(str(directory / name))
+        else:
+            (directory / name).write_text(json.dumps(self.sampler.speedscope(title), separators=(',', ':')))
+        meta = {
+            'id': self.id,
+            'file': name,
+            'mode': self.mode,
+            'method': self.request.method,
+            'path': self.request.path,
+            'route': (match.route if match else None) or '',
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'staff': self.request.user.get_username(),
+            'created_at': datetime.now(dt_timezone.utc).isoformat(),
+        }
+        (directory / f"{self.id}.meta.json").write_text(json.dumps(meta))
+        prune_captures()
+        response['X-Profile-Id'] = self.id
+        return response
+
+
+class ProfilingMiddleware:
+    """Profiles single staff-flagged requests (see module docstring)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PROFILING_ENABLED', True)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _capture_for(self, request):
+        mode = requested_mode(request) if self.enabled else None
+        if mode is None or not _is_staff(getattr(request, 'user', None)):
+            return None
+        return _Capture(request, mode)
+
+    async def _acapture_for(self, request):
+        # request.user would load the session and user synchronously on the event loop.
+        mode = requested_mode(request) if self.enabled else None
+        if mode is None or not hasattr(request, 'auser') or not _is_staff(await request.auser()):
+            return None
+        return _Capture(request, mode)
+
+    def _profiled(self, capture, get_response, request):
+        capture.start()
+        try:
+            response = get_response(request)
+        except BaseException:
+            capture.stop()
+            raise
+        return capture.finish(response)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        capture = self._capture_for(request)
+        if capture is None:
+            return self.get_response(request)
+        return self._profiled(capture, self.get_response, request)
+
+    async def __acall__(self, request):
+        capture = await self._acapture_for(request)
+        if capture is None:
+            return await self.get_response(request)
+        if _is_async_view(request):
+            # Profiles the event loop thread, so other requests it serves meanwhile show up too.
+            capture.start()
+            try:
+                response = await self.get_response(request)
+            except BaseException:
+                capture.stop()
+                raise
+            return await sync_to_async(capture.finish)(response)
+        # From inside this worker thread, async_to_sync makes the handler's thread-sensitive
+        # sync_to_async(view) run the view here too, so the capture sees it.
+        return await sync_to_async(self._profiled)(capture, async_to_sync(self.get_response), request)
+
+
+def list_captures(limit=50):
+    captures = []
+    for path in sorted(spool_dir().glob('*.meta.json'), reverse=True)[:limit]:
+        try:
+            captures.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return captures
+
+
+def prune_captures():
+    keep = getattr(settings, 'PROFILING_MAX_CAPTURES', 50)
+    for meta in sorted(spool_dir().glob('*.meta.json'), reverse=True)[keep:]:
+        capture_id = meta.name[:-len('.meta.json')]
+        for suffix in MODES.values():
+            (meta.parent / f"{capture_id}{suffix}").unlink(missing_ok=True)
+        meta.unlink(missing_ok=True)
+
+
+@login_required(login_url='/login/')
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+@require_http_methods(["GET"])
+def staff_profiles(request):
+    """Recent profile captures, newest first."""
+    return JsonResponse({'success': True, 'captures': list_captures()})
+
+
+@login_required(login_url='/login/')
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+@require_http_methods(["GET"])
+def staff_profile_file(request, name):
+    """Download one capture file."""
+    path = spool_dir() / name
+    if not CAPTURE_NAME.match(name) or not path.is_file():
+        raise Http404('Profile not found')
+    return FileResponse(path.open('rb'), as_attachment=True, filename=name)
@@ -0,0 +1,213 @@
+"""
+Request rate limiting for expensive unauthenticated endpoints (OTP mail, login, signup).
+Limits use a sliding-window counter: the current fixed window's count plus the previous
+window's count weighted by how much of it still overlaps the sliding window. That needs
+two small counters per key instead of a timestamp log, so a check is one cache
+round trip (plus an increment when allowed) or a dict lookup with the memory backend.
+A request is checked against all of its scope's limits before any is counted, so a
+request rejected by one limit does not use up the others.
+
+Views opt in with `@rate_limit('<scope>')`; limits per scope and key kind come from
+RATELIMIT_RATES, e.g. {'login': {'ip': '30/m', 'email': '10/m'}}.
+"""
+
+import json
+import math
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+
+RATE_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\w*\s*$')
+UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Parse '10/m', '5/15m' or '100/day' into (limit, window_seconds)."""
+    match = RATE_RE.match(str(rate))
+    if not match:
+        raise ValueError(f'Invalid rate: {rate!r}')
+    limit, multiplier, unit = match.groups()
+    return int(limit), int(multiplier or 1) * UNIT_SECONDS[unit[0]]
+
+
+def _estimate(previous, current, elapsed, window):
+    return previous * (1 - elapsed / window) + current
+
+
+def _retry_after(previous, current, elapsed, window, limit):
+    """Seconds until one more hit fits under `limit` if nothing else arrives."""
+    if current + 1 <= limit and previous:
+        # The previous window's weight decays linearly over the current window.
+        fraction = 1 - (limit - current - 1) / previous
+        return max(1, math.ceil(fraction * window - elapsed))
+    # The current window alone is full: wait for it to roll over and decay.
+    fraction = 1 - (limit - 1) / current if current else 0
+    return max(1, math.ceil(window - elapsed + max(fraction, 0) * window))
+
+
+class RateLimitBackend(ABC):
+    """
+    Interface: `hit_many` takes [(key, limit, window), ...] and returns (allowed, retry_after).
+    The attempt is recorded against every key only if all of them allow it.
+    """
+
+    @abstractmethod
+    def hit_many(self, limits):
+        ...
+
+    def hit(self, key, limit, window):
+        return self.hit_many([(key, limit, window)])
+
+    def reset(self):
+        pass
+
+
+class CacheRateLimitBackend(RateLimitBackend):
+    """Counters in the default cache, shared by every worker when it is Redis."""
+
+    def hit_many(self, limits):
+        now = time.time()
+        windows = []
+        for key, limit, window in limits:
+            index, elapsed = divmod(now, window)
+            windows.append((f"rl:{key}:{int(index) - 1}", f"rl:{key}:{int(index)}", elapsed, limit, window))
+        counts = cache.get_many([name for previous_key, current_key, *_ in windows
+                                 for name in (previous_key, current_key)])
+        retry_after = 0
+        for previous_key, current_key, elapsed, limit, window in windows:
+            previous = counts.get(previous_key, 0)
+            current = counts.get(current_key, 0)
+            if _estimate(previous, current + 1, elapsed, window) > limit:
+                retry_after = max(retry_after, _retry_after(previous, current, elapsed, window, limit))
+        if retry_after:
+            return False, retry_after
+        for _, current_key, _, _, window in windows:
+            if not cache.add(current_key, 1, timeout=window * 2):
+                try:
+                    cache.incr(current_key)
+                except ValueError:
+                    cache.set(current_key, 1, timeout=window * 2)
+        return True, 0
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per-process counters; for tests and single-process development servers."""
+    max_keys = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def _prune(self, now):
+        # Entries older than two windows no longer affect any estimate.
+        self._windows = {
+            key: entry for key, entry in self._windows.items()
+            if (entry[0] + 2) * entry[3] > now
+        }
+
+    def hit_many(self, limits):
+        now = time.time()
+        with self._lock:
+            updates = []
+            retry_after = 0
+            for key, limit, window in limits:
+                index, elapsed = divmod(now, window)
+                index = int(index)
+                entry = self._windows.get(key)
+                if entry is None or entry[0] < index - 1:
+                    previous, current = 0, 0
+                elif entry[0] == index - 1:
+                    previous, current = entry[1], 0
+                else:
+                    previous, current = entry[2], entry[1]
+                if _estimate(previous, current + 1, elapsed, window) > limit:
+                    retry_after = max(retry_after, _retry_after(previous, current, elapsed, window, limit))
+                updates.append((key, (index, current + 1, previous, window)))
+            if retry_after:
+                return False, retry_after
+            for key, entry in updates:
+                if key not in self._windows and len(self._windows) >= self.max_keys:
+                    self._prune(now)
+                self._windows[key] = entry
+            return True, 0
+
+    def reset(self):
+        with self._lock:
+            self._windows.clear()
+
+
+_backend = None
+_backend_path = None
+
+
+def get_rate_limit_backend():
+    """Return the configured backend (one instance per process so memory counters persist)."""
+    global _backend, _backend_path
+    path = getattr(settings, 'RATELIMIT_BACKEND', 'apps.products.ratelimit.CacheRateLimitBackend')
+    if _backend is None or _backend_path != path:
+        _backend = import_string(path)()
+        _backend_path = path
+    return _backend
+
+
+def client_ip(request):
+    if getattr(settings, 'RATELIMIT_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '') or 'unknown'
+
+
+def _request_email(request):
+    # The limited endpoints all take JSON bodies; reading request.body keeps it
+    # available to the view (unlike request.POST on multipart bodies).
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return ''
+    email = data.get('email') if isinstance(data, dict) else ''
+    return str(email or '').strip().lower()
+
+
+def check_rate_limit(request, scope):
+    """Apply every configured limit for `scope`; returns seconds to wait, or 0 if allowed."""
+    if not getattr(settings, 'RATELIMIT_ENABLED', True):
+        return 0
+    rates = getattr(settings, 'RATELIMIT_RATES', {}).get(scope) or {}
+    limits = []
+    for kind, rate in rates.items():
+        value = client_ip(request) if kind == 'ip' else _request_email(request)
+        if not value:
+            continue
+        limits.append((f"{scope}:{kind}:{value}", *parse_rate(rate)))
+    if not limits:
+        return 0
+    allowed, retry_after = get_rate_limit_backend().hit_many(limits)
+    return 0 if allowed else retry_after
+
+
+def rate_limit(scope):
+    """View decorator returning 429 with Retry-After once `scope`'s limits are exceeded."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            retry_after = check_rate_limit(request, scope)
+            if retry_after:
+                response = JsonResponse({
+                    'success': False,
+                    'message': f'Too many requests. Try again in {retry_after} seconds.',
+                    'retryAfter': retry_after,
+                }, status=429)
+                response['Retry-After'] = str(retry_after)
+                return response
+            return view_func(request, *args, **kwargs)
+        return wrapped
+    return decorator
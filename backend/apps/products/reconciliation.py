@@ -0,0 +1,158 @@
+"""
+Payment reconciliation sweep.
+Payments left in `pending`/`processing` (abandoned checkouts, lost callbacks, webhooks
+that never arrived) are selected in id-ordered batches and checked against the gateway
+with a bounded worker pool and a shared request rate limit. Captured payments go
+through the same idempotent `_mark_payment_verified` flip as the checkout callback;
+orders whose attempts all failed are marked failed with one bulk UPDATE per batch.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Payment
+from .views import OPEN_PAYMENT_STATUSES, _get_razorpay_client, _mark_payment_verified
+
+
+STALE_PAYMENT_STATUSES = ('pending', 'processing')
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per second (bursts up to `rate`)."""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.capacity = max(self.rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _gateway_outcome(attempts):
+    """
+    Reduce the gateway's payment attempts for one order to
+    ('captured', payment_id), ('failed', payment_id) or ('open', '').
+    """
+    if not attempts:
+        return 'open', ''
+    for attempt in attempts:
+        if attempt.get('status') == 'captured':
+            return 'captured', attempt.get('id') or ''
+    if all(attempt.get('status') == 'failed' for attempt in attempts):
+        return 'failed', attempts[-1].get('id') or ''
+    # created/authorized attempts may still be captured; look again next sweep.
+    return 'open', ''
+
+
+def _stale_batches(cutoff, batch_size, limit):
+    """Yield lists of (id, razorpay_order_id) for stale payments, walking the id index."""
+    last_id = 0
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        rows = list(
+            Payment.objects
+            .filter(
+                id__gt=last_id,
+                status__in=STALE_PAYMENT_STATUSES,
+                updated_at__lt=cutoff,
+            )
+            .exclude(razorpay_order_id='')
+            .order_by('id')
+            .values_list('id', 'razorpay_order_id')[:size]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            return
+
+
+def reconcile_stale_payments(
+    older_than_minutes=15,
+    batch_size=100,
+    concurrency=4,
+    rate=10,
+    limit=None,
+    dry_run=False,
+):
+    """
+    Resolve payments stuck in pending/processing for longer than `older_than_minutes`.
+    Returns a summary dict of counts: scanned, verified, failed, unchanged, errors.
+    """
+    cutoff = timezone.now() - timedelta(minutes=older_than_minutes)
+    limiter = RateLimiter(rate)
+    local = threading.local()
+    summary = {'scanned': 0, 'verified': 0, 'failed': 0, 'unchanged': 0, 'errors': 0}
+
+    def fetch(razorpay_order_id):
+        limiter.acquire()
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = _get_razorpay_client()
+        response = client.order.payments(razorpay_order_id)
+        return _gateway_outcome(response.get('items') or [])
+
+    def check(row):
+        payment_pk, razorpay_order_id = row
+        try:
+            return payment_pk, razorpay_order_id, fetch(razorpay_order_id)
+        except Exception as e:
+            logger.warning("Reconciliation lookup failed for %s: %s", razorpay_order_id, e)
+            return payment_pk, razorpay_order_id, ('error', '')
+
+    # Workers only talk to the gateway; all database writes stay on this thread.
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix='ckh-reconcile') as executor:
+        for rows in _stale_batches(cutoff, batch_size, limit):
+            summary['scanned'] += len(rows)
+            failed_ids = []
+            for payment_pk, razorpay_order_id, (outcome, payment_id) in executor.map(check, rows):
+                if outcome == 'error':
+                    summary['errors'] += 1
+                elif outcome == 'captured':
+                    if dry_run:
+                        summary['verified'] += 1
+                        continue
+                    _payment, changed = _mark_payment_verified(razorpay_order_id, payment_id)
+                    summary['verified' if changed else 'unchanged'] += 1
+                elif outcome == 'failed':
+                    failed_ids.append(payment_pk)
+                else:
+                    summary['unchanged'] += 1
+
+            if failed_ids and not dry_run:
+                failed = (
+                    Payment.objects
+                    .filter(id__in=failed_ids, status__in=OPEN_PAYMENT_STATUSES)
+                    .exclude(status='failed')
+                    .update(status='failed', updated_at=timezone.now())
+                )
+                summary['failed'] += failed
+                summary['unchanged'] += len(failed_ids) - failed
+            else:
+                summary['failed'] += len(failed_ids)
+
+    return summary
@@ -0,0 +1,268 @@
+"""
+Slow ORM query and MongoDB command log.
+Queries slower than SLOW_QUERY_MS and Mongo commands slower than SLOW_MONGO_MS are
+written as JSON lines to the `apps.products.slow_queries` logger (a rotating file, see
+LOGGING) with the app code that issued them and the database's query plan. SQL is logged with
+its placeholders and the bind values' types only, never the values themselves:
+
+* ORM: an execute wrapper on every connection logs slow statements. Successful
+  SELECTs get the backend's EXPLAIN (EXPLAIN QUERY PLAN on SQLite) from a deferred
+  task once the caller's transaction has committed, logged as a second line; a
+  failed statement is never explained.
+* Mongo: a CommandListener on the shared MongoClient records find/update/delete/
+  aggregate commands with their filter shape (values replaced by '?'). pymongo
+  listeners must not issue commands themselves, so `explain` runs on the background
+  pool and is logged as a second line. Started commands that never report back are
+  dropped once older than MONGO_PENDING_TTL seconds, and at most MONGO_PENDING_LIMIT
+  are tracked.
+
+Each distinct statement/shape is explained at most once per SLOW_QUERY_EXPLAIN_INTERVAL.
+"""
+
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .tasks import defer, submit
+
+try:
+    from pymongo import monitoring
+except Exception:
+    monitoring = None
+
+
+logger = logging.getLogger(__name__)
+MONGO_FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+}
+MONGO_BULK_FIELDS = {'update': 'updates', 'delete': 'deletes'}
+WATCHED_MONGO_COMMANDS = set(MONGO_FILTER_FIELDS) | set(MONGO_BULK_FIELDS) | {'aggregate'}
+MONGO_PENDING_TTL = 300
+MONGO_PENDING_LIMIT = 1000
+_SKIP_FILES = {'slow_queries.py', 'perf.py'}
+_explaining = contextvars.ContextVar('slow_query_explaining', default=False)
+_explained = {}
+_explained_lock = threading.Lock()
+
+
+def _log(entry):
+    logger.warning(json.dumps(entry, separators=(',', ':'), default=str))
+
+
+def _should_explain(fingerprint):
+    if not getattr(settings, 'SLOW_QUERY_EXPLAIN', True):
+        return False
+    interval = getattr(settings, 'SLOW_QUERY_EXPLAIN_INTERVAL', 300)
+    now = time.monotonic()
+    with _explained_lock:
+        last = _explained.get(fingerprint)
+        if last is not None and now - last < interval:
+            return False
+        if len(_explained) > 1000:
+            _explained.clear()
+        _explained[fingerprint] = now
+    return True
+
+
+def app_callers(limit=4):
+    """The innermost frames of our own code (apps/*) on the current stack, innermost first."""
+    apps_dir = str(Path(settings.BASE_DIR) / 'apps')
+    callers = []
+    frame = sys._getframe(1)
+    while frame is not None and len(callers) < limit:
+        filename = frame.f_code.co_filename
+        if filename.startswith(apps_dir) and Path(filename).name not in _SKIP_FILES:
+            relative = Path(filename).relative_to(settings.BASE_DIR)
+            callers.append(f"{relative}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return callers
+
+
+# -- ORM --------------------------------------------------------------------------
+
+def _is_select(sql):
+    return sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+
+
+def explain_sql(connection, sql, params):
+    """Return the backend's plan for a SELECT as a list of text rows, or None."""
+    if not _is_select(sql):
+        return None
+    token = _explaining.set(True)
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        # A savepoint keeps a failing EXPLAIN from poisoning any transaction it lands in.
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"{prefix} {sql}", params)
+                return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as exc:
+        return [f"explain failed: {exc}"]
+    finally:
+        _explaining.reset(token)
+
+
+def explain_slow_query(alias, sql, params):
+    _log({
+        'event': 'slow_query_explain',
+        'database': alias,
+        'sql': sql,
+        'plan': explain_sql(connections[alias], sql, params),
+    })
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    if _explaining.get():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    succeeded = False
+    try:
+        result = execute(sql, params, many, context)
+        succeeded = True
+        return result
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= getattr(settings, 'SLOW_QUERY_MS', 100):
+            connection = context['connection']
+            # Bind values carry OTP codes, password hashes and emails: log only their
+            # types. The values themselves stay in memory for the deferred EXPLAIN.
+            params = None if many else list(params or ())
+            _log({
+                'event': 'slow_query',
+                'database': connection.alias,
+                'duration_ms': round(duration_ms, 2),
+                'sql': sql,
+                'param_types': None if many else [type(value).__name__ for value in params],
+                'failed': not succeeded,
+                'callers': app_callers(),
+            })
+            if succeeded and not many and _is_select(sql) and _should_explain(sql):
+                # Never on the caller's connection mid-transaction: a Postgres transaction
+                # that has seen an error rejects every further statement, EXPLAIN included.
+                defer(explain_slow_query, connection.alias, sql, params)
+
+
+def install_slow_query_wrapper(sender, connection, **kwargs):
+    """connection_created handler, like perf.install_db_wrapper."""
+    if getattr(settings, 'SLOW_QUERY_LOG_ENABLED', True) and slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_wrapper)
+
+
+# -- MongoDB ----------------------------------------------------------------------
+
+def filter_shape(value):
+    """Replace the values in a Mongo filter with '?' keeping field names and operators."""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [filter_shape(value[0])] if value else []
+    return '?'
+
+
+def mongo_command_filters(command_name, command):
+    if command_name in MONGO_FILTER_FIELDS:
+        return [command.get(MONGO_FILTER_FIELDS[command_name]) or {}]
+    if command_name in MONGO_BULK_FIELDS:
+        return [entry.get('q') or {} for entry in command.get(MONGO_BULK_FIELDS[command_name]) or []]
+    if command_name == 'aggregate':
+        return [stage['$match'] for stage in command.get('pipeline') or [] if '$match' in stage]
+    return []
+
+
+def _explainable(command):
+    # Drop session/cluster fields the driver adds; explain takes the bare command.
+    return {key: value for key, value in command.items() if not key.startswith('$') and key not in ('lsid', 'txnNumber')}
+
+
+def _winning_plan(result):
+    plan = (result.get('queryPlanner') or {}).get('winningPlan') or {}
+    stages = []
+    while plan:
+        stage = plan.get('stage', '?')
+        if plan.get('indexName'):
+            stage = f"{stage}({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0] or plan.get('queryPlan')
+    return ' <- '.join(stages)
+
+
+def explain_mongo(database_name, command, shape):
+    from database.mongo import get_client
+
+    result = get_client()[database_name].command({'explain': command, 'verbosity': 'queryPlanner'})
+    _log({
+        'event': 'slow_mongo_explain',
+        'database': database_name,
+        'command': next(iter(command)),
+        'filter_shape': shape,
+        'plan': _winning_plan(result),
+        'winning_plan': (result.get('queryPlanner') or {}).get('winningPlan'),
+    })
+
+
+if monitoring is not None:
+    class SlowMongoCommandLogger(monitoring.CommandListener):
+        """Logs watched commands slower than SLOW_MONGO_MS (see module docstring)."""
+
+        def __init__(self):
+            self._pending = {}
+            self._lock = threading.Lock()
+
+        def started(self, event):
+            if event.command_name not in WATCHED_MONGO_COMMANDS:
+                return
+            now = time.monotonic()
+            with self._lock:
+                if len(self._pending) >= MONGO_PENDING_LIMIT:
+                    self._expire(now)
+                self._pending[(event.connection_id, event.request_id)] = (now, event.database_name, event.command)
+
+        def succeeded(self, event):
+            self._finish(event)
+
+        def failed(self, event):
+            self._finish(event)
+
+        def _expire(self, now):
+            # A command whose connection died may never get succeeded/failed; drop
+            # those by age, then the oldest if the map is still full.
+            for key, (started_at, _, _) in list(self._pending.items()):
+                if now - started_at > MONGO_PENDING_TTL:
+                    del self._pending[key]
+            while len(self._pending) >= MONGO_PENDING_LIMIT:
+                del self._pending[next(iter(self._pending))]
+
+        def _finish(self, event):
+            with self._lock:
+                pending = self._pending.pop((event.connection_id, event.request_id), None)
+            if pending is None:
+                return
+            duration_ms = event.duration_micros / 1000
+            if duration_ms < getattr(settings, 'SLOW_MONGO_MS', 100):
+                return
+            _, database_name, command = pending
+            shapes = [filter_shape(query) for query in mongo_command_filters(event.command_name, command)]
+            _log({
+                'event': 'slow_mongo',
+                'database': database_name,
+                'command': event.command_name,
+                'collection': command.get(event.command_name),
+                'duration_ms': round(duration_ms, 2),
+                'filter_shapes': shapes,
+                'callers': app_callers(),
+            })
+            fingerprint = json.dumps([event.command_name, command.get(event.command_name), shapes], sort_keys=True)
+            if shapes and _should_explain(fingerprint):
+                submit(explain_mongo, database_name, _explainable(command), shapes[0])
+else:
+    SlowMongoCommandLogger = None
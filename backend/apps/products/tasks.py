@@ -0,0 +1,65 @@
+"""
+Post-commit background work queue.
+`defer(func, *args, **kwargs)` runs `func` after the current transaction commits on a
+small in-process thread pool, so request handlers can respond before notifications,
+stats recomputes and audit writes are done. With BACKGROUND_TASKS_EAGER = True the
+work runs inline at commit time instead (tests, management commands). `submit` skips
+the commit wait for work that doesn't depend on the current transaction.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+
+logger = logging.getLogger(__name__)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_TASK_WORKERS', 4),
+                    thread_name_prefix='ckh-background',
+                )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(func, '__name__', func))
+
+
+def _run_in_worker(func, args, kwargs):
+    close_old_connections()
+    try:
+        _run(func, args, kwargs)
+    finally:
+        # Worker threads own their DB connections; don't leak them between tasks.
+        connections.close_all()
+
+
+def _submit(func, args, kwargs):
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        _run(func, args, kwargs)
+        return
+    _get_executor().submit(_run_in_worker, func, args, kwargs)
+
+
+def defer(func, *args, **kwargs):
+    """Schedule func(*args, **kwargs) to run once the surrounding transaction commits."""
+    transaction.on_commit(lambda: _submit(func, args, kwargs))
+
+
+def submit(func, *args, **kwargs):
+    """Run func(*args, **kwargs) on the background pool now, without waiting for a commit."""
+    _submit(func, args, kwargs)
@@ -3,18 +3,27 @@ Template rendering views for serving HTML pages.
 These views handle rendering frontend templates without adding business logic.
 """
 
+import logging
+
 from django.shortcuts import render, redirect
 from django.http import JsonResponse
-from database.models import User
 from .models import Order
+from .customer_pages import user_summary
+from .order_metrics import get_order_metrics
+from .page_cache import cache_anonymous_page
+from .profiling import list_captures
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.contrib.auth.decorators import login_required, user_passes_test
 
 
+logger = logging.getLogger(__name__)
+
+
 # ==========================================
 # PUBLIC PAGES
 # ==========================================
 
+@cache_anonymous_page('pages/public/index.html')
 @ensure_csrf_cookie
 def index(request):
     """
@@ -25,7 +34,6 @@ def index(request):
     context = {
         'is_authenticated': False,
         'user': None,
-        'user_orders': []
     }
     
     try:
@@ -33,32 +41,26 @@ def index(request):
         user_email = request.session.get('email')
 
         if user_email:
-            user = User.find_by_email(user_email)
+            user = user_summary(user_email)
             if user:
                 context['is_authenticated'] = True
-                context['user'] = {
-                    'email': user.get('email'),
-                    'firstName': user.get('firstName', ''),
-                    'lastName': user.get('lastName', ''),
-                    'phone': user.get('phone', ''),
-                }
-                # Fetch user's recent orders (limit to 5)
-                orders = Order.objects.filter(email=user_email).order_by('-created_at')
-                context['user_orders'] = list(orders[:5]) if orders else []
-    except Exception as e:
+                context['user'] = user
+    except Exception:
         # Handle MongoDB connection or query failures gracefully
-        print(f"Error fetching user data for home page: {e}")
+        logger.exception("Error fetching user data for home page")
         context['is_authenticated'] = False
     
     return render(request, 'pages/public/index.html', context)
 
 
+@cache_anonymous_page('pages/public/privacy-policy.html')
 @ensure_csrf_cookie
 def privacy_policy(request):
     """Render privacy policy page"""
     return render(request, 'pages/public/privacy-policy.html')
 
 
+@cache_anonymous_page('pages/public/terms-conditions.html')
 @ensure_csrf_cookie
 def terms_and_conditions(request):
     """Render terms and conditions page"""
@@ -69,24 +71,28 @@ def terms_and_conditions(request):
 # CUSTOMER PAGES
 # ==========================================
 
+@cache_anonymous_page('pages/customer/login.html')
 @ensure_csrf_cookie
 def login(request):
     """Render customer login page"""
     return render(request, 'pages/customer/login.html')
 
 
+@cache_anonymous_page('pages/customer/signup.html')
 @ensure_csrf_cookie
 def signup(request):
     """Render customer signup page"""
     return render(request, 'pages/customer/signup.html')
 
 
+@cache_anonymous_page('pages/customer/forgot-password.html')
 @ensure_csrf_cookie
 def forgot_password(request):
     """Render forgot password page"""
     return render(request, 'pages/customer/forgot-password.html')
 
 
+@cache_anonymous_page('pages/customer/reset-password.html')
 @ensure_csrf_cookie
 def reset_password(request):
     """Render reset password page"""
@@ -107,10 +113,10 @@ def customer_profile(request):
         # Session-auth: return JSON profile data for fetch("/profile/")
         return api_views.profile(request)
 
+    # Orders are not rendered server-side: orders-manager.js pages them from /api/orders/.
     context = {
         'is_authenticated': False,
         'user': None,
-        'orders': []
     }
     
     try:
@@ -120,22 +126,13 @@ def customer_profile(request):
         # if not email:
         #     return redirect('login')
 
-        # Fetch user from MongoDB (even if no email, context remains empty and JS will redirect)
-        user = User.find_by_email(email) if email else None
+        # Cached Mongo user summary (even if no email, context remains empty and JS will redirect)
+        user = user_summary(email)
         if user:
             context['is_authenticated'] = True
-            context['user'] = {
-                'email': user.get('email'),
-                'firstName': user.get('firstName', ''),
-                'lastName': user.get('lastName', ''),
-                'phone': user.get('phone', ''),
-            }
-
-            # Fetch user orders from MongoDB
-            orders = Order.objects.filter(email=email).order_by('-created_at')
-            context['orders'] = list(orders) if orders else []
-    except Exception as e:
-        print(f"Error fetching profile data: {e}")
+            context['user'] = user
+    except Exception:
+        logger.exception("Error fetching profile data")
         # --- FIX: No redirect here; let JS handle ---
         # return redirect('login')
 
@@ -144,7 +141,7 @@ def customer_profile(request):
 
 @ensure_csrf_cookie
 def order_tracking(request):
-    """Render order tracking page with orders data"""
+    """Render order tracking page; the page loads its orders from /api/orders/ a page at a time."""
     context = {}
     try:
         # Require authenticated session
@@ -153,12 +150,10 @@ def order_tracking(request):
         # if not email:
         #     return redirect('login')
 
-        # Fetch user orders from MongoDB (even if no email, context empty and JS will redirect)
-        orders = Order.objects.filter(email=email).order_by('-created_at') if email else []
-        context['orders'] = list(orders) if orders else []
+        # Even if no email, context stays empty and JS will redirect
         context['email'] = email
-    except Exception as e:
-        print(f"Error fetching orders: {e}")
+    except Exception:
+        logger.exception("Error fetching orders")
 
     return render(request, 'pages/customer/order-tracking.html', context)
 
@@ -167,24 +162,28 @@ def order_tracking(request):
 # ADMIN PAGES
 # ==========================================
 
+@cache_anonymous_page('pages/staff-admin/staff-login.html')
 @ensure_csrf_cookie
 def admin_login(request):
     """Render admin login page"""
     return render(request, 'pages/staff-admin/staff-login.html')
 
 
+@cache_anonymous_page('pages/staff-admin/staff-signup.html')
 @ensure_csrf_cookie
 def admin_signup(request):
     """Render admin signup page"""
     return render(request, 'pages/staff-admin/staff-signup.html')
 
 
+@cache_anonymous_page('pages/staff-admin/staff-forgot-password.html')
 @ensure_csrf_cookie
 def admin_forgot_password(request):
     """Render admin forgot password page"""
     return render(request, 'pages/staff-admin/staff-forgot-password.html')
 
 
+@cache_anonymous_page('pages/staff-admin/staff-reset-password.html')
 @ensure_csrf_cookie
 def admin_reset_password(request):
     """Render admin reset password page"""
@@ -196,25 +195,23 @@ def admin_dashboard(request):
     """Render admin dashboard page with admin data"""
     context = {}
     try:
-        from django.contrib.auth import get_user_model
-        # Fetch dashboard statistics from DB-backed orders
-        total_orders = Order.objects.count()
-        pending_orders = Order.objects.filter(status='pending').count()
-        completed_orders = Order.objects.filter(status='paid').count()
-        total_users = get_user_model().objects.count()
+        # Dashboard statistics come from materialized counters (no full-table counts);
+        # the page can poll /api/staff/metrics/orders/ for fresh values.
+        metrics = get_order_metrics()
 
         # Fetch recent orders
         recent_orders = list(Order.objects.order_by('-created_at')[:10])
 
         context = {
-            'total_orders': total_orders,
-            'pending_orders': pending_orders,
-            'completed_orders': completed_orders,
-            'total_users': total_users,
+            'total_orders': metrics['totalOrders'],
+            'pending_orders': metrics['pendingOrders'],
+            'completed_orders': metrics['completedOrders'],
+            'total_users': metrics['totalUsers'],
+            'daily_metrics': metrics['daily'],
             'recent_orders': recent_orders
         }
-    except Exception as e:
-        print(f"Error fetching admin data: {e}")
+    except Exception:
+        logger.exception("Error fetching admin data")
 
     return render(request, 'pages/staff-admin/staff-dashboard.html', context)
 
@@ -224,3 +221,10 @@ def admin_dashboard(request):
 def admin_mongo_users(request):
     """Render admin page for MongoDB user management."""
     return render(request, 'pages/staff-admin/staff-mongo-users.html')
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+def admin_profiles(request):
+    """Render the list of recent request profile captures."""
+    return render(request, 'pages/staff-admin/staff-profiles.html', {'captures': list_captures()})
@@ -0,0 +1,381 @@
+"""
+Test and benchmark helpers: local stand-ins for the external services.
+
+* `FakeMongoDatabase` implements the slice of the pymongo API that database.models and
+  the views use (find/find_one with filters, projections, sort/limit; insert/update/
+  delete; create_index/create_indexes) and counts every command it serves, so tests
+  can assert how many Mongo round trips a request made without a running server.
+  `fake_mongo(db)` patches every module that imported `get_database`.
+* `FakeRazorpayServer` answers the order create/fetch calls the Razorpay SDK makes
+  (point RAZORPAY_API_BASE_URL at it).
+* `SMTPSink` accepts and counts mail from Django's SMTP backend.
+"""
+
+import copy
+import json
+import re
+import socketserver
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from bson.objectid import ObjectId
+
+
+MONGO_MODULES = ('database.mongo', 'database.models', 'apps.products.views', 'apps.products.datasets')
+
+
+def _get_path(document, path):
+    value = document
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None, False
+        value = value[part]
+    return value, True
+
+
+def _compare(value, operator, expected):
+    if operator == '$eq':
+        return value == expected
+    if operator == '$ne':
+        return value != expected
+    if operator == '$in':
+        return value in expected
+    if operator == '$nin':
+        return value not in expected
+    if operator == '$regex':
+        return isinstance(value, str) and re.search(expected, value) is not None
+    if value is None:
+        return False
+    try:
+        return {
+            '$gt': value > expected,
+            '$gte': value >= expected,
+            '$lt': value < expected,
+            '$lte': value <= expected,
+        }[operator]
+    except KeyError:
+        raise NotImplementedError(f'FakeMongoDatabase does not support {operator}')
+
+
+def matches(document, query):
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            if not all(matches(document, part) for part in condition):
+                return False
+            continue
+        if key == '$or':
+            if not any(matches(document, part) for part in condition):
+                return False
+            continue
+        value, present = _get_path(document, key)
+        if isinstance(condition, dict) and condition and all(op.startswith('$') for op in condition):
+            for operator, expected in condition.items():
+                if operator == '$exists':
+                    if present != bool(expected):
+                        return False
+                elif operator == '$options':
+                    continue
+                elif not _compare(value, operator, expected):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document, projection):
+    if not projection:
+        return copy.deepcopy(document)
+    included = {key for key, flag in projection.items() if flag and key != '_id'}
+    if included:
+        result = {key: copy.deepcopy(document[key]) for key in included if key in document}
+        if projection.get('_id', 1) and '_id' in document:
+            result['_id'] = document['_id']
+        return result
+    return {key: copy.deepcopy(value) for key, value in document.items() if projection.get(key, 1)}
+
+
+class FakeCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._limit = 0
+        self._skip = 0
+
+    def sort(self, key, direction=1):
+        self._sort = list(key) if isinstance(key, (list, tuple)) else [(key, direction)]
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        self._collection.database.record('find', self._collection.name)
+        with self._collection.database.lock:
+            documents = [doc for doc in self._collection.documents if matches(doc, self._query)]
+            for key, direction in reversed(self._sort):
+                documents.sort(key=lambda doc: (doc.get(key) is not None, doc.get(key)), reverse=direction < 0)
+            documents = documents[self._skip:]
+            if self._limit:
+                documents = documents[:self._limit]
+            return iter([_project(doc, self._projection) for doc in documents])
+
+
+class FakeCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.documents = []
+
+    def create_index(self, keys, **kwargs):
+        self.database.record('createIndexes', self.name)
+        return kwargs.get('name') or '_'.join(f'{key}_{direction}' for key, direction in keys)
+
+    def create_indexes(self, indexes):
+        self.database.record('createIndexes', self.name)
+        return [index.document['name'] for index in indexes]
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(self, query or {}, projection)
+
+    def find_one(self, query=None, projection=None):
+        for document in FakeCursor(self, query or {}, projection).limit(1):
+            return document
+        return None
+
+    def count_documents(self, query):
+        self.database.record('count', self.name)
+        with self.database.lock:
+            return sum(1 for doc in self.documents if matches(doc, query))
+
+    def insert_one(self, document):
+        self.database.record('insert', self.name)
+        document.setdefault('_id', ObjectId())
+        with self.database.lock:
+            self.documents.append(copy.deepcopy(document))
+        return SimpleNamespace(inserted_id=document['_id'])
+
+    def insert_many(self, documents, ordered=True):
+        self.database.record('insert', self.name)
+        ids = []
+        with self.database.lock:
+            for document in documents:
+                document.setdefault('_id', ObjectId())
+                self.documents.append(copy.deepcopy(document))
+                ids.append(document['_id'])
+        return SimpleNamespace(inserted_ids=ids)
+
+    def _apply(self, document, update):
+        for key, value in (update.get('$set') or {}).items():
+            document[key] = copy.deepcopy(value)
+        for key in update.get('$unset') or {}:
+            document.pop(key, None)
+        for key, value in (update.get('$inc') or {}).items():
+            document[key] = document.get(key, 0) + value
+
+    def _update(self, query, update, upsert, many):
+        self.database.record('update', self.name)
+        with self.database.lock:
+            return self._update_locked(query, update, upsert, many)
+
+    def _update_locked(self, query, update, upsert, many):
+        matched = [doc for doc in self.documents if matches(doc, query)]
+        if not many:
+            matched = matched[:1]
+        for document in matched:
+            self._apply(document, update)
+        upserted_id = None
+        if not matched and upsert:
+            document = {key: value for key, value in query.items() if not key.startswith('$')}
+            document['_id'] = upserted_id = ObjectId()
+            self._apply(document, update)
+            self.documents.append(document)
+        return SimpleNamespace(matched_count=len(matched), modified_count=len(matched), upserted_id=upserted_id)
+
+    def update_one(self, query, update, upsert=False):
+        return self._update(query, update, upsert, many=False)
+
+    def update_many(self, query, update, upsert=False):
+        return self._update(query, update, upsert, many=True)
+
+    def _delete(self, query, many):
+        self.database.record('delete', self.name)
+        with self.database.lock:
+            matched = [doc for doc in self.documents if matches(doc, query)]
+            if not many:
+                matched = matched[:1]
+            removed = {id(doc) for doc in matched}
+            self.documents = [doc for doc in self.documents if id(doc) not in removed]
+        return SimpleNamespace(deleted_count=len(matched))
+
+    def delete_one(self, query):
+        return self._delete(query, many=False)
+
+    def delete_many(self, query):
+        return self._delete(query, many=True)
+
+
+class FakeMongoDatabase:
+    def __init__(self):
+        self.collections = {}
+        self.commands = []
+        # Shared by all collections; the benchmark serves requests from many threads.
+        self.lock = threading.RLock()
+
+    def __getitem__(self, name):
+        with self.lock:
+            if name not in self.collections:
+                self.collections[name] = FakeCollection(self, name)
+            return self.collections[name]
+
+    def record(self, command, collection):
+        self.commands.append((command, collection))
+
+    def copy(self):
+        """Independent copy of the data (commands are not carried over)."""
+        clone = FakeMongoDatabase()
+        for name, collection in self.collections.items():
+            clone[name].documents = copy.deepcopy(collection.documents)
+        return clone
+
+
+@contextmanager
+def fake_mongo(database=None):
+    """Route get_database() everywhere to `database` (a new FakeMongoDatabase by default)."""
+    database = database if database is not None else FakeMongoDatabase()
+    with ExitStack() as stack:
+        for module in MONGO_MODULES:
+            stack.enter_context(patch(f'{module}.get_database', return_value=database))
+        yield database
+
+
+class FakeRazorpayHandler(BaseHTTPRequestHandler):
+    """POST /v1/orders creates an order; GET /v1/orders/<id>/payments lists server.attempts[id]."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path.rstrip('/') != '/v1/orders':
+            self._send(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Not found'}})
+            return
+        payload = json.loads(body or b'{}')
+        order = {
+            'id': f"order_{uuid.uuid4().hex[:14]}",
+            'entity': 'order',
+            'amount': payload.get('amount'),
+            'currency': payload.get('currency', 'INR'),
+            'receipt': payload.get('receipt'),
+            'notes': payload.get('notes') or {},
+            'status': 'created',
+        }
+        self.server.record(order)
+        self._send(200, order)
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        if len(parts) == 4 and parts[:2] == ['v1', 'orders'] and parts[3] == 'payments':
+            items = self.server.attempts.get(parts[2])
+            if items is not None:
+                self.server.requests.append(parts[2])
+                self._send(200, {'entity': 'collection', 'count': len(items), 'items': items})
+                return
+        self._send(400, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Unknown order'}})
+
+    def _send(self, status, payload):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeRazorpayServer(ThreadingHTTPServer):
+    """Threaded local Razorpay API; `delay` seconds are added to every response.
+    `attempts` maps order ids to the payment attempts to report; `requests` lists the
+    order ids whose payments were fetched.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), delay=0):
+        super().__init__(address, FakeRazorpayHandler)
+        self.delay = delay
+        self.orders = {}
+        self.attempts = {}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def record(self, order):
+        with self._lock:
+            self.orders[order['id']] = order
+
+    @property
+    def base_url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self._reply('220 sink ESMTP ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.wfile.write(b'250-sink\r\n250 8BITMIME\r\n')
+            elif command.startswith('DATA'):
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                if self.server.delay:
+                    time.sleep(self.server.delay)
+                self.server.delivered()
+                self._reply('250 OK: queued')
+            elif command.startswith('QUIT'):
+                self._reply('221 Bye')
+                return
+            else:
+                # HELO, MAIL FROM, RCPT TO, RSET, NOOP
+                self._reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Minimal threaded SMTP server that accepts every message and counts it."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), delay=0):
+        super().__init__(address, _SMTPSinkHandler)
+        self.delay = delay
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def delivered(self):
+        with self._lock:
+            self.messages += 1
@@ -1,17 +1,79 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import hmac
 import json
+import logging
+import os
+import pstats
+import tempfile
+import threading
+import time
+from datetime import timedelta
 from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import skipIf
 from unittest.mock import Mock, patch
 
+from asgiref.sync import sync_to_async
+from bson.objectid import ObjectId
 from django.contrib.auth import get_user_model
 from django.core import mail
-from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+
+from . import (
+    avatars, compression, customer_pages, logs, memory, metrics, page_cache, perf, profiling, ratelimit, slow_queries,
+)
+from database.models import User as MongoUser
+from .datasets import generate_dataset, load_menu
+from .order_events import build_staff_diff, hub, latest_staff_event_id, staff_feed
+from .models import (
+    DailyOrderRollup, Feedback, Notification, Order, OrderStatusCount, OrderStatusEvent, OTPToken, Payment,
+    PaymentWebhookEvent, UserActivity, UserProfile,
+)
+from .order_metrics import get_order_metrics, recompute_order_metrics
+from .order_status import ALLOWED_TRANSITIONS, StaleTransition, transition_order
+from .otp import (
+    EMAIL_VERIFICATION, OTP_INVALID, OTP_LOCKED, OTP_MISSING, PASSWORD_RESET, DatabaseOTPStore, check_otp, issue_otp,
+)
+from .payment_webhooks import requeue_stale_webhook_events
+from .ratelimit import CacheRateLimitBackend, MemoryRateLimitBackend, get_rate_limit_backend, parse_rate
+from .reconciliation import reconcile_stale_payments
+from .traffic import compare_runs, replay
+from .testing import FakeMongoDatabase, FakeRazorpayServer, fake_mongo
+from .urls import urlpatterns
+from .views import SignatureVerificationError
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+
+
+def setUpModule():
+    # Per-request perf and payment log lines are INFO; keep test output readable.
+    logging.getLogger('apps.products.perf').setLevel(logging.WARNING)
+    logging.getLogger('apps.products.views').setLevel(logging.WARNING)
 
-from .models import Notification, Order, Payment, UserProfile
+
+LOYALTY_STATS = {'totalOrders': 1, 'totalSpent': Decimal('0'), 'loyaltyPoints': 0, 'memberTier': 'Bronze'}
 
 
 @override_settings(
     EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
     DEFAULT_FROM_EMAIL='noreply@coffeekaafihai.test',
+    BACKGROUND_TASKS_EAGER=True,
 )
 class NotificationEmailFlowTests(TestCase):
     def setUp(self):
@@ -111,7 +173,9 @@ class NotificationEmailFlowTests(TestCase):
         mock_client = Mock()
         mock_client.utility.verify_payment_signature.return_value = None
 
-        with patch('apps.products.views._get_razorpay_client', return_value=mock_client):
+        with patch('apps.products.views._get_razorpay_client', return_value=mock_client), \
+                patch('apps.products.views._compute_loyalty_stats', return_value=LOYALTY_STATS), \
+                self.captureOnCommitCallbacks(execute=True):
             response = self.client.post(
                 '/api/payment/verify-payment/',
                 data=json.dumps({
@@ -137,3 +201,2122 @@ class NotificationEmailFlowTests(TestCase):
         self.assertEqual(email_notification.status, 'sent')
         self.assertEqual(email_notification.payload.get('status'), 'paid')
         self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    DEFAULT_FROM_EMAIL='noreply@coffeekaafihai.test',
+    BACKGROUND_TASKS_EAGER=True,
+    RAZORPAY_KEY_ID='rzp_test',
+)
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='buyer@example.com', email='buyer@example.com')
+        self.profile = UserProfile.objects.create(
+            user=self.user, email=self.user.email, first_name='Bea', last_name='Buyer',
+            phone='9000000000', address='1 Profile Lane', coffee_preferences={'emailNotif': True},
+        )
+        self.client.force_login(self.user)
+        self.razorpay = razorpay = Mock()
+        razorpay.order.create.return_value = {'id': 'order_checkout'}
+        for patcher in (
+            patch('apps.products.views._get_razorpay_client', return_value=razorpay),
+            patch('apps.products.views._compute_loyalty_stats', return_value=LOYALTY_STATS),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _checkout(self, client_order_id, **extra):
+        return self.client.post('/api/payment/create-order/', data=json.dumps({
+            'amount': 180, 'email': self.user.email, 'clientOrderId': client_order_id,
+            'items': [{'name': 'Mocha', 'qty': 1}], **extra,
+        }), content_type='application/json')
+
+    def test_checkout_writes_the_order_and_defers_follow_ups(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self._checkout('CKH-9001', address='22 Delivery Road')
+
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(id=response.json()['backend_order_id'])
+        self.assertEqual(order.order_address, '22 Delivery Road')
+        self.assertEqual(order.order_name, 'Bea Buyer')
+        self.assertTrue(Payment.objects.filter(order=order, razorpay_order_id='order_checkout').exists())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.address, '1 Profile Lane')
+        self.assertIsNone(self.profile.last_order_at)
+        self.assertFalse(UserActivity.objects.filter(action='order_created').exists())
+        self.assertFalse(Notification.objects.filter(event='order_placed').exists())
+
+        for callback in callbacks:
+            callback()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.address, '1 Profile Lane')
+        self.assertEqual((self.profile.total_orders, self.profile.last_order_items), (1, [{'name': 'Mocha', 'qty': 1}]))
+        self.assertTrue(UserActivity.objects.filter(action='order_created', metadata__orderId=str(order.id)).exists())
+        self.assertTrue(Notification.objects.filter(email=self.user.email, event='order_placed').exists())
+
+    def test_new_order_commits_with_its_counters_and_first_event(self):
+        response = self._checkout('CKH-9002')
+
+        order = Order.objects.get(id=response.json()['backend_order_id'])
+        self.assertEqual(list(order.status_events.values_list('from_status', 'status', 'source')), [
+            ('', 'pending', 'checkout'),
+        ])
+        self.assertEqual(OrderStatusCount.objects.get(status='pending').count, 1)
+        self.assertEqual(DailyOrderRollup.objects.get().orders_placed, 1)
+
+    def test_razorpay_failure_removes_the_order_its_events_and_its_counters(self):
+        self.razorpay.order.create.side_effect = RuntimeError('gateway down')
+
+        response = self._checkout('CKH-9003')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderStatusEvent.objects.exists())
+        self.assertEqual(OrderStatusCount.objects.get(status='pending').count, 0)
+        self.assertEqual(DailyOrderRollup.objects.get().orders_placed, 0)
+
+    def test_retry_finds_the_order_however_old(self):
+        oldest = Order.objects.create(
+            user=self.user, email=self.user.email, total_amount=Decimal('180.00'),
+            extra_fields={'clientOrderId': 'CKH-first'},
+        )
+        Order.objects.filter(id=oldest.id).update(created_at=timezone.now() - timedelta(days=365))
+        Order.objects.bulk_create(
+            Order(email=self.user.email, total_amount=Decimal('90.00'), extra_fields={'clientOrderId': f'CKH-{n}'})
+            for n in range(450)
+        )
+
+        response = self._checkout('CKH-first')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['backend_order_id'], str(oldest.id))
+        self.assertEqual(Order.objects.filter(email=self.user.email).count(), 451)
+
+    def test_retry_finds_orders_whose_extra_fields_were_stored_as_a_string(self):
+        from django.apps import apps as installed_apps
+        legacy = Order.objects.create(
+            email=self.user.email, total_amount=Decimal('180.00'), extra_fields='{"clientOrderId": "CKH-legacy"}',
+        )
+        import_module('apps.products.migrations.0012_parse_string_extra_fields').parse_string_extra_fields(
+            installed_apps, None,
+        )
+
+        response = self._checkout('CKH-legacy')
+
+        self.assertEqual(response.json()['backend_order_id'], str(legacy.id))
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.extra_fields['clientOrderId'], 'CKH-legacy')
+
+    def test_extra_fields_migration_leaves_unparseable_strings_alone(self):
+        from django.apps import apps as installed_apps
+        garbled = Order.objects.create(email=self.user.email, total_amount=Decimal('90.00'), extra_fields='{"clientOrd')
+        listed = Order.objects.create(email=self.user.email, total_amount=Decimal('90.00'), extra_fields='["a"]')
+
+        with self.assertLogs('apps.products.migrations.0012_parse_string_extra_fields', 'WARNING') as logs:
+            import_module('apps.products.migrations.0012_parse_string_extra_fields').parse_string_extra_fields(
+                installed_apps, None,
+            )
+
+        garbled.refresh_from_db()
+        listed.refresh_from_db()
+        self.assertEqual((garbled.extra_fields, listed.extra_fields), ('{"clientOrd', '["a"]'))
+        self.assertIn(f'ids [{garbled.id}, {listed.id}]', logs.output[0])
+
+
+class OrderMetricsTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(
+            username='metrics@example.com',
+            email='metrics@example.com',
+            password='StrongPass123!',
+        )
+        UserProfile.objects.create(user=self.user, email=self.user.email, coffee_preferences={'emailNotif': False})
+        self.staff = user_model.objects.create_user(
+            username='staff@example.com',
+            email='staff@example.com',
+            password='StrongPass123!',
+            is_staff=True,
+        )
+        self.pending = Order.objects.create(
+            user=self.user, email=self.user.email, total_amount=Decimal('100.00'), status='pending',
+        )
+        Order.objects.create(
+            user=self.user, email=self.user.email, total_amount=Decimal('50.00'), status='paid',
+        )
+        recompute_order_metrics()
+
+    def _snapshot(self):
+        return (
+            {c.status: c.count for c in OrderStatusCount.objects.all() if c.count},
+            [(r.date, r.orders_placed, r.paid_orders, r.revenue) for r in DailyOrderRollup.objects.order_by('date')],
+        )
+
+    def test_status_update_adjusts_counters_incrementally(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            '/api/orders/',
+            data=json.dumps({'action': 'update_status', 'orderId': self.pending.id, 'status': 'confirmed'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        metrics = get_order_metrics()
+        self.assertEqual(metrics['totalOrders'], 2)
+        self.assertEqual(metrics['pendingOrders'], 0)
+        self.assertEqual(metrics['statusCounts'].get('confirmed'), 1)
+        self.assertEqual(metrics['daily'][-1]['revenue'], 150.0)
+
+        incremental = self._snapshot()
+        recompute_order_metrics()
+        self.assertEqual(incremental, self._snapshot())
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/staff/metrics/orders/')
+        self.assertNotEqual(response.status_code, 200)
+
+        self.client.force_login(self.staff)
+        self.client.get('/api/staff/metrics/orders/')
+        # Session, user, counters and rollups only: no count over the orders table.
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/staff/metrics/orders/')
+        self.assertEqual(response.status_code, 200)
+        metrics = response.json()['metrics']
+        self.assertEqual(metrics['totalOrders'], 2)
+        self.assertEqual(metrics['completedOrders'], 1)
+
+    def test_migration_backfills_counters_for_existing_orders(self):
+        from django.apps import apps as installed_apps
+        backfill = import_module('apps.products.migrations.0011_backfill_order_metrics').backfill_order_metrics
+        OrderStatusCount.objects.all().delete()
+        DailyOrderRollup.objects.all().delete()
+
+        backfill(installed_apps, None)
+        transition_order(self.pending, 'confirmed')
+
+        counts, _daily = self._snapshot()
+        self.assertEqual(counts, {'paid': 1, 'confirmed': 1})
+
+    def test_failed_counter_update_rolls_the_transition_back(self):
+        with patch('apps.products.order_metrics._bump_status', side_effect=DatabaseError('counter locked')):
+            with self.assertRaises(DatabaseError):
+                transition_order(self.pending, 'confirmed')
+
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.status, 'pending')
+        self.assertFalse(OrderStatusEvent.objects.filter(order=self.pending).exists())
+        incremental = self._snapshot()
+        recompute_order_metrics()
+        self.assertEqual(incremental, self._snapshot())
+
+    def test_dashboard_read_never_scans_the_orders_table(self):
+        OrderStatusCount.objects.all().delete()
+        cache.clear()
+        # Counters, user count and rollups; empty counters are not rebuilt from the orders table.
+        with self.assertNumQueries(3):
+            metrics = get_order_metrics()
+        self.assertEqual(metrics['totalOrders'], 0)
+
+
+class AdminMongoUserListingTests(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            username='staff@example.com',
+            email='staff@example.com',
+            password='StrongPass123!',
+            is_staff=True,
+        )
+        self.client.force_login(self.staff)
+
+    def test_listing_is_paginated_with_whitelisted_projection(self):
+        page = ([{'_id': 'a1', 'email': 'ann@example.com', 'phone': '1'}], 'a1')
+        with patch('apps.products.views.User.find_page', return_value=page) as find_page:
+            response = self.client.get('/api/staff/mongo-users/?q=ann&limit=1&fields=phone,password,avatar')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['nextCursor'], 'a1')
+        self.assertEqual(body['users'], [{'_id': 'a1', 'email': 'ann@example.com', 'phone': '1'}])
+        kwargs = find_page.call_args.kwargs
+        self.assertEqual(kwargs['projection'], {'email': 1, 'phone': 1})
+        self.assertEqual(kwargs['email_prefix'], 'ann')
+        self.assertEqual(kwargs['limit'], 1)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/staff/mongo-users/?after=not-an-object-id')
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_ignores_case_and_pages_in_email_order(self):
+        self.enterContext(fake_mongo())
+        for email in ('ann.b@example.com', 'Ann.A@Example.com', 'bob@example.com', 'ANNA@example.com'):
+            MongoUser.create('First', 'Last', email, '', 'hash')
+
+        emails, after = [], None
+        while True:
+            params = '?q=%20ANN&limit=1&fields=email' + (f'&after={after}' if after else '')
+            body = self.client.get(f'/api/staff/mongo-users/{params}').json()
+            emails += [user['email'] for user in body['users']]
+            self.assertTrue(all('emailLower' not in user for user in body['users']))
+            after = body['nextCursor']
+            if not after:
+                break
+
+        self.assertEqual(emails, ['Ann.A@Example.com', 'ann.b@example.com', 'ANNA@example.com'])
+        self.assertEqual(MongoUser.find_by_email('Ann.A@Example.com')['emailLower'], 'ann.a@example.com')
+
+    def test_backfill_command_stores_lowercased_emails(self):
+        mongo = self.enterContext(fake_mongo())
+        self.enterContext(patch(
+            'apps.products.management.commands.backfill_mongo_email_lower.get_database', return_value=mongo,
+        ))
+        mongo['users'].insert_one({'email': 'Legacy@Example.com'})
+
+        call_command('backfill_mongo_email_lower', stdout=StringIO())
+
+        users, _cursor = MongoUser.find_page(email_prefix='legacy')
+        self.assertEqual([user['email'] for user in users], ['Legacy@Example.com'])
+
+    def test_ndjson_export_streams_rows(self):
+        rows = iter([
+            {'_id': 'a1', 'email': 'ann@example.com', 'avatar': 'data:image/png;base64,AAAA'},
+            {'_id': 'b2', 'email': 'bob@example.com'},
+        ])
+        with patch('apps.products.views.User.iter_users', return_value=rows):
+            response = self.client.get('/api/staff/mongo-users/?format=ndjson&fields=email')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line)['email'] for line in lines], ['ann@example.com', 'bob@example.com'])
+        self.assertNotIn('avatar', lines[0])
+
+
+class AvatarStorageTests(TestCase):
+    def setUp(self):
+        self.media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_dir.cleanup)
+        overrides = override_settings(AVATAR_ROOT=self.media_dir.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        avatars._storage = None
+        self.addCleanup(setattr, avatars, '_storage', None)
+        cache.clear()
+
+        self.user = get_user_model().objects.create_user(
+            username='avatar@example.com',
+            email='avatar@example.com',
+            password='StrongPass123!',
+        )
+        UserProfile.objects.create(user=self.user, email=self.user.email)
+        self.client.force_login(self.user)
+
+    def _png_data_url(self):
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), (120, 80, 40)).save(buffer, format='PNG')
+        return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+    @skipIf(avatars.Image is None, 'Pillow is not installed')
+    def test_profile_update_stores_avatar_file_and_keeps_only_url(self):
+        mongo_user = {'email': self.user.email, 'avatar': ''}
+        with patch('apps.products.views.User.find_by_email', return_value=mongo_user), \
+                patch('apps.products.views.User.update') as mongo_update:
+            response = self.client.post(
+                '/api/auth/profile/',
+                data=json.dumps({'source': 'profile', 'avatar': self._png_data_url()}),
+                content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        url = UserProfile.objects.get(email=self.user.email).avatar
+        self.assertRegex(url, r'^/api/avatars/[0-9a-f]{32}-256\.png$')
+        self.assertEqual(mongo_update.call_args.args[1]['avatar'], url)
+
+        image_response = self.client.get(url)
+        self.assertEqual(image_response.status_code, 200)
+        self.assertEqual(image_response['Content-Type'], 'image/png')
+        self.assertIn('immutable', image_response['Cache-Control'])
+        thumbnail = Image.open(BytesIO(image_response.content))
+        self.assertEqual(max(thumbnail.size), 256)
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=image_response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    @skipIf(avatars.Image is None, 'Pillow is not installed')
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_profile_read_defers_moving_an_inline_avatar_into_storage(self):
+        inline = self._png_data_url()
+        UserProfile.objects.filter(email=self.user.email).update(avatar=inline)
+        mongo = FakeMongoDatabase()
+        mongo['users'].insert_one({'email': self.user.email, 'firstName': 'Ava', 'avatar': inline})
+
+        with fake_mongo(mongo), self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.get('/api/auth/profile/')
+            # A second read while the first migration is queued does not queue another.
+            self.client.get('/api/auth/profile/')
+        self.assertEqual(len(callbacks), 1)
+
+        # The read itself neither decodes the image nor writes anywhere.
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['avatar'], inline)
+        self.assertEqual(os.listdir(self.media_dir.name), [])
+        self.assertEqual(UserProfile.objects.get(email=self.user.email).avatar, inline)
+
+        with fake_mongo(mongo):
+            for callback in callbacks:
+                callback()
+        url = UserProfile.objects.get(email=self.user.email).avatar
+        self.assertRegex(url, r'^/api/avatars/[0-9a-f]{32}-256\.png$')
+        self.assertEqual(mongo['users'].find_one({'email': self.user.email})['avatar'], url)
+
+    def test_concurrent_saves_of_the_same_avatar_do_not_collide(self):
+        storage = avatars.LocalAvatarStorage(self.media_dir.name)
+        name = 'a' * 32 + '.png'
+        errors = []
+
+        def save():
+            for _ in range(25):
+                try:
+                    storage.save(name, b'avatar-bytes', 'image/png')
+                except Exception as exc:
+                    errors.append(exc)
+
+        threads = [threading.Thread(target=save) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(self.media_dir.name), [name])
+        self.assertEqual(storage.open(name), b'avatar-bytes')
+
+    def test_storage_backends_must_implement_the_interface(self):
+        class Incomplete(avatars.AvatarStorage):
+            def exists(self, name):
+                return False
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_invalid_avatar_payload_is_rejected(self):
+        mongo_user = {'email': self.user.email}
+        with patch('apps.products.views.User.find_by_email', return_value=mongo_user):
+            response = self.client.post(
+                '/api/auth/profile/',
+                data=json.dumps({'source': 'profile', 'avatar': 'data:text/html;base64,PGgxPg=='}),
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 400)
+
+    def test_avatar_route_rejects_unknown_names(self):
+        self.assertEqual(self.client.get('/api/avatars/..%2Fsettings.py').status_code, 404)
+        self.assertEqual(self.client.get('/api/avatars/' + 'a' * 32 + '.png').status_code, 404)
+
+
+class OrderStatusTransitionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='tracker@example.com',
+            email='tracker@example.com',
+            password='StrongPass123!',
+        )
+        UserProfile.objects.create(user=self.user, email=self.user.email, coffee_preferences={'emailNotif': False})
+        self.order = Order.objects.create(
+            user=self.user,
+            email=self.user.email,
+            total_amount=Decimal('80.00'),
+            status='pending',
+            extra_fields={'clientOrderId': 'CKH-3001', 'trackingHistory': [{'status': 'pending', 'timestamp': 'legacy'}]},
+        )
+        self.client.force_login(self.user)
+
+    def _update(self, status, **extra):
+        return self.client.post(
+            '/api/orders/',
+            data=json.dumps({'action': 'update_status', 'orderId': self.order.id, 'status': status, **extra}),
+            content_type='application/json',
+        )
+
+    def test_transitions_append_events_without_rewriting_extra_fields(self):
+        self.assertEqual(self._update('confirmed').status_code, 200)
+        response = self._update('preparing', includeHistory=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [h['status'] for h in response.json()['trackingHistory']],
+            ['pending', 'confirmed', 'preparing'],
+        )
+        events = OrderStatusEvent.objects.filter(order=self.order).order_by('id')
+        self.assertEqual([(e.from_status, e.status) for e in events], [('pending', 'confirmed'), ('confirmed', 'preparing')])
+        self.order.refresh_from_db()
+        self.assertEqual(len(self.order.extra_fields['trackingHistory']), 1)
+
+    def test_backward_transition_is_rejected(self):
+        self._update('ready')
+        response = self._update('pending')
+        self.assertEqual(response.status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'ready')
+
+    def test_stale_status_loses_conditional_update(self):
+        stale = Order.objects.get(id=self.order.id)
+        transition_order(self.order, 'confirmed')
+        with self.assertRaises(StaleTransition):
+            transition_order(stale, 'cancelled')
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'confirmed')
+
+    def test_order_list_includes_history_only_on_request(self):
+        transition_order(self.order, 'confirmed')
+        with patch('apps.products.views._backfill_orders_from_mongo'):
+            plain = self.client.get('/api/orders/').json()['orders'][0]
+            detailed = self.client.get('/api/orders/?history=1').json()['orders'][0]
+
+        self.assertNotIn('trackingHistory', plain)
+        self.assertEqual(plain['status'], 'confirmed')
+        self.assertEqual([h['status'] for h in detailed['trackingHistory']], ['pending', 'confirmed'])
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    DEFAULT_FROM_EMAIL='noreply@coffeekaafihai.test',
+    BACKGROUND_TASKS_EAGER=True,
+)
+class PaymentVerificationFastPathTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='payer@example.com',
+            email='payer@example.com',
+            password='StrongPass123!',
+        )
+        UserProfile.objects.create(user=self.user, email=self.user.email)
+        self.order = Order.objects.create(
+            user=self.user,
+            email=self.user.email,
+            total_amount=Decimal('150.00'),
+            status='pending',
+        )
+        Payment.objects.create(
+            user=self.user,
+            order=self.order,
+            email=self.user.email,
+            amount=Decimal('150.00'),
+            razorpay_order_id='order_fast_1',
+            status='pending',
+        )
+        self.razorpay = Mock()
+        patcher = patch('apps.products.views._get_razorpay_client', return_value=self.razorpay)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        stats_patcher = patch('apps.products.views._compute_loyalty_stats', return_value=LOYALTY_STATS)
+        stats_patcher.start()
+        self.addCleanup(stats_patcher.stop)
+
+    def _verify(self):
+        return self.client.post(
+            '/api/payment/verify-payment/',
+            data=json.dumps({
+                'razorpay_order_id': 'order_fast_1',
+                'razorpay_payment_id': 'pay_fast_1',
+                'razorpay_signature': 'sig_fast_1',
+            }),
+            content_type='application/json',
+        )
+
+    def test_follow_up_work_is_deferred_until_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self._verify()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Payment.objects.get(razorpay_order_id='order_fast_1').status, 'verified')
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'paid')
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_duplicate_callback_is_a_no_op(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._verify()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with CaptureQueriesContext(connection) as queries:
+                response = self._verify()
+
+        statements = [q['sql'].split()[0] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        # One conditional UPDATE that matches nothing plus one read of the payment.
+        self.assertEqual(statements, ['UPDATE', 'SELECT'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['alreadyVerified'])
+        self.assertEqual(callbacks, [])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OrderStatusEvent.objects.filter(order=self.order, status='paid').count(), 1)
+
+    def test_bad_signature_never_downgrades_verified_payment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._verify()
+        self.razorpay.utility.verify_payment_signature.side_effect = SignatureVerificationError('bad')
+
+        response = self._verify()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Payment.objects.get(razorpay_order_id='order_fast_1').status, 'verified')
+
+
+@override_settings(
+    RAZORPAY_WEBHOOK_SECRET='whsec_test',
+    BACKGROUND_TASKS_EAGER=True,
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class RazorpayWebhookTests(TestCase):
+    def setUp(self):
+        UserProfile.objects.create(email='hook@example.com', coffee_preferences={'emailNotif': False})
+        self.order = Order.objects.create(email='hook@example.com', total_amount=Decimal('90.00'), status='pending')
+        Payment.objects.create(
+            order=self.order,
+            email='hook@example.com',
+            amount=Decimal('90.00'),
+            razorpay_order_id='order_hook_1',
+            status='pending',
+        )
+        patcher = patch('apps.products.views._compute_loyalty_stats', return_value=LOYALTY_STATS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _deliver(self, event, event_id='evt_1', secret='whsec_test'):
+        body = json.dumps({
+            'event': event,
+            'payload': {'payment': {'entity': {'id': 'pay_hook_1', 'order_id': 'order_hook_1'}}},
+        }).encode()
+        signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            '/api/payment/webhook/',
+            data=body,
+            content_type='application/json',
+            HTTP_X_RAZORPAY_SIGNATURE=signature,
+            HTTP_X_RAZORPAY_EVENT_ID=event_id,
+        )
+
+    def test_captured_event_is_stored_then_applied_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self._deliver('payment.captured')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PaymentWebhookEvent.objects.get().status, 'received')
+        self.assertEqual(Payment.objects.get().status, 'pending')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(PaymentWebhookEvent.objects.get().status, 'processed')
+        payment = Payment.objects.get()
+        self.assertEqual((payment.status, payment.razorpay_payment_id), ('verified', 'pay_hook_1'))
+        self.assertEqual(Order.objects.get(id=self.order.id).status, 'paid')
+
+    def test_redelivery_is_deduplicated_and_idempotent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._deliver('payment.captured')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._deliver('payment.captured')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PaymentWebhookEvent.objects.count(), 1)
+        self.assertEqual(OrderStatusEvent.objects.filter(order=self.order, status='paid').count(), 1)
+
+    def test_failed_event_after_capture_does_not_downgrade(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._deliver('payment.captured', event_id='evt_1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self._deliver('payment.failed', event_id='evt_2')
+        self.assertEqual(Payment.objects.get().status, 'verified')
+
+    def test_bad_signature_is_rejected_without_storing(self):
+        response = self._deliver('payment.captured', secret='wrong')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentWebhookEvent.objects.exists())
+
+    def test_stale_claims_are_requeued_by_claim_time_not_arrival(self):
+        long_ago = timezone.now() - timedelta(hours=2)
+        for event_id, claimed_at in (('evt_fresh', timezone.now()), ('evt_stuck', long_ago)):
+            event = PaymentWebhookEvent.objects.create(
+                event_id=event_id, event='payment.captured', body={}, status='processing', claimed_at=claimed_at,
+            )
+            PaymentWebhookEvent.objects.filter(id=event.id).update(received_at=long_ago)
+
+        self.assertEqual(requeue_stale_webhook_events(minutes=10), 1)
+        statuses = dict(PaymentWebhookEvent.objects.values_list('event_id', 'status'))
+        self.assertEqual(statuses, {'evt_fresh': 'processing', 'evt_stuck': 'received'})
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, RAZORPAY_KEY_ID='rzp_test', RAZORPAY_KEY_SECRET='secret')
+class PaymentReconciliationTests(TestCase):
+    def setUp(self):
+        self.server = FakeRazorpayServer()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        patcher = patch('apps.products.views._compute_loyalty_stats', return_value=LOYALTY_STATS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        UserProfile.objects.create(email='sweep@example.com', coffee_preferences={'emailNotif': False})
+
+    def _payment(self, razorpay_order_id, status='pending', attempts=None, minutes_ago=60):
+        order = Order.objects.create(email='sweep@example.com', total_amount=Decimal('50.00'), status='pending')
+        payment = Payment.objects.create(
+            order=order,
+            email='sweep@example.com',
+            amount=Decimal('50.00'),
+            razorpay_order_id=razorpay_order_id,
+            status=status,
+        )
+        Payment.objects.filter(id=payment.id).update(updated_at=timezone.now() - timedelta(minutes=minutes_ago))
+        if attempts is not None:
+            self.server.attempts[razorpay_order_id] = attempts
+        return payment
+
+    def _reconcile(self, **kwargs):
+        with override_settings(RAZORPAY_API_BASE_URL=self.server.base_url):
+            with self.captureOnCommitCallbacks(execute=True):
+                return reconcile_stale_payments(rate=0, **kwargs)
+
+    def test_sweep_applies_gateway_results_in_batches(self):
+        captured = self._payment('order_sweep_1', attempts=[
+            {'id': 'pay_a', 'status': 'failed'},
+            {'id': 'pay_b', 'status': 'captured'},
+        ])
+        failed = self._payment('order_sweep_2', status='processing', attempts=[{'id': 'pay_c', 'status': 'failed'}])
+        authorized = self._payment('order_sweep_3', attempts=[{'id': 'pay_d', 'status': 'authorized'}])
+        errored = self._payment('order_sweep_4')
+        recent = self._payment('order_sweep_5', attempts=[{'id': 'pay_e', 'status': 'captured'}], minutes_ago=1)
+
+        summary = self._reconcile(batch_size=2, concurrency=3)
+
+        self.assertEqual(summary, {'scanned': 4, 'verified': 1, 'failed': 1, 'unchanged': 1, 'errors': 1})
+        captured.refresh_from_db()
+        self.assertEqual((captured.status, captured.razorpay_payment_id), ('verified', 'pay_b'))
+        self.assertEqual(captured.order.status, 'paid')
+        self.assertEqual(Payment.objects.get(id=failed.id).status, 'failed')
+        self.assertEqual(Payment.objects.get(id=authorized.id).status, 'pending')
+        self.assertEqual(Payment.objects.get(id=errored.id).status, 'pending')
+        self.assertEqual(Payment.objects.get(id=recent.id).status, 'pending')
+        self.assertNotIn('order_sweep_5', self.server.requests)
+
+    def test_dry_run_and_limit_do_not_write(self):
+        first = self._payment('order_sweep_6', attempts=[{'id': 'pay_f', 'status': 'captured'}])
+        self._payment('order_sweep_7', attempts=[{'id': 'pay_g', 'status': 'captured'}])
+
+        summary = self._reconcile(limit=1, dry_run=True)
+
+        self.assertEqual(summary['scanned'], 1)
+        self.assertEqual(summary['verified'], 1)
+        self.assertEqual(self.server.requests, ['order_sweep_6'])
+        self.assertEqual(Payment.objects.get(id=first.id).status, 'pending')
+
+
+@override_settings(OTP_STORE_BACKEND='apps.products.otp.DatabaseOTPStore', PASSWORD_RESET_OTP_MAX_ATTEMPTS=3)
+class DatabaseOTPStoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_issue_replaces_previous_code(self):
+        first = issue_otp('Reset@Example.com', code='111111')
+        issue_otp('reset@example.com', code='222222')
+
+        self.assertEqual(first, '111111')
+        self.assertEqual(check_otp('reset@example.com', '111111'), (False, OTP_INVALID))
+        self.assertEqual(check_otp('RESET@example.com ', '222222'), (True, None))
+        self.assertEqual(check_otp('reset@example.com', '222222', consume=True), (True, None))
+
+    def test_consumed_code_cannot_be_replayed(self):
+        issue_otp('reset@example.com', code='333333')
+
+        self.assertEqual(check_otp('reset@example.com', '333333', consume=True), (True, None))
+        self.assertEqual(check_otp('reset@example.com', '333333', consume=True), (False, OTP_MISSING))
+
+    def test_attempts_are_capped_and_expired_codes_are_removed(self):
+        issue_otp('reset@example.com', code='444444')
+        for _ in range(3):
+            self.assertEqual(check_otp('reset@example.com', '000000'), (False, OTP_INVALID))
+        self.assertEqual(check_otp('reset@example.com', '444444'), (False, OTP_LOCKED))
+
+        issue_otp('late@example.com', code='555555')
+        OTPToken.objects.filter(email='late@example.com').update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(check_otp('late@example.com', '555555'), (False, OTP_MISSING))
+        self.assertFalse(OTPToken.objects.filter(email='late@example.com').exists())
+        self.assertEqual(OTPToken.objects.count(), 1)
+
+    def test_issue_touches_only_its_own_row_and_the_command_purges_the_rest(self):
+        store = DatabaseOTPStore()
+        store.issue(PASSWORD_RESET, 'gone@example.com', '111111', 60)
+        store.issue(PASSWORD_RESET, 'again@example.com', '222222', 60)
+        OTPToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        with CaptureQueriesContext(connection) as queries:
+            store.issue(PASSWORD_RESET, 'again@example.com', '333333', 60)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(OTPToken.objects.count(), 2)
+
+        call_command('purge_expired_otps', stdout=StringIO())
+        self.assertEqual(list(OTPToken.objects.values_list('email', 'code')), [('again@example.com', '333333')])
+
+    def test_legacy_send_otp_cannot_plant_a_password_reset_code(self):
+        user = get_user_model().objects.create_user(
+            username='victim@example.com', email='victim@example.com', password='OldPass123!',
+        )
+        with override_settings(DEFAULT_FROM_EMAIL=''), self.assertLogs('apps.products', 'ERROR'):
+            unsent = self.client.post(
+                '/api/send-otp-email/',
+                data=json.dumps({'email': 'victim@example.com', 'otp': '111111'}),
+                content_type='application/json',
+            )
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            DEFAULT_FROM_EMAIL='noreply@coffeekaafihai.test',
+        ):
+            sent = self.client.post(
+                '/api/send-otp-email/',
+                data=json.dumps({'email': 'victim@example.com', 'otp': '111111'}),
+                content_type='application/json',
+            )
+        code = mail.outbox[0].body.split('Your OTP is ')[1][:6]
+
+        with patch('apps.products.password_reset_views.MongoUser.update'):
+            planted = self.client.post(
+                '/api/auth/password/reset/',
+                data=json.dumps({'email': 'victim@example.com', 'otp': '111111', 'newPassword': 'Hijack123!'}),
+                content_type='application/json',
+            )
+            emailed = self.client.post(
+                '/api/auth/password/reset/',
+                data=json.dumps({'email': 'victim@example.com', 'otp': code, 'newPassword': 'Hijack123!'}),
+                content_type='application/json',
+            )
+        validated = self.client.post(
+            '/api/validate-otp/',
+            data=json.dumps({'email': 'victim@example.com', 'otp': code}),
+            content_type='application/json',
+        )
+
+        self.assertEqual((unsent.status_code, sent.status_code), (500, 200))
+        self.assertEqual((planted.status_code, emailed.status_code), (400, 400))
+        self.assertEqual(validated.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('OldPass123!'))
+
+
+@override_settings(OTP_STORE_BACKEND='apps.products.otp.CacheOTPStore', PASSWORD_RESET_OTP_MAX_ATTEMPTS=3)
+class CacheOTPStoreTests(DatabaseOTPStoreTests):
+    def test_attempts_are_capped_and_expired_codes_are_removed(self):
+        issue_otp('reset@example.com', code='444444')
+        for _ in range(3):
+            self.assertEqual(check_otp('reset@example.com', '000000'), (False, OTP_INVALID))
+        self.assertEqual(check_otp('reset@example.com', '444444'), (False, OTP_LOCKED))
+
+        cache.clear()
+        self.assertEqual(check_otp('reset@example.com', '444444'), (False, OTP_MISSING))
+        self.assertFalse(OTPToken.objects.exists())
+
+    def test_password_reset_flow_uses_the_shared_store(self):
+        user = get_user_model().objects.create_user(
+            username='flow@example.com', email='flow@example.com', password='OldPass123!',
+        )
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            DEFAULT_FROM_EMAIL='noreply@coffeekaafihai.test',
+        ):
+            self.client.post(
+                '/api/auth/password/forgot/',
+                data=json.dumps({'email': 'Flow@Example.com'}),
+                content_type='application/json',
+            )
+        code = mail.outbox[0].body.split('Your OTP is ')[1][:6]
+
+        with patch('apps.products.password_reset_views.MongoUser.update'):
+            response = self.client.post(
+                '/api/auth/password/reset/',
+                data=json.dumps({'email': 'flow@example.com', 'otp': code, 'newPassword': 'NewPass123!'}),
+                content_type='application/json',
+            )
+            replay = self.client.post(
+                '/api/auth/password/reset/',
+                data=json.dumps({'email': 'flow@example.com', 'otp': code, 'newPassword': 'Other123!'}),
+                content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replay.status_code, 400)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('NewPass123!'))
+
+
+@override_settings(
+    RATELIMIT_BACKEND='apps.products.ratelimit.MemoryRateLimitBackend',
+    RATELIMIT_RATES={'login': {'ip': '2/m'}, 'otp': {'ip': '100/m', 'email': '1/10m'}},
+)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        get_rate_limit_backend().reset()
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/m'), (10, 60))
+        self.assertEqual(parse_rate('5/15m'), (5, 900))
+        self.assertEqual(parse_rate('100/day'), (100, 86400))
+        with self.assertRaises(ValueError):
+            parse_rate('ten per minute')
+
+    def _sliding_window(self, backend):
+        start = 6000.0  # aligned to a 60s window boundary
+        with patch('apps.products.ratelimit.time.time', return_value=start):
+            results = [backend.hit('k', 10, 60)[0] for _ in range(11)]
+        self.assertEqual(results, [True] * 10 + [False])
+
+        # Halfway through the next window the previous 10 hits weigh 5.
+        with patch('apps.products.ratelimit.time.time', return_value=start + 90):
+            results = [backend.hit('k', 10, 60) for _ in range(6)]
+        self.assertEqual([allowed for allowed, _ in results], [True] * 5 + [False])
+        self.assertEqual(results[-1][1], 6)
+
+    def test_memory_backend_sliding_window(self):
+        self._sliding_window(MemoryRateLimitBackend())
+
+    def test_cache_backend_sliding_window(self):
+        self._sliding_window(CacheRateLimitBackend())
+
+    def test_login_is_limited_per_ip_with_retry_after(self):
+        statuses = [
+            self.client.post('/api/auth/login/', data='{}', content_type='application/json').status_code
+            for _ in range(2)
+        ]
+        response = self.client.post('/api/auth/login/', data='{}', content_type='application/json')
+        other_ip = self.client.post(
+            '/api/auth/login/', data='{}', content_type='application/json', REMOTE_ADDR='10.0.0.9',
+        )
+
+        self.assertNotIn(429, statuses)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertFalse(response.json()['success'])
+        self.assertNotEqual(other_ip.status_code, 429)
+
+    def test_otp_email_limit_is_shared_across_endpoints_and_ips(self):
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            DEFAULT_FROM_EMAIL='noreply@coffeekaafihai.test',
+        ):
+            first = self.client.post(
+                '/api/send-otp-email/',
+                data=json.dumps({'email': 'Victim@Example.com', 'otp': '123456'}),
+                content_type='application/json',
+            )
+            second = self.client.post(
+                '/api/auth/password/forgot/',
+                data=json.dumps({'email': 'victim@example.com'}),
+                content_type='application/json',
+                REMOTE_ADDR='10.0.0.7',
+            )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(RATELIMIT_RATES={'otp': {'ip': '2/m', 'email': '1/10m'}})
+    def test_request_rejected_by_one_limit_is_not_counted_against_the_others(self):
+        def forgot(email):
+            return self.client.post(
+                '/api/auth/password/forgot/', data=json.dumps({'email': email}), content_type='application/json',
+            ).status_code
+
+        with patch('apps.products.ratelimit.time.time', return_value=6000.0), \
+                self.settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            statuses = [forgot(email) for email in ('a@example.com', 'a@example.com', 'b@example.com', 'c@example.com')]
+
+        # The email limit turned away the repeat, which left the IP room for 'b' before it ran out.
+        self.assertEqual([status == 429 for status in statuses], [False, True, False, True])
+
+    def test_backends_must_implement_hit_many(self):
+        with self.assertRaises(TypeError):
+            type('Incomplete', (ratelimit.RateLimitBackend,), {})()
+
+
+@override_settings(ORDER_EVENTS_HEARTBEAT_SECONDS=10, ORDER_EVENTS_MAX_STREAM_SECONDS=0.3)
+class OrderEventStreamTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='live@example.com', email='live@example.com', password='StrongPass123!',
+        )
+        self.order = Order.objects.create(email='live@example.com', total_amount=Decimal('10.00'), status='pending')
+        self.first = OrderStatusEvent.objects.create(order=self.order, email='live@example.com', status='pending')
+        OrderStatusEvent.objects.create(order=self.order, email='other@example.com', status='pending')
+
+    async def _open(self, headers=None):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/orders/events/', headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response, aiter(response.streaming_content)
+
+    async def test_requires_login(self):
+        response = await self.async_client.get('/api/orders/events/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_resumes_after_last_event_id(self):
+        second = await OrderStatusEvent.objects.acreate(
+            order=self.order, email='live@example.com', from_status='pending', status='paid',
+        )
+        _response, stream = await self._open(headers={'Last-Event-ID': str(self.first.id)})
+        chunks = [chunk.decode() if isinstance(chunk, bytes) else chunk async for chunk in stream]
+
+        self.assertTrue(chunks[0].startswith('retry: '))
+        events = [chunk for chunk in chunks if chunk.startswith('id: ')]
+        self.assertEqual(len(events), 1)
+        self.assertTrue(events[0].startswith(f'id: {second.id}\nevent: status\n'))
+        payload = json.loads(events[0].split('data: ', 1)[1])
+        self.assertEqual(payload['status'], 'paid')
+        self.assertEqual(payload['orderDbId'], str(self.order.id))
+
+    @override_settings(ORDER_EVENTS_MAX_STREAM_SECONDS=5)
+    async def test_published_event_wakes_open_stream(self):
+        _response, stream = await self._open()
+        await anext(stream)  # retry hint; the stream is now subscribed
+        self.assertEqual(hub.listener_count(), 1)
+
+        event = await OrderStatusEvent.objects.acreate(
+            order=self.order, email='live@example.com', from_status='pending', status='confirmed',
+        )
+        hub.publish('live@example.com')
+        chunk = await asyncio.wait_for(anext(stream), timeout=1)
+
+        self.assertIn(f'id: {event.id}', chunk.decode() if isinstance(chunk, bytes) else chunk)
+        await stream.aclose()
+
+    def test_transition_publishes_after_commit(self):
+        with patch('apps.products.order_status.publish_order_event') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                transition_order(self.order, 'paid', source='payment')
+                publish.assert_not_called()
+        publish.assert_called_once_with('live@example.com')
+
+
+@override_settings(
+    ORDER_EVENTS_HEARTBEAT_SECONDS=10,
+    ORDER_EVENTS_MAX_STREAM_SECONDS=5,
+    STAFF_FEED_COALESCE_SECONDS=0.1,
+)
+class StaffOrderFeedTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.staff = user_model.objects.create_user(
+            username='barista@example.com', email='barista@example.com', password='StrongPass123!', is_staff=True,
+        )
+        self.customer = user_model.objects.create_user(
+            username='guest@example.com', email='guest@example.com', password='StrongPass123!',
+        )
+        self.existing = Order.objects.create(email='a@example.com', total_amount=Decimal('40.00'), status='pending')
+        OrderStatusEvent.objects.create(order=self.existing, email='a@example.com', status='pending')
+
+    def _new_order(self):
+        order = Order.objects.create(
+            email='b@example.com',
+            order_name='Asha',
+            items=[{'name': 'Latte'}, {'name': 'Mocha'}],
+            total_amount=Decimal('320.00'),
+            extra_fields={'clientOrderId': 'CKH-1'},
+        )
+        OrderStatusEvent.objects.create(order=order, email='b@example.com', status='pending')
+        return order
+
+    def test_diff_coalesces_transitions_and_summarizes_new_orders(self):
+        after = latest_staff_event_id()
+        order = self._new_order()
+        transition_order(order, 'paid')
+        transition_order(self.existing, 'confirmed')
+        transition_order(self.existing, 'preparing')
+
+        last_id, diff = build_staff_diff(after)
+
+        self.assertEqual(last_id, latest_staff_event_id())
+        self.assertEqual(diff['status'], {str(self.existing.id): 'preparing'})
+        self.assertEqual(len(diff['new']), 1)
+        self.assertEqual(diff['new'][0]['orderId'], 'CKH-1')
+        self.assertEqual(diff['new'][0]['items'], 2)
+        self.assertEqual(diff['new'][0]['status'], 'paid')
+        self.assertEqual(build_staff_diff(last_id), (last_id, None))
+
+    def test_diff_resets_when_too_far_behind(self):
+        after = latest_staff_event_id()
+        transition_order(self.existing, 'confirmed')
+        transition_order(self.existing, 'preparing')
+
+        last_id, diff = build_staff_diff(after, limit=1)
+
+        self.assertEqual(diff, {'id': last_id, 'reset': True})
+        self.assertEqual(last_id, latest_staff_event_id())
+
+    async def test_feed_is_staff_only(self):
+        await self.async_client.aforce_login(self.customer)
+        response = await self.async_client.get('/api/staff/orders/events/')
+        self.assertEqual(response.status_code, 403)
+
+    async def test_burst_is_pushed_as_one_diff(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get('/api/staff/orders/events/')
+        stream = aiter(response.streaming_content)
+        await anext(stream)  # retry hint
+        next_chunk = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)  # let the stream and the shared reader subscribe
+        self.assertEqual(staff_feed.subscriber_count(), 1)
+
+        await sync_to_async(self._new_order)()
+        hub.publish('*staff*')
+        await sync_to_async(transition_order)(self.existing, 'confirmed')
+        hub.publish('*staff*')
+
+        chunk = await asyncio.wait_for(next_chunk, timeout=2)
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        self.assertIn('event: diff', chunk)
+        diff = json.loads(chunk.split('data: ', 1)[1])
+        self.assertEqual(len(diff['new']), 1)
+        self.assertEqual(diff['status'], {str(self.existing.id): 'confirmed'})
+        await stream.aclose()
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            username='ops@example.com', email='ops@example.com', password='StrongPass123!', is_staff=True,
+        )
+        self.client.force_login(self.staff)
+
+    def _timings_from_header(self, response):
+        entries = {}
+        for part in response['Server-Timing'].split(', '):
+            name, *params = part.split(';')
+            entries[name] = dict(param.split('=', 1) for param in params)
+        return entries
+
+    def test_request_reports_db_time_in_header_and_log(self):
+        with self.assertLogs('apps.products.perf', level='INFO') as logs:
+            response = self.client.get('/api/staff/metrics/orders/')
+
+        self.assertEqual(response.status_code, 200)
+        timings = self._timings_from_header(response)
+        self.assertIn('total', timings)
+        self.assertGreater(int(timings['db']['desc'].strip('"')), 0)
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(entry['route'], 'api/staff/metrics/orders/')
+        self.assertEqual(entry['status'], 200)
+        self.assertEqual(entry['db_count'], int(timings['db']['desc'].strip('"')))
+        self.assertEqual(entry['mongo_count'], 0)
+
+    @override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        DEFAULT_FROM_EMAIL='noreply@coffeekaafihai.test',
+        RATELIMIT_ENABLED=False,
+    )
+    def test_smtp_time_is_attributed(self):
+        response = self.client.post(
+            '/api/auth/password/forgot/',
+            data=json.dumps({'email': 'ops@example.com'}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._timings_from_header(response)['smtp']['desc'], '"1"')
+
+    def test_mongo_and_http_hooks_record_into_current_request(self):
+        timings = perf.RequestTimings()
+        token = perf._current.set(timings)
+        try:
+            perf.MongoCommandTimer().succeeded(Mock(duration_micros=2500))
+            with patch('requests.Session.request', return_value=Mock(status_code=200)):
+                perf.TimedSession().request('GET', 'http://gateway.test/v1/orders')
+        finally:
+            perf._current.reset(token)
+        perf.MongoCommandTimer().succeeded(Mock(duration_micros=1000))  # outside a request: ignored
+
+        self.assertEqual(timings.counts['mongo'], 1)
+        self.assertAlmostEqual(timings.durations['mongo'], 0.0025)
+        self.assertEqual(timings.counts['http'], 1)
+
+    def test_app_registers_its_mongo_listeners_once(self):
+        from database import mongo
+        from django.apps import apps as installed_apps
+
+        installed_apps.get_app_config('products').ready()
+
+        self.assertEqual(
+            [type(listener) for listener in mongo._event_listeners],
+            [perf.MongoCommandTimer, slow_queries.SlowMongoCommandLogger],
+        )
+        with patch('database.mongo.MongoClient') as client, patch.object(mongo, '_client', None):
+            mongo.get_client()
+        self.assertEqual(client.call_args.kwargs['event_listeners'], mongo._event_listeners)
+
+    @override_settings(PERF_SERVER_TIMING=False)
+    def test_server_timing_header_can_be_disabled(self):
+        response = self.client.get('/api/staff/metrics/orders/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class _RecordingHandler(BaseHTTPRequestHandler):
+    def _handle(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.seen.append((self.command, self.path, json.loads(body) if body else None))
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+class TrafficCaptureTests(TestCase):
+    def _captured(self, method, path, **kwargs):
+        with self.assertLogs('apps.products.traffic', level='INFO') as logs:
+            response = getattr(self.client, method)(path, **kwargs)
+        return response, logs.records[-1].getMessage()
+
+    def test_capture_is_off_by_default(self):
+        with self.assertNoLogs('apps.products.traffic'):
+            self.client.get('/api/orders/')
+
+    @override_settings(TRAFFIC_CAPTURE_ENABLED=True, RATELIMIT_ENABLED=False)
+    def test_envelopes_keep_shape_but_not_personal_data(self):
+        self.enterContext(fake_mongo())
+        _response, line = self._captured(
+            'post', '/api/auth/login/',
+            data=json.dumps({'email': 'secret.person@example.com', 'password': 'Hunter22!', 'remember': True}),
+            content_type='application/json',
+        )
+        self.assertNotIn('secret.person', line)
+        self.assertNotIn('Hunter22', line)
+        entry = json.loads(line)
+        self.assertEqual(entry['r'], 'api/auth/login/')
+        self.assertEqual(entry['b'], {'email': '<email>', 'password': '<secret>', 'remember': True})
+        self.assertEqual(entry['u'], 'anon')
+
+        customer = get_user_model().objects.create_user(username='cap@example.com', email='cap@example.com', password='x')
+        self.client.force_login(customer)
+        _response, line = self._captured('get', '/api/orders/', data={'status': 'paid', 'search': 'latte'})
+        entry = json.loads(line)
+        self.assertEqual(entry['q'], {'status': 'paid', 'search': '<str:5>'})
+        self.assertRegex(entry['u'], r'^u\d+$')
+        self.assertEqual(entry['s'], 200)
+
+        staff = get_user_model().objects.create_user(
+            username='ops@example.com', email='ops@example.com', password='x', is_staff=True,
+        )
+        self.client.force_login(staff)
+        _response, line = self._captured('get', '/api/staff/mongo-users/cap@example.com/')
+        entry = json.loads(line)
+        self.assertNotIn('cap@example.com', line)
+        self.assertEqual(entry['p'], '/api/staff/mongo-users/{email}/')
+        self.assertEqual(entry['k'], {'email': '<email>'})
+        self.assertEqual(entry['u'], 'staff')
+
+    def test_replay_logs_in_bucket_users_and_fills_shapes(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _RecordingHandler)
+        server.seen = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        entries = [
+            {'ts': 10.0, 'm': 'POST', 'r': 'api/payment/create-order/', 'p': '/api/payment/create-order/', 'q': {},
+             'b': {'email': '<email>', 'amount': 240, 'note': '<str:3>'}, 's': 200, 'ms': 40.0, 'u': 'u7'},
+            {'ts': 10.5, 'm': 'GET', 'r': 'api/orders/', 'p': '/api/orders/', 'q': {'search': '<str:2>'},
+             'b': None, 's': 200, 'ms': 12.0, 'u': 'u7'},
+        ]
+
+        result = replay(entries, f'http://127.0.0.1:{server.server_address[1]}', speed=0, concurrency=1, password='pw')
+
+        self.assertEqual(server.seen[0], ('POST', '/api/auth/login/', {'email': 'user0000007@dataset.example.com', 'password': 'pw'}))
+        self.assertIn(('POST', '/api/payment/create-order/', {
+            'email': 'user0000007@dataset.example.com', 'amount': 240, 'note': 'xxx',
+        }), server.seen)
+        self.assertIn(('GET', '/api/orders/?search=xx', None), server.seen)
+        self.assertEqual(result['routes']['api/orders/']['count'], 1)
+        self.assertEqual(result['routes']['api/orders/']['captured_p50_ms'], 12.0)
+
+    def test_compare_flags_p95_regressions_with_enough_samples(self):
+        def run(p95, count=100):
+            return {'routes': {'api/orders/': {'count': count, 'p50_ms': 10.0, 'p95_ms': p95}}}
+
+        rows = compare_runs(run(20.0), run(25.0), threshold=10)
+        self.assertEqual(rows[0]['p95_change'], 25.0)
+        self.assertTrue(rows[0]['regressed'])
+        self.assertFalse(compare_runs(run(20.0), run(21.0), threshold=10)[0]['regressed'])
+        self.assertFalse(compare_runs(run(20.0, count=5), run(40.0, count=5))[0]['regressed'])
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.enterContext(override_settings(PROFILING_SPOOL_DIR=spool.name, PROFILING_SAMPLE_INTERVAL_MS=0.1))
+        self.spool = spool.name
+        self.staff = get_user_model().objects.create_user(
+            username='ops@example.com', email='ops@example.com', password='x', is_staff=True,
+        )
+
+    def test_unflagged_and_non_staff_requests_are_not_profiled(self):
+        customer = get_user_model().objects.create_user(username='c@example.com', email='c@example.com', password='x')
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/staff/metrics/orders/')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.client.force_login(customer)
+        response = self.client.get('/api/notifications/', HTTP_X_PROFILE='cprofile')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_staff_cprofile_capture_is_listed_and_downloadable(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/staff/metrics/orders/', HTTP_X_PROFILE='cprofile')
+        capture_id = response['X-Profile-Id']
+
+        captures = self.client.get('/api/staff/profiles/').json()['captures']
+        self.assertEqual(captures[0]['id'], capture_id)
+        self.assertEqual(captures[0]['route'], 'api/staff/metrics/orders/')
+        self.assertEqual(captures[0]['status'], 200)
+        stats = pstats.Stats(os.path.join(self.spool, captures[0]['file']))
+        self.assertTrue(any(name == 'order_metrics' for _file, _line, name in stats.stats))
+
+        download = self.client.get(f"/api/staff/profiles/{captures[0]['file']}")
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(self.client.get('/api/staff/profiles/..%2Fsettings.py').status_code, 404)
+        page = self.client.get('/staff-admin/profiles/')
+        self.assertContains(page, captures[0]['file'])
+
+    def test_sample_mode_writes_speedscope_and_prunes_old_captures(self):
+        self.client.force_login(self.staff)
+        with override_settings(PROFILING_MAX_CAPTURES=2):
+            for _ in range(3):
+                response = self.client.get('/api/staff/metrics/orders/?__profile=sample')
+        files = sorted(os.listdir(self.spool))
+        self.assertEqual(len([name for name in files if name.endswith('.meta.json')]), 2)
+        with open(os.path.join(self.spool, f"{response['X-Profile-Id']}.speedscope.json")) as handle:
+            profile = json.load(handle)
+        self.assertEqual(profile['profiles'][0]['type'], 'sampled')
+        self.assertEqual(len(profile['profiles'][0]['samples']), len(profile['profiles'][0]['weights']))
+
+    async def test_asgi_capture_profiles_the_thread_running_a_sync_view(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get('/api/staff/metrics/orders/', headers={'X-Profile': 'cprofile'})
+
+        self.assertEqual(response.status_code, 200)
+        stats = pstats.Stats(os.path.join(self.spool, f"{response['X-Profile-Id']}.prof"))
+        self.assertTrue(any(name == 'order_metrics' for _file, _line, name in stats.stats))
+
+    def test_sampler_records_the_target_threads_stack(self):
+        sampler = profiling.StackSampler(threading.get_ident(), 0.001).start()
+        deadline = time.monotonic() + 0.05
+        while time.monotonic() < deadline:
+            sum(range(1000))
+        sampler.stop()
+        document = sampler.speedscope('busy loop')
+        names = {frame['name'] for frame in document['shared']['frames']}
+        self.assertIn('test_sampler_records_the_target_threads_stack', names)
+
+
+class CompressionTests(TestCase):
+    def _middleware(self, response):
+        return compression.CompressionMiddleware(lambda request: response)
+
+    def test_minifier_keeps_whitespace_sensitive_blocks(self):
+        html = (
+            '<html>\n  <!-- build 42 -->\n  <body>\n    <p class="a  b">Hi  there</p>\n'
+            '    <pre>\n  keep\n    this</pre>\n    <script>\n      const s = `a\n    b`;\n    </script>\n'
+            '    <style>\n      p {\n        color: red;\n      }\n    </style>\n  </body>\n</html>\n'
+        )
+        self.assertEqual(compression.minify_html(html), (
+            '<html>\n<body>\n<p class="a  b">Hi  there</p>\n<pre>\n  keep\n    this</pre>\n'
+            '<script>\n      const s = `a\n    b`;\n    </script>\n<style>\np {\ncolor: red;\n}\n</style>\n</body>\n</html>'
+        ))
+
+    def test_accept_encoding_negotiation(self):
+        with patch.object(compression, 'brotli', None):
+            self.assertEqual(compression.accepted_encoding('gzip, deflate, br'), 'gzip')
+            self.assertIsNone(compression.accepted_encoding('gzip;q=0, identity'))
+            self.assertIsNone(compression.accepted_encoding(''))
+        with patch.object(compression, 'brotli', Mock()):
+            self.assertEqual(compression.accepted_encoding('gzip, deflate, br'), 'br')
+            self.assertEqual(compression.accepted_encoding('br;q=0.5, gzip'), 'gzip')
+            self.assertEqual(compression.accepted_encoding('*'), 'br')
+
+    def test_pages_are_minified_and_compressed(self):
+        plain = self.client.get('/privacy-policy/')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertNotIn(b'\n    <', plain.content)
+        self.assertEqual(plain['Content-Length'], str(len(plain.content)))
+
+        with patch.object(compression, 'brotli', None):
+            response = self.client.get('/privacy-policy/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_thresholds_and_streaming(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        small = self._middleware(JsonResponse({'ok': True}))(request)
+        self.assertFalse(small.has_header('Content-Encoding'))
+        events = self._middleware(StreamingHttpResponse(iter([b'data: 1\n\n']), content_type='text/event-stream'))(request)
+        self.assertFalse(events.has_header('Content-Encoding'))
+
+        chunks = [b'line %d\n' % n * 50 for n in range(20)]
+        with patch.object(compression, 'brotli', None):
+            streamed = self._middleware(StreamingHttpResponse(iter(chunks), content_type='text/plain'))(request)
+        self.assertEqual(streamed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(streamed.streaming_content)), b''.join(chunks))
+
+    @skipIf(compression.brotli is None, 'brotli not installed')
+    def test_brotli_round_trip(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br')
+        body = json.dumps([{'id': n, 'name': 'Cold Coffee'} for n in range(200)])
+        response = self._middleware(HttpResponse(body, content_type='application/json'))(request)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content).decode(), body)
+
+
+class CustomerPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.mongo = self.enterContext(fake_mongo())
+        self.mongo['users'].insert_one({'email': 'many@example.com', 'firstName': 'Mia', 'phone': '9000000000'})
+        self.customer = get_user_model().objects.create_user(
+            username='many@example.com', email='many@example.com', password='x',
+        )
+        Order.objects.bulk_create(
+            Order(email='many@example.com', total_amount=100 + n, extra_fields={'clientOrderId': f'CKH-{n}'})
+            for n in range(30)
+        )
+        self.client.force_login(self.customer)
+
+    def test_profile_page_loads_a_bounded_window_and_a_cached_summary(self):
+        with patch.object(customer_pages.User, 'find_by_email', wraps=customer_pages.User.find_by_email) as lookup:
+            first = self.client.get('/profile/', HTTP_ACCEPT='text/html')
+            with self.assertNumQueries(2):  # session, user; orders are paged in by the page's JS
+                second = self.client.get('/profile/', HTTP_ACCEPT='text/html')
+        self.assertEqual(lookup.call_count, 1)
+        self.assertEqual(first.context['user']['firstName'], 'Mia')
+        self.assertNotIn('orders', second.context)
+
+        self.client.patch('/api/staff/mongo-users/many@example.com/', data={'firstName': 'Maya'}, content_type='application/json')
+        self.assertEqual(self.client.get('/profile/', HTTP_ACCEPT='text/html').context['user']['firstName'], 'Maya')
+
+    def test_order_tracking_and_orders_api_page_through_history(self):
+        session = self.client.session
+        session['email'] = 'many@example.com'
+        session.save()
+        with self.assertNumQueries(2):  # session, user
+            self.client.get('/order-tracking/')
+
+        first = self.client.get('/api/orders/?limit=20').json()
+        self.assertEqual((len(first['orders']), first['hasMore'], first['nextOffset']), (20, True, 20))
+        rest = self.client.get('/api/orders/?limit=20&offset=20').json()
+        self.assertEqual((len(rest['orders']), rest['hasMore']), (10, False))
+        seen = {order['orderId'] for order in first['orders'] + rest['orders']}
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(self.client.get('/api/orders/?limit=x').status_code, 400)
+        self.assertEqual(len(self.client.get('/api/orders/').json()['orders']), 30)
+
+    def test_orders_api_serves_one_order_and_profile_stats_without_the_history(self):
+        Order.objects.filter(extra_fields__clientOrderId='CKH-0').update(status='cancelled')
+        focused = self.client.get('/api/orders/?limit=1&orderId=CKH-7&history=1').json()
+        self.assertEqual([order['orderId'] for order in focused['orders']], ['CKH-7'])
+        self.assertIn('trackingHistory', focused['orders'][0])
+        self.assertEqual(self.client.get('/api/orders/?limit=1&orderId=CKH-missing').json()['orders'], [])
+
+        page = self.client.get('/api/orders/?limit=1&stats=1').json()
+        self.assertEqual(len(page['orders']), 1)
+        self.assertEqual(page['stats'], {'totalOrders': 29, 'totalSpent': float(sum(range(101, 130)))})
+        self.assertNotIn('stats', self.client.get('/api/orders/?limit=1').json())
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        page_cache.clear_local()
+        self.addCleanup(page_cache.clear_local)
+
+    def test_anonymous_pages_are_served_from_cache_with_a_fresh_csrf_cookie(self):
+        first = self.client.get('/login/')
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+
+        visitor = Client()
+        with self.assertNumQueries(0):
+            second = visitor.get('/login/')
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertEqual(second.content, first.content)
+        self.assertIn('csrftoken', second.cookies)
+        self.assertNotEqual(second.cookies['csrftoken'].value, first.cookies['csrftoken'].value)
+
+        page_cache.clear_local()
+        self.assertEqual(Client().get('/login/')['X-Page-Cache'], 'hit')  # from the shared cache
+
+    def test_release_and_template_changes_miss(self):
+        self.client.get('/privacy-policy/')
+        with override_settings(PAGE_CACHE_RELEASE='deploy-2'):
+            self.assertEqual(self.client.get('/privacy-policy/')['X-Page-Cache'], 'miss')
+        page_cache._template_hash.cache_clear()
+        self.addCleanup(page_cache._template_hash.cache_clear)
+        with patch.object(page_cache, '_template_hash', return_value='edited'):
+            self.assertEqual(self.client.get('/privacy-policy/')['X-Page-Cache'], 'miss')
+
+    def test_sessions_with_a_login_render_dynamically(self):
+        self.client.get('/signup/')
+        session = self.client.session
+        session['email'] = 'customer@example.com'
+        session.save()
+        self.assertFalse(self.client.get('/signup/').has_header('X-Page-Cache'))
+        staff = get_user_model().objects.create_user(username='s@example.com', email='s@example.com', is_staff=True)
+        staff_client = Client()
+        staff_client.force_login(staff)
+        self.assertFalse(staff_client.get('/staff-admin/login/').has_header('X-Page-Cache'))
+        self.assertEqual(self.client.post('/signup/').status_code, 200)
+
+
+class StructuredLoggingTests(TestCase):
+    def _handler(self, logger_name, **filters):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'app.log')
+        handler = logs.BackgroundHandler(filename=path)
+        self.addCleanup(handler.close)
+        handler.setFormatter(logs.JsonFormatter())
+        handler.addFilter(logs.SampleFilter(**filters))
+        handler.addFilter(logs.RedactFilter())
+        handler.addFilter(logs.RequestIdFilter())
+        logger = logging.getLogger(logger_name)
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        self.enterContext(patch.object(logger, 'propagate', False))
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+
+        def read():
+            handler.flush()
+            with open(path) as log_file:
+                return [json.loads(line) for line in log_file]
+        return read
+
+    def test_request_lines_are_json_with_request_id_and_no_secrets(self):
+        read = self._handler('apps.products.views')
+        response = self.client.post(
+            '/api/payment/verify-payment/',
+            data=json.dumps({'razorpay_order_id': 'order_1', 'razorpay_signature': 'sig_secret'}),
+            content_type='application/json',
+            HTTP_X_REQUEST_ID='req-123',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['X-Request-ID'], 'req-123')
+        self.assertNotEqual(self.client.get('/api/orders/', HTTP_X_REQUEST_ID='bad id!')['X-Request-ID'], 'bad id!')
+
+        logging.getLogger('apps.products.views').info(
+            "Retrying with password=%s razorpay_signature=%s", 'hunter2', 'abc', extra={'otp': '123456'},
+        )
+        lines = read()
+        self.assertEqual([line['level'] for line in lines[:2]], ['INFO', 'WARNING'])
+        self.assertEqual({line['request_id'] for line in lines[:2]}, {'req-123'})
+        self.assertIn('order_id=order_1', lines[1]['msg'])
+        self.assertNotIn('sig_secret', json.dumps(lines))
+        self.assertEqual(lines[-1]['request_id'], '-')
+        self.assertEqual(lines[-1]['msg'], 'Retrying with password=<redacted> razorpay_signature=<redacted>')
+        self.assertEqual(lines[-1]['otp'], '<redacted>')
+
+    def test_sampling_keeps_warnings_and_unsampled_loggers(self):
+        read = self._handler('apps.sampling_test', rate=0, loggers=('apps.sampling_test.noisy',))
+        noisy = logging.getLogger('apps.sampling_test.noisy')
+        noisy.setLevel(logging.INFO)
+        self.addCleanup(noisy.setLevel, logging.NOTSET)
+        for _ in range(20):
+            noisy.info('{"event": "request", "status": 200}')
+        noisy.warning('{"event": "request", "status": 500}')
+        logging.getLogger('apps.sampling_test.quiet').warning('kept')
+        lines = read()
+        self.assertEqual([line.get('status') for line in lines], [500, None])
+        self.assertEqual(lines[0]['event'], 'request')
+        self.assertEqual(lines[1]['msg'], 'kept')
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = logs.BackgroundHandler(queue_size=1)
+        handler.listener.stop()
+        record = logging.LogRecord('apps.test', logging.INFO, __file__, 1, 'line %s', (1,), None)
+        started = time.monotonic()
+        for _ in range(3):
+            handler.handle(record)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual(handler.queue.get_nowait().msg, 'line 1')
+        handler.close()
+
+
+class MemoryDiagnosticsTests(TestCase):
+    def setUp(self):
+        self.addCleanup(memory.stop_tracing)
+        self.staff = get_user_model().objects.create_user(
+            username='ops@example.com', email='ops@example.com', password='x', is_staff=True,
+        )
+
+    def _post(self, **data):
+        return self.client.post('/api/staff/memory/', data=json.dumps(data), content_type='application/json')
+
+    def test_staff_only_and_snapshot_needs_tracing(self):
+        customer = get_user_model().objects.create_user(username='c@example.com', email='c@example.com', password='x')
+        self.client.force_login(customer)
+        self.assertEqual(self.client.get('/api/staff/memory/').status_code, 302)
+        self.client.force_login(self.staff)
+        status = self.client.get('/api/staff/memory/').json()
+        self.assertFalse(status['tracing'])
+        self.assertGreater(status['rss_bytes'], 0)
+        self.assertEqual(self._post(action='snapshot').status_code, 409)
+        self.assertEqual(self._post(action='explode').status_code, 400)
+        self.assertNotIn('gc_objects', status)
+        self.assertGreater(self.client.get('/api/staff/memory/?detail=1').json()['gc_objects'], 0)
+
+    def test_snapshot_rejects_an_unknown_group_by(self):
+        self.client.force_login(self.staff)
+        self._post(action='start', frames=1)
+        self.assertEqual(self._post(action='snapshot', groupBy='module').status_code, 400)
+        self.assertEqual(self.client.get('/api/staff/memory/').json()['snapshots'], [])
+        response = self._post(action='snapshot', groupBy='filename')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self.client.get('/api/staff/memory/').json()['snapshots'][0]['traced_bytes'], 0)
+
+    def test_diff_shows_the_growing_allocation_site(self):
+        self.client.force_login(self.staff)
+        self.assertTrue(self._post(action='start', frames=5).json()['tracing'])
+        base = self._post(action='snapshot').json()['id']
+        hoard = [bytearray(4096) for _ in range(500)]
+        response = self.client.get(f'/api/staff/memory/diff/?base={base}&limit=5')
+        self.assertEqual(response.status_code, 200)
+        top = response.json()['diff'][0]
+        self.assertEqual(top['file'], __file__)
+        self.assertIn('bytearray(4096)', top['code'])
+        self.assertGreaterEqual(top['size_diff'], 500 * 4096)
+        self.assertEqual(len(self.client.get('/api/staff/memory/').json()['snapshots']), 2)
+        del hoard
+
+        self.assertFalse(self._post(action='stop').json()['tracing'])
+        self.assertEqual(self.client.get(f'/api/staff/memory/diff/?base={base}').status_code, 404)
+
+    def test_request_peaks_are_recorded_and_large_ones_logged(self):
+        memory.start_tracing(5)
+        self.client.force_login(self.staff)
+        with override_settings(MEMORY_ALERT_BYTES=1), self.assertLogs('apps.products.memory', 'WARNING') as logs:
+            self.client.get('/api/staff/metrics/orders/')
+        alert = json.loads(logs.records[0].getMessage())
+        self.assertEqual(alert['event'], 'memory_alert')
+        self.assertEqual(alert['route'], 'api/staff/metrics/orders/')
+        self.assertGreater(alert['peak_bytes'], 0)
+
+        routes = {row['route']: row for row in self.client.get('/api/staff/memory/').json()['routes']}
+        self.assertEqual(routes['api/staff/metrics/orders/']['count'], 1)
+        self.assertIn('ckh_process_resident_memory_bytes ', self.client.get('/api/metrics/').content.decode())
+
+
+@override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.addCleanup(metrics.REGISTRY.reset)
+
+    def _value(self, name, *labels):
+        return metrics.REGISTRY.aggregated().get((name, labels))
+
+    def test_requests_are_counted_and_timed_per_url_name(self):
+        self.client.get('/api/orders/')
+        self.client.get('/api/orders/')
+        self.client.get('/api/no-such-endpoint/')
+
+        counts, total = self._value('ckh_http_request_duration_seconds', 'get_orders')
+        self.assertEqual(sum(counts), 2)
+        self.assertGreater(total, 0)
+        self.assertEqual(self._value('ckh_http_responses_total', 'unresolved', '404'), 1)
+
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('ckh_http_request_duration_seconds_bucket{url_name="get_orders",le="+Inf"} 2', body)
+        self.assertIn('ckh_http_request_duration_seconds_count{url_name="get_orders"} 2', body)
+        self.assertIn('# TYPE ckh_http_request_duration_seconds histogram', body)
+
+    def test_notification_depth_email_and_payment_outcomes(self):
+        user = get_user_model().objects.create_user(username='m@example.com', email='m@example.com')
+        for status in ('queued', 'failed'):
+            Notification.objects.create(
+                user=user, email=user.email, channel='email', category='order', event='order_placed', status=status,
+            )
+        metrics.EMAIL_SENDS.inc(result='sent')
+        self.client.post('/api/payment/verify-payment/', data='{}', content_type='application/json')
+
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('ckh_notifications{status="queued"} 1', body)
+        self.assertIn('ckh_notifications{status="failed"} 1', body)
+        self.assertIn('ckh_notifications{status="sent"} 0', body)
+        self.assertIn('ckh_email_sends_total{result="sent"} 1', body)
+        self.assertIn('ckh_payment_verifications_total{outcome="missing_details"} 1', body)
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN='scrape-secret')
+    def test_endpoint_needs_staff_a_token_or_an_allowed_address(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.9']):
+            self.assertEqual(self.client.get('/api/metrics/', REMOTE_ADDR='10.0.0.9').status_code, 200)
+        staff = get_user_model().objects.create_user(username='ops@example.com', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/api/metrics/', REMOTE_ADDR='10.0.0.8').status_code, 200)
+
+    def test_flushes_are_safe_to_run_concurrently_and_never_raise(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROC_DIR=directory):
+            metrics.EMAIL_SENDS.inc(result='sent')
+            threads = [threading.Thread(target=metrics.REGISTRY.flush) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+            with patch('apps.products.metrics.os.replace', side_effect=FileNotFoundError), \
+                    self.assertLogs('apps.products.metrics', 'ERROR'):
+                metrics.REGISTRY.flush()
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_multiprocess_directory_is_summed(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROC_DIR=directory):
+            metrics.EMAIL_SENDS.inc(result='failed')
+            # Another worker's flushed state.
+            with open(f"{directory}/99999-1.json", 'w') as handle:
+                json.dump([
+                    {'name': 'ckh_email_sends_total', 'labels': ['failed'], 'value': 2},
+                    {'name': 'ckh_http_request_duration_seconds', 'labels': ['get_orders'],
+                     'value': [[1] + [0] * len(metrics.DEFAULT_BUCKETS), 0.004]},
+                ], handle)
+
+            self.assertEqual(self._value('ckh_email_sends_total', 'failed'), 3)
+            self.assertEqual(self._value('ckh_http_request_duration_seconds', 'get_orders')[0][0], 1)
+
+
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        slow_queries._explained.clear()
+
+    @override_settings(SLOW_QUERY_MS=0, BACKGROUND_TASKS_EAGER=True)
+    def test_slow_select_is_logged_with_caller_and_plan(self):
+        with self.assertLogs('apps.products.slow_queries', level='WARNING') as logs:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                Order.objects.filter(email='hot@example.com').count()
+            # The plan is only fetched once the caller's transaction is over.
+            self.assertEqual(len(logs.records), 1)
+            for callback in callbacks:
+                callback()
+
+        entry, explained = (json.loads(record.getMessage()) for record in logs.records)
+        self.assertEqual(entry['event'], 'slow_query')
+        self.assertIn('"email"', entry['sql'])
+        self.assertEqual(entry['param_types'], ['str'])
+        self.assertNotIn('hot@example.com', logs.output[0])
+        self.assertFalse(entry['failed'])
+        self.assertIn('apps/products/tests.py', entry['callers'][0])
+        self.assertIn('test_slow_select_is_logged_with_caller_and_plan', entry['callers'][0])
+        self.assertEqual((explained['event'], explained['sql']), ('slow_query_explain', entry['sql']))
+        self.assertTrue(explained['plan'])
+        self.assertNotIn('explain failed', explained['plan'][0])
+
+        # The same statement is not explained again within the interval.
+        with self.captureOnCommitCallbacks() as callbacks, \
+                self.assertLogs('apps.products.slow_queries', level='WARNING'):
+            Order.objects.filter(email='other@example.com').count()
+        self.assertEqual(callbacks, [])
+
+    @override_settings(
+        SLOW_QUERY_MS=0, BACKGROUND_TASKS_EAGER=True, OTP_STORE_BACKEND='apps.products.otp.DatabaseOTPStore',
+    )
+    def test_slow_otp_queries_never_log_the_code(self):
+        with self.assertLogs('apps.products.slow_queries', level='WARNING') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            issue_otp('otp@example.com', purpose=EMAIL_VERIFICATION, code='918273')
+            self.assertEqual(check_otp('otp@example.com', '918273', purpose=EMAIL_VERIFICATION), (True, None))
+
+        self.assertTrue(any('otptoken' in line for line in logs.output))
+        for line in logs.output:
+            self.assertNotIn('918273', line)
+            self.assertNotIn('otp@example.com', line)
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_failed_statement_is_logged_but_never_explained(self):
+        with self.captureOnCommitCallbacks() as callbacks, \
+                self.assertLogs('apps.products.slow_queries', level='WARNING') as logs:
+            with self.assertRaises(DatabaseError), connection.cursor() as cursor:
+                cursor.execute('SELECT * FROM no_such_table')
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertTrue(json.loads(logs.records[0].getMessage())['failed'])
+        self.assertEqual(callbacks, [])
+
+    @skipIf(slow_queries.SlowMongoCommandLogger is None, 'pymongo is not installed')
+    @override_settings(SLOW_MONGO_MS=50)
+    def test_slow_mongo_command_logs_filter_shape_and_queues_explain(self):
+        listener = slow_queries.SlowMongoCommandLogger()
+        command = {
+            'find': 'users', 'filter': {'email': 'a@example.com', 'age': {'$gt': 3}},
+            'limit': 1, 'lsid': {'id': 'x'}, '$db': 'coffeekaafihai_db',
+        }
+        listener.started(Mock(command_name='find', command=command, database_name='coffeekaafihai_db',
+                              connection_id=('db', 1), request_id=7))
+        listener.started(Mock(command_name='find', command=command, database_name='coffeekaafihai_db',
+                              connection_id=('db', 1), request_id=8))
+
+        with patch.object(slow_queries, 'submit') as submit, \
+                self.assertLogs('apps.products.slow_queries', level='WARNING') as logs:
+            listener.succeeded(Mock(command_name='find', connection_id=('db', 1), request_id=7, duration_micros=120000))
+            listener.succeeded(Mock(command_name='find', connection_id=('db', 1), request_id=8, duration_micros=1000))
+
+        self.assertEqual(len(logs.records), 1)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['collection'], 'users')
+        self.assertEqual(entry['filter_shapes'], [{'email': '?', 'age': {'$gt': '?'}}])
+        func, database_name, explained, shape = submit.call_args.args
+        self.assertIs(func, slow_queries.explain_mongo)
+        self.assertEqual(explained, {'find': 'users', 'filter': command['filter'], 'limit': 1})
+
+    @skipIf(slow_queries.SlowMongoCommandLogger is None, 'pymongo is not installed')
+    def test_mongo_commands_that_never_finish_are_not_kept_forever(self):
+        listener = slow_queries.SlowMongoCommandLogger()
+
+        def started(request_id):
+            listener.started(Mock(command_name='find', command={'find': 'users'}, database_name='coffeekaafihai_db',
+                                  connection_id=('db', 1), request_id=request_id))
+
+        with patch.object(slow_queries.time, 'monotonic', return_value=0):
+            for request_id in range(slow_queries.MONGO_PENDING_LIMIT):
+                started(request_id)
+        with patch.object(slow_queries.time, 'monotonic', return_value=slow_queries.MONGO_PENDING_TTL + 1):
+            started('late')
+        self.assertEqual(list(listener._pending), [(('db', 1), 'late')])
+
+        for request_id in range(slow_queries.MONGO_PENDING_LIMIT + 10):
+            started(request_id)
+        self.assertEqual(len(listener._pending), slow_queries.MONGO_PENDING_LIMIT)
+
+
+# Query budgets: (name, method, path, body, actor, status, max ORM queries, max Mongo
+# commands, extra ORM queries allowed per 100 rows). The last column is for bulk
+# writes the database backend splits into batches; everything else must not grow
+# with the fixture size at all.
+QUERY_BUDGET_SIZES = (1, 50, 500)
+QUERY_BUDGET_EXEMPT = {
+    'api/orders/events/': 'long-lived SSE stream; see OrderEventStreamTests',
+    'api/staff/orders/events/': 'long-lived SSE stream; see StaffOrderFeedTests',
+}
+QUERY_BUDGETS = [
+    ('product list', 'GET', '/api/products/', None, None, 200, 0, 1, 0),
+    ('send otp email', 'POST', '/api/send-otp-email/', {'email': 'customer@example.com', 'otp': '654321'}, None, 200, 2, 0, 0),
+    ('validate otp', 'POST', '/api/validate-otp/', {'email': 'customer@example.com', 'otp': '123456'}, None, 200, 2, 0, 0),
+    ('login', 'POST', '/api/auth/login/', {'email': 'customer@example.com', 'password': 'Brew-1234'}, None, 200, 19, 1, 0),
+    ('signup', 'POST', '/api/auth/signup/', {
+        'firstName': 'New', 'lastName': 'Guest', 'email': 'new@example.com', 'phone': '9000000000',
+        'password': 'Brew-1234',
+    }, None, 201, 21, 2, 0),
+    ('logout', 'POST', '/api/auth/logout/', {}, 'customer', 200, 3, 0, 0),
+    ('profile', 'GET', '/api/auth/profile/', None, 'customer', 200, 3, 3, 0),
+    ('profile update', 'POST', '/api/auth/profile/', {'source': 'profile', 'phone': '9111111111'}, 'customer', 200, 9, 3, 0),
+    ('public feedbacks', 'GET', '/api/feedbacks/public/', None, None, 200, 1, 0, 0),
+    ('submit feedback', 'POST', '/api/feedbacks/public/', {'rating': 5, 'message': 'Great'}, 'customer', 200, 3, 0, 0),
+    ('avatar file', 'GET', '/api/avatars/missing.png', None, None, 404, 0, 0, 0),
+    ('legacy forgot password', 'POST', '/api/auth/forgot-password/', {'email': 'customer@example.com'}, None, 200, 2, 1, 0),
+    ('legacy reset password', 'POST', '/api/auth/reset-password/', {
+        'email': 'customer@example.com', 'otp': '123456', 'newPassword': 'Brew-5678',
+    }, None, 200, 3, 1, 0),
+    ('password forgot', 'POST', '/api/auth/password/forgot/', {'email': 'customer@example.com'}, None, 200, 3, 0, 0),
+    ('password verify otp', 'POST', '/api/auth/password/verify-otp/', {'email': 'customer@example.com', 'otp': '123456'}, None, 200, 2, 0, 0),
+    ('password reset', 'POST', '/api/auth/password/reset/', {
+        'email': 'customer@example.com', 'otp': '123456', 'newPassword': 'Brew-5678',
+    }, None, 200, 5, 1, 0),
+    ('mongo users', 'GET', '/api/staff/mongo-users/', None, 'staff', 200, 2, 2, 0),
+    ('mongo user update', 'PATCH', '/api/staff/mongo-users/customer@example.com/', {'phone': '9222222222'}, 'staff', 200, 2, 2, 0),
+    ('create order', 'POST', '/api/payment/create-order/', {
+        'amount': 250, 'email': 'customer@example.com', 'clientOrderId': 'CKH-NEW', 'items': [{'name': 'Latte', 'qty': 1}],
+    }, 'customer', 200, 13, 0, 0),
+    ('retry order', 'POST', '/api/payment/create-order/', {
+        'amount': 250, 'email': 'customer@example.com', 'clientOrderId': 'CKH-latest', 'items': [{'name': 'Latte', 'qty': 1}],
+    }, 'customer', 200, 9, 0, 0),
+    ('verify payment', 'POST', '/api/payment/verify-payment/', {
+        'razorpay_order_id': 'order_0', 'razorpay_payment_id': 'pay_0', 'razorpay_signature': 'sig_0',
+    }, None, 200, 18, 0, 0),
+    ('process payment', 'POST', '/api/payment/process-payment/', lambda fixture: {
+        'amount': 250, 'method': 'upi', 'email': 'customer@example.com', 'orderId': fixture['order_id'],
+    }, None, 200, 19, 1, 0),
+    ('payment webhook', 'POST', '/api/payment/webhook/', 'webhook', None, 200, 1, 0, 0),
+    ('orders', 'GET', '/api/orders/', None, 'customer', 200, 4, 0, 0),
+    ('orders with history', 'GET', '/api/orders/?history=1', None, 'customer', 200, 5, 0, 0),
+    ('orders page', 'GET', '/api/orders/?limit=5&offset=5', None, 'customer', 200, 4, 0, 0),
+    ('orders page with stats', 'GET', '/api/orders/?limit=5&stats=1', None, 'customer', 200, 5, 0, 0),
+    ('order by id', 'GET', '/api/orders/?limit=1&orderId=CKH-latest', None, 'customer', 200, 5, 0, 0),
+    ('orders legacy backfill', 'GET', '/api/orders/', None, 'legacy', 200, 16, 1, 2),
+    ('cancel order', 'POST', '/api/orders/', lambda fixture: {'orderId': fixture['order_id'], 'action': 'cancel'},
+     'customer', 200, 19, 0, 0),
+    ('order status update', 'POST', '/api/orders/', {'clientOrderId': 'CKH-latest', 'status': 'confirmed'},
+     'customer', 200, 20, 0, 0),
+    ('payments', 'GET', '/api/payments/?email=customer@example.com', None, None, 200, 0, 1, 0),
+    ('notifications', 'GET', '/api/notifications/', None, 'customer', 200, 3, 0, 0),
+    ('broadcast', 'POST', '/api/notifications/broadcast/', {
+        'category': 'offer', 'title': 'Happy hour', 'message': '2 for 1', 'audience': 'all',
+    }, 'staff', 200, 6, 0, 3),
+    ('order metrics', 'GET', '/api/staff/metrics/orders/', None, 'staff', 200, 5, 0, 0),
+    ('metrics', 'GET', '/api/metrics/', None, 'staff', 200, 3, 0, 0),
+    ('profile captures', 'GET', '/api/staff/profiles/', None, 'staff', 200, 2, 0, 0),
+    ('profile capture file', 'GET', '/api/staff/profiles/20260101T000000000000Z-0000abcd.prof', None, 'staff', 404, 2, 0, 0),
+    ('memory status', 'GET', '/api/staff/memory/', None, 'staff', 200, 2, 0, 0),
+    ('memory diff', 'GET', '/api/staff/memory/diff/?base=999999', None, 'staff', 404, 2, 0, 0),
+]
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class DatasetGeneratorTests(TestCase):
+    UNTIL = timezone.datetime(2026, 3, 1).date()
+
+    def _generate(self, seed=7, **kwargs):
+        options = dict(users=12, orders=60, seed=seed, chunk_size=5, workers=1, days=90, until=self.UNTIL)
+        options.update(kwargs)
+        with fake_mongo(self.mongo):
+            return generate_dataset(**options)
+
+    def setUp(self):
+        self.mongo = FakeMongoDatabase()
+
+    def _fingerprint(self):
+        return [
+            (order.email, order.extra_fields['clientOrderId'], order.total_amount, order.status, order.created_at)
+            for order in Order.objects.order_by('email', 'created_at', 'id')
+        ]
+
+    def test_generates_linked_rows_in_live_shapes(self):
+        totals = self._generate()
+
+        self.assertEqual(totals['users'], 12)
+        self.assertEqual(totals['orders'], 60)
+        self.assertEqual(len(self.mongo['users'].documents), 12)
+        self.assertEqual(UserProfile.objects.count(), 12)
+        self.assertEqual(Payment.objects.filter(order__isnull=False).count(), 60)
+        # One email and one mobile row per order, with the live statuses and skip reasons.
+        self.assertEqual(Notification.objects.filter(channel='email').count(), 60)
+        self.assertEqual(Notification.objects.filter(channel='mobile').count(), 60)
+        self.assertLessEqual(
+            set(Notification.objects.values_list('channel', 'status', 'status_reason')),
+            {
+                ('email', 'sent', ''), ('email', 'skipped', 'user_disabled'), ('email', 'skipped', 'missing_email'),
+                ('mobile', 'failed', 'sms_disabled'), ('mobile', 'skipped', 'user_disabled'),
+                ('mobile', 'skipped', 'missing_phone'),
+            },
+        )
+        self.assertTrue(Notification.objects.filter(channel='mobile', status_reason='user_disabled').exists())
+        self.assertEqual(Order.objects.filter(user__isnull=True).count(), 0)
+
+        menu_ids = {item['id'] for item in load_menu()}
+        start = timezone.make_aware(timezone.datetime(2025, 12, 1))
+        end = timezone.make_aware(timezone.datetime(2026, 3, 1))
+        for order in Order.objects.all():
+            self.assertTrue(order.items)
+            self.assertTrue({line['id'] for line in order.items} <= menu_ids)
+            self.assertTrue(start <= order.created_at <= end)
+        for profile in UserProfile.objects.all():
+            active = Order.objects.filter(email=profile.email).exclude(status='cancelled')
+            self.assertEqual(profile.total_orders, active.count())
+        self.assertEqual(sum(row.count for row in OrderStatusCount.objects.all()), 60)
+
+        # Every order walked the state machine and has the history to show for it.
+        self.assertEqual(totals['status_events'], OrderStatusEvent.objects.count())
+        for order in Order.objects.prefetch_related('status_events'):
+            self.assertIn(order.status, ALLOWED_TRANSITIONS)
+            events = sorted(order.status_events.all(), key=lambda event: event.id)
+            self.assertEqual((events[0].from_status, events[0].status), ('', 'pending'))
+            self.assertEqual(events[-1].status, order.status)
+            for previous, event in zip(events, events[1:]):
+                self.assertEqual(event.from_status, previous.status)
+                self.assertIn(event.status, ALLOWED_TRANSITIONS[previous.status])
+                self.assertTrue(previous.created_at <= event.created_at <= order.updated_at)
+            self.assertEqual(events[0].created_at, order.created_at)
+        # The generated timestamps were written without touching the model fields.
+        self.assertTrue(Order._meta.get_field('created_at').auto_now_add)
+        self.assertTrue(Order._meta.get_field('updated_at').auto_now)
+        self.client.logout()
+        self.assertTrue(self.client.login(username='user0000000@dataset.example.com', password='Dataset-Pass-1'))
+
+    def test_same_seed_reproduces_the_dataset(self):
+        self._generate()
+        first = self._fingerprint()
+        with self.assertRaises(ValueError):
+            self._generate()
+
+        for model in (get_user_model(), UserProfile, Order, Payment, UserActivity, Notification, Feedback):
+            model.objects.all().delete()
+        self.mongo = FakeMongoDatabase()
+        self._generate()
+        self.assertEqual(self._fingerprint(), first)
+
+        self._generate(seed=8, prefix='other')
+        self.assertNotEqual(
+            [row[1:] for row in self._fingerprint() if row[0].startswith('other')],
+            [row[1:] for row in first],
+        )
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    DEFAULT_FROM_EMAIL='noreply@coffeekaafihai.test',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    RATELIMIT_ENABLED=False,
+    RAZORPAY_WEBHOOK_SECRET='whsec_test',
+    PERF_INSTRUMENTATION_ENABLED=False,
+    SLOW_QUERY_LOG_ENABLED=False,
+)
+class QueryBudgetTests(TestCase):
+    """
+    Every API route against 1, 50 and 500 orders per user, with ORM queries counted by
+    CaptureQueriesContext and Mongo commands by the in-memory stand-in. A path that
+    issues queries per row (N+1) overshoots its budget at 500 and breaks the flat-
+    scaling check. Set QUERY_BUDGET_REPORT=1 to print the counts table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        import bcrypt
+        cls.password_hash = bcrypt.hashpw(b'Brew-1234', bcrypt.gensalt(rounds=4)).decode()
+        user_model = get_user_model()
+        cls.users = {
+            'customer': user_model.objects.create_user(username='customer@example.com', email='customer@example.com'),
+            'legacy': user_model.objects.create_user(username='legacy@example.com', email='legacy@example.com'),
+            'staff': user_model.objects.create_user(username='staff@example.com', email='staff@example.com', is_staff=True),
+        }
+
+    def _build_fixture(self, size):
+        customer = self.users['customer']
+        UserProfile.objects.create(
+            user=customer, email=customer.email, first_name='Cara', last_name='Customer',
+            coffee_preferences={'emailNotif': True},
+        )
+        UserProfile.objects.bulk_create(
+            UserProfile(email=f'subscriber{i}@example.com') for i in range(size)
+        )
+        orders = Order.objects.bulk_create(
+            Order(
+                user=customer, email=customer.email, total_amount=Decimal('120.00'),
+                status='pending', items=[{'name': 'Latte', 'qty': 1}],
+                extra_fields={'clientOrderId': 'CKH-latest' if i == size - 1 else f'CKH-{i}'},
+            )
+            for i in range(size)
+        )
+        Payment.objects.bulk_create(
+            Payment(
+                user=customer, order=order, email=customer.email, amount=Decimal('120.00'),
+                razorpay_order_id=f'order_{i}', status='pending',
+            )
+            for i, order in enumerate(orders)
+        )
+        Notification.objects.bulk_create(
+            Notification(
+                user=customer, email=customer.email, channel='email', category='order',
+                event='order_placed', title='Order placed', status='sent',
+            )
+            for _ in range(size)
+        )
+        UserActivity.objects.bulk_create(UserActivity(user=customer, email=customer.email, action='login') for _ in range(size))
+        Feedback.objects.bulk_create(
+            Feedback(user=customer, email=customer.email, rating=Decimal('5'), message='Lovely') for _ in range(size)
+        )
+        recompute_order_metrics()
+
+        mongo = FakeMongoDatabase()
+        now = timezone.now()
+        mongo['users'].insert_many([
+            {'_id': ObjectId(), 'email': customer.email, 'firstName': 'Cara', 'lastName': 'Customer',
+             'password': self.password_hash, 'createdAt': now},
+            {'_id': ObjectId(), 'email': 'legacy@example.com', 'firstName': 'Lee', 'password': self.password_hash},
+        ] + [{'_id': ObjectId(), 'email': f'subscriber{i}@example.com'} for i in range(size)])
+        for email in (customer.email, 'legacy@example.com'):
+            mongo['orders'].insert_many([
+                {'email': email, 'items': [], 'totalAmount': 120, 'status': 'delivered',
+                 'createdAt': now - timedelta(days=i % 30)}
+                for i in range(size)
+            ])
+        mongo['payments'].insert_many([
+            {'email': customer.email, 'amount': 120, 'status': 'verified', 'createdAt': now} for _ in range(size)
+        ])
+        mongo['products'].insert_many([{'name': f'Brew {i}', 'price': 120} for i in range(size)])
+        mongo.commands.clear()
+        return {'order_id': str(orders[0].id), 'mongo': mongo}
+
+    def _webhook_request(self):
+        body = json.dumps({
+            'event': 'payment.captured',
+            'payload': {'payment': {'entity': {'id': 'pay_0', 'order_id': 'order_0'}}},
+        }).encode()
+        signature = hmac.new(b'whsec_test', body, hashlib.sha256).hexdigest()
+        return body, {'HTTP_X_RAZORPAY_SIGNATURE': signature, 'HTTP_X_RAZORPAY_EVENT_ID': 'evt_budget'}
+
+    def _measure(self, fixture, method, path, body, actor):
+        """Run one request in a savepoint that is rolled back; returns (status, queries, mongo commands)."""
+        headers = {}
+        if body == 'webhook':
+            body, headers = self._webhook_request()
+        elif callable(body):
+            body = json.dumps(body(fixture))
+        elif body is not None:
+            body = json.dumps(body)
+        razorpay = Mock()
+        razorpay.order.create.return_value = {'id': 'order_budget'}
+        with transaction.atomic():
+            cache.clear()
+            issue_otp('customer@example.com', code='123456')
+            issue_otp('customer@example.com', purpose=EMAIL_VERIFICATION, code='123456')
+            client = Client()
+            if actor:
+                client.force_login(self.users[actor])
+            mongo = fixture['mongo'].copy()
+            with fake_mongo(mongo), \
+                    patch.object(MongoUser, '_indexes_ready', False), \
+                    patch('apps.products.views._get_razorpay_client', return_value=razorpay), \
+                    CaptureQueriesContext(connection) as queries:
+                response = client.generic(method, path, body or '', content_type='application/json', **headers)
+            transaction.set_rollback(True)
+        return response.status_code, len(queries), len(mongo.commands)
+
+    def test_every_route_has_a_budget(self):
+        routes = {f'api/{pattern.pattern}' for pattern in urlpatterns}
+        budgeted = {resolve(path.split('?')[0]).route for _name, _method, path, *_rest in QUERY_BUDGETS}
+        self.assertEqual(routes - budgeted - set(QUERY_BUDGET_EXEMPT), set())
+
+    def test_query_counts_stay_within_budget_and_flat(self):
+        observed = {}
+        for size in QUERY_BUDGET_SIZES:
+            with transaction.atomic():
+                fixture = self._build_fixture(size)
+                for name, method, path, body, actor, status, *_budget in QUERY_BUDGETS:
+                    observed[name, size] = self._measure(fixture, method, path, body, actor)
+                transaction.set_rollback(True)
+
+        report = [f"{'route':<26}" + ''.join(f'{f"sql@{size}":>9}' for size in QUERY_BUDGET_SIZES)
+                  + ''.join(f'{f"mongo@{size}":>10}' for size in QUERY_BUDGET_SIZES)]
+        for name, *_rest in QUERY_BUDGETS:
+            report.append(f'{name:<26}' + ''.join(f'{observed[name, size][1]:>9}' for size in QUERY_BUDGET_SIZES)
+                          + ''.join(f'{observed[name, size][2]:>10}' for size in QUERY_BUDGET_SIZES))
+        report = '\n'.join(report)
+        if os.environ.get('QUERY_BUDGET_REPORT'):
+            print('\n' + report)
+
+        for name, method, path, body, actor, status, max_queries, max_mongo, per_100_rows in QUERY_BUDGETS:
+            for size in QUERY_BUDGET_SIZES:
+                code, queries, commands = observed[name, size]
+                with self.subTest(route=name, size=size):
+                    self.assertEqual(code, status, f'{name} returned {code}')
+                    allowed = max_queries + -(-per_100_rows * size // 100)
+                    self.assertLessEqual(queries, allowed, f'{name}: {queries} queries at {size} rows\n{report}')
+                    self.assertLessEqual(commands, max_mongo, f'{name}: {commands} Mongo commands at {size} rows\n{report}')
+            if not per_100_rows:
+                with self.subTest(route=name, check='flat'):
+                    self.assertEqual(observed[name, 500][1:], observed[name, 50][1:], f'{name} scales with data size\n{report}')
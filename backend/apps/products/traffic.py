@@ -0,0 +1,374 @@
+"""
+Traffic capture and replay for performance regression checks.
+
+`TrafficCaptureMiddleware` (opt-in: TRAFFIC_CAPTURE_ENABLED) appends one compact JSON
+line per JSON API request to the `apps.products.traffic` logger (a rotating file, see
+LOGGING). Envelopes keep the shape of a request, not its data:
+
+    {"ts":1760000000.12,"m":"POST","r":"api/payment/create-order/","p":"/api/payment/create-order/",
+     "q":{},"b":{"amount":240,"email":"<email>","items":[{"id":"esp001","quantity":2}]},
+     "s":200,"ms":41.7,"u":"u417"}
+
+Strings become "<email>" or "<str:LEN>" unless their key is in TRAFFIC_CAPTURE_KEEP_FIELDS,
+secrets (passwords, OTPs, signatures, tokens) become "<secret>", numbers survive only
+for the keep-list keys, and the user is reduced to a stable bucket (u0..uN-1, staff or
+anon). URL kwargs such as emails are cut out of the path into "k".
+
+`replay()` re-issues a capture against another instance at the original pacing (or
+scaled by `speed`), logging each bucket in as the matching generate_dataset user, and
+summarizes latency per route; `compare_runs()` diffs two summaries. Signed gateway
+callbacks cannot be reproduced from a shape and replay as rejected requests.
+"""
+
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+SECRET_KEY_PARTS = ('password', 'otp', 'token', 'secret', 'signature', 'code')
+MAX_LIST_ITEMS = 50
+SHAPE_TOKEN = re.compile(r'^<(email|secret|num|str(?::(\d+))?)>$')
+
+
+# -- capture ----------------------------------------------------------------------
+
+def _is_secret(key):
+    key = str(key or '').lower()
+    return any(part in key for part in SECRET_KEY_PARTS)
+
+
+def shape(value, key=None, keep=None):
+    """The sanitized form of a JSON value (see module docstring)."""
+    keep = keep if keep is not None else set(getattr(settings, 'TRAFFIC_CAPTURE_KEEP_FIELDS', ()))
+    if isinstance(value, dict):
+        return {name: shape(item, name, keep) for name, item in value.items()}
+    if isinstance(value, list):
+        return [shape(item, key, keep) for item in value[:MAX_LIST_ITEMS]]
+    if value is None or isinstance(value, bool):
+        return value
+    if _is_secret(key):
+        return '<secret>'
+    if isinstance(value, (int, float)):
+        return value if key in keep else '<num>'
+    text = str(value)
+    if key in keep:
+        return text[:64]
+    if EMAIL_PATTERN.match(text):
+        return '<email>'
+    return f'<str:{len(text)}>'
+
+
+def user_bucket(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and (user.is_staff or user.is_superuser):
+        return 'staff'
+    session = getattr(request, 'session', None)
+    email = (session.get('email') if session is not None else None) or (
+        user.email if user is not None and user.is_authenticated else ''
+    )
+    if not email:
+        return 'anon'
+    buckets = getattr(settings, 'TRAFFIC_CAPTURE_USER_BUCKETS', 1000)
+    digest = hashlib.sha1(email.strip().lower().encode('utf-8')).hexdigest()
+    return f"u{int(digest, 16) % buckets}"
+
+
+def _json_body(request):
+    if request.content_type != 'application/json' or not request.body:
+        return None
+    try:
+        return json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return '<invalid-json>'
+
+
+def build_envelope(request, response, started_at, duration_ms):
+    match = getattr(request, 'resolver_match', None)
+    keep = set(getattr(settings, 'TRAFFIC_CAPTURE_KEEP_FIELDS', ()))
+    path = request.path
+    kwargs = {}
+    for name, value in ((match.kwargs if match else None) or {}).items():
+        value = str(value)
+        if value and value in path:
+            path = path.replace(value, '{' + name + '}', 1)
+            kwargs[name] = shape(value, name, keep)
+    body = _json_body(request)
+    envelope = {
+        'ts': round(started_at, 3),
+        'm': request.method,
+        'r': (match.route if match else None) or 'unresolved',
+        'p': path,
+        'q': {name: shape(value, name, keep) for name, value in request.GET.items()},
+        'b': shape(body, None, keep) if body is not None else None,
+        's': response.status_code,
+        'ms': round(duration_ms, 2),
+        'u': user_bucket(request),
+    }
+    if kwargs:
+        envelope['k'] = kwargs
+    return envelope
+
+
+class TrafficCaptureMiddleware:
+    """Records sanitized envelopes of JSON API requests (see module docstring)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'TRAFFIC_CAPTURE_ENABLED', False)
+        self.prefix = getattr(settings, 'TRAFFIC_CAPTURE_PATH_PREFIX', '/api/')
+        self.sample_rate = getattr(settings, 'TRAFFIC_CAPTURE_SAMPLE_RATE', 1.0)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _wanted(self, request):
+        return (
+            self.enabled
+            and request.path.startswith(self.prefix)
+            and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+        )
+
+    def _record(self, request, response, started_at, started):
+        # Streams (SSE) stay open for minutes; their latency says nothing about the API.
+        if getattr(response, 'streaming', False):
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        try:
+            envelope = build_envelope(request, response, started_at, duration_ms)
+        except Exception as e:
+            logger.debug("Traffic capture skipped %s: %s", request.path, e)
+            return
+        logger.info(json.dumps(envelope, separators=(',', ':'), default=str))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._wanted(request):
+            return self.get_response(request)
+        started_at, started = time.time(), time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, started_at, started)
+        return response
+
+    async def __acall__(self, request):
+        if not self._wanted(request):
+            return await self.get_response(request)
+        started_at, started = time.time(), time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, started_at, started)
+        return response
+
+
+# -- replay -----------------------------------------------------------------------
+
+def load_entries(path, limit=None):
+    entries = []
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+            if limit and len(entries) >= limit:
+                break
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries
+
+
+def fill(value, identity):
+    """Turn a shape back into a concrete value for the replaying user."""
+    if isinstance(value, dict):
+        return {name: fill(item, identity) for name, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, identity) for item in value]
+    if not isinstance(value, str):
+        return value
+    match = SHAPE_TOKEN.match(value)
+    if match is None:
+        return value
+    kind = match.group(1)
+    if kind == 'email':
+        return identity['email']
+    if kind == 'secret':
+        return identity['password']
+    if kind == 'num':
+        return 1
+    return 'x' * int(match.group(2) or 8)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def _distribution(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 0.50), 2),
+        'p95_ms': round(percentile(values, 0.95), 2),
+        'p99_ms': round(percentile(values, 0.99), 2),
+        'max_ms': round(values[-1], 2) if values else 0.0,
+    }
+
+
+class _Identities:
+    """One logged-in requests.Session per user bucket, created on first use."""
+
+    def __init__(self, base_url, user_prefix, user_domain, password, staff=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.user_prefix = user_prefix
+        self.user_domain = user_domain
+        self.password = password
+        self.staff = staff
+        self.timeout = timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def identity(self, bucket):
+        if bucket == 'staff' and self.staff:
+            return {'email': self.staff[0], 'password': self.staff[1]}
+        if bucket.startswith('u') and bucket[1:].isdigit():
+            return {'email': f"{self.user_prefix}{int(bucket[1:]):07d}@{self.user_domain}", 'password': self.password}
+        return {'email': f"anonymous@{self.user_domain}", 'password': self.password}
+
+    def session(self, bucket):
+        with self._lock:
+            entry = self._sessions.get(bucket)
+            if entry is None:
+                entry = self._sessions[bucket] = {'session': requests.Session(), 'lock': threading.Lock(), 'ready': False}
+        with entry['lock']:
+            if not entry['ready']:
+                if bucket != 'anon':
+                    identity = self.identity(bucket)
+                    entry['session'].post(
+                        f"{self.base_url}/api/auth/login/",
+                        json={'email': identity['email'], 'password': identity['password']},
+                        timeout=self.timeout,
+                    )
+                entry['ready'] = True
+        return entry['session']
+
+
+def replay(
+    entries,
+    base_url,
+    speed=1.0,
+    concurrency=16,
+    user_prefix='user',
+    user_domain='dataset.example.com',
+    password='',
+    staff=None,
+    timeout=30,
+):
+    """
+    Re-issue captured entries against `base_url`. `speed` scales the original pacing
+    (2 = twice as fast, 0 = as fast as the workers allow). Returns a results dict with
+    per-route latency distributions (replayed and as captured).
+    """
+    identities = _Identities(base_url, user_prefix, user_domain, password, staff, timeout)
+    samples = {}
+    errors = {}
+    lock = threading.Lock()
+    lag = [0.0]
+
+    def issue(entry):
+        identity = identities.identity(entry['u'])
+        path = entry['p']
+        for name, value in (entry.get('k') or {}).items():
+            path = path.replace('{' + name + '}', str(fill(value, identity)))
+        session = identities.session(entry['u'])
+        body = entry.get('b')
+        started = time.perf_counter()
+        try:
+            response = session.request(
+                entry['m'],
+                f"{identities.base_url}{path}",
+                params=fill(entry.get('q') or {}, identity),
+                json=fill(body, identity) if body is not None else None,
+                timeout=timeout,
+            )
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            samples.setdefault(entry['r'], []).append(elapsed_ms)
+            if status == 0 or status >= 500:
+                errors[entry['r']] = errors.get(entry['r'], 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix='ckh-replay') as executor:
+        first_ts = entries[0]['ts'] if entries else 0
+        for entry in entries:
+            if speed > 0:
+                due = (entry['ts'] - first_ts) / speed
+                wait = due - (time.perf_counter() - started)
+                if wait > 0:
+                    time.sleep(wait)
+                else:
+                    lag[0] = max(lag[0], -wait)
+            executor.submit(issue, entry)
+    wall_seconds = time.perf_counter() - started
+
+    captured = {}
+    for entry in entries:
+        captured.setdefault(entry['r'], []).append(entry['ms'])
+    routes = {}
+    for route in sorted(samples):
+        routes[route] = dict(
+            _distribution(samples[route]),
+            errors=errors.get(route, 0),
+            captured_p50_ms=_distribution(captured[route])['p50_ms'],
+            captured_p95_ms=_distribution(captured[route])['p95_ms'],
+        )
+    return {
+        'requests': len(entries),
+        'wall_seconds': round(wall_seconds, 3),
+        'speed': speed,
+        'max_schedule_lag_ms': round(lag[0] * 1000, 1),
+        'overall': _distribution([value for values in samples.values() for value in values]),
+        'routes': routes,
+    }
+
+
+def compare_runs(baseline, current, threshold=10.0, min_count=20):
+    """
+    Per-route p50/p95 changes between two replay results. A route regresses when its
+    p95 grew by more than `threshold` percent (routes with fewer than `min_count`
+    samples in either run are reported but never flagged).
+    """
+    rows = []
+    for route in sorted(set(baseline['routes']) | set(current['routes'])):
+        before = baseline['routes'].get(route)
+        after = current['routes'].get(route)
+        row = {'route': route, 'before': before, 'after': after, 'p50_change': None, 'p95_change': None, 'regressed': False}
+        if before and after:
+            for key in ('p50', 'p95'):
+                old, new = before[f'{key}_ms'], after[f'{key}_ms']
+                row[f'{key}_change'] = round((new - old) / old * 100, 1) if old else None
+            row['regressed'] = (
+                row['p95_change'] is not None
+                and row['p95_change'] > threshold
+                and min(before['count'], after['count']) >= min_count
+            )
+        rows.append(row)
+    return rows
@@ -3,7 +3,7 @@ URL routing for products and API endpoints (authentication, payments, OTP).
 """
 
 from django.urls import path
-from . import views, password_reset_views
+from . import views, password_reset_views, payment_webhooks, order_events, metrics, profiling, memory
 
 urlpatterns = [
     # Product Endpoints
@@ -19,6 +19,7 @@ urlpatterns = [
     path('auth/logout/', views.logout, name='api_logout'),
     path('auth/profile/', views.profile, name='api_profile'),
     path('feedbacks/public/', views.public_feedbacks, name='public_feedbacks'),
+    path('avatars/<str:name>', views.avatar_file, name='avatar_file'),
     path('auth/forgot-password/', views.forgot_password, name='api_forgot_password'),
     path('auth/reset-password/', views.reset_password, name='api_reset_password'),
     # Django User password reset (email OTP)
@@ -34,11 +35,22 @@ urlpatterns = [
     path('payment/create-order/', views.create_order, name='create_order'),
     path('payment/verify-payment/', views.verify_payment, name='verify_payment'),
     path('payment/process-payment/', views.process_payment, name='process_payment'),
+    path('payment/webhook/', payment_webhooks.razorpay_webhook, name='razorpay_webhook'),
     
     # Data Endpoints
     path('orders/', views.get_orders, name='get_orders'),
+    path('orders/events/', order_events.order_event_stream, name='order_event_stream'),
     path('payments/', views.get_payments, name='get_payments'),
     path('notifications/', views.notifications_list, name='notifications_list'),
     path('notifications/broadcast/', views.broadcast_notification, name='broadcast_notification'),
+
+    # Staff Dashboard Metrics
+    path('staff/metrics/orders/', views.order_metrics, name='order_metrics'),
+    path('staff/orders/events/', order_events.staff_order_feed, name='staff_order_feed'),
+    path('metrics/', metrics.metrics_view, name='metrics'),
+    path('staff/profiles/', profiling.staff_profiles, name='staff_profiles'),
+    path('staff/profiles/<str:name>', profiling.staff_profile_file, name='staff_profile_file'),
+    path('staff/memory/', memory.staff_memory, name='staff_memory'),
+    path('staff/memory/diff/', memory.staff_memory_diff, name='staff_memory_diff'),
     
 ]
@@ -3,27 +3,41 @@ API view functions for authentication, payments, OTP handling, and products.
 These views handle JSON requests from the frontend.
 """
 
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import get_user_model, login as django_login
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import Count, Sum
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
+import csv
 import json
 import logging
 from datetime import datetime, timedelta
-import random
 from decimal import Decimal, ROUND_HALF_UP
-from database.models import User, OTP, Order as MongoOrder, Payment as MongoPayment  # fetch reads from MongoDB on each request
+from database.models import User, Order as MongoOrder, Payment as MongoPayment  # fetch reads from MongoDB on each request
 from database.mongo import get_database
 from .models import Order as OrderModel, Payment as PaymentModel, UserProfile, UserActivity, Feedback, Notification
 from .forms import OrderForm
-from .notifications import notify_order_event, notify_offer, notify_announcement
+from .notifications import notify_order_event, broadcast_offer, broadcast_announcement
+from .customer_pages import invalidate_user_summary
+from .order_metrics import get_order_metrics, record_order_created, record_order_deleted, record_orders_created
+from .tasks import defer
+from .otp import EMAIL_VERIFICATION, check_otp, generate_code, issue_otp
+from .ratelimit import rate_limit
+from .perf import TimedSession
+from .metrics import PAYMENT_VERIFICATIONS
+from .order_status import (
+    InvalidTransition, StaleTransition, TransitionError, normalize_status, record_initial_status,
+    status_history, transition_order,
+)
 from .email_templates import send_templated_email
-import traceback
+from .avatars import (
+    AVATAR_NAME_RE, AvatarError, avatar_url_for, content_type_for, get_avatar_storage, is_data_url,
+)
 
 try:
     import bcrypt
@@ -66,22 +80,51 @@ def _normalize_extra_fields(extra):
     return payload
 
 
-def _find_order_by_client_order_id(client_order_id, email=None, limit=400):
+def _find_order_by_client_order_id(client_order_id, email=None):
     """
-    Resolve an order by clientOrderId from extra_fields.
-    Kept DB-agnostic to avoid JSONField lookup differences.
+    Resolve the newest order with this clientOrderId in extra_fields.
+    With an email the lookup stays on that customer's (email, -created_at) index range.
+    Legacy rows that stored extra_fields as a JSON string were parsed by migration 0012.
     """
     resolved = str(client_order_id or '').strip()
     if not resolved:
         return None
-    qs = OrderModel.objects.order_by('-created_at')
+    qs = OrderModel.objects.filter(extra_fields__clientOrderId=resolved)
     if email:
         qs = qs.filter(email=email)
-    for candidate in qs[:limit]:
-        extra = _normalize_extra_fields(candidate.extra_fields)
-        if str(extra.get('clientOrderId') or '').strip() == resolved:
-            return candidate
-    return None
+    return qs.order_by('-created_at').first()
+
+
+AVATAR_MIGRATION_MARKER_SECONDS = 300
+
+
+def _resolve_avatar(email, avatar):
+    """
+    Return the avatar value for a profile payload.
+    Legacy inline data URLs are returned as they are; moving them into avatar
+    storage (decode, thumbnails, Mongo and profile writes) is deferred so reads
+    stay reads. `manage.py migrate_inline_avatars` does the same in bulk.
+    """
+    if not is_data_url(avatar):
+        return avatar or ''
+    # One queued migration per email; the marker expires in case the task never runs.
+    if cache.add(_avatar_migration_key(email), 1, timeout=AVATAR_MIGRATION_MARKER_SECONDS):
+        defer(_migrate_inline_avatar, email, avatar)
+    return avatar
+
+
+def _avatar_migration_key(email):
+    return f"avatar-migration:{email}"
+
+
+def _migrate_inline_avatar(email, avatar):
+    """Store one inline avatar and point Mongo and the profile at it, unless it changed since."""
+    try:
+        url, _ = avatar_url_for(avatar)
+        get_database()['users'].update_one({'email': email, 'avatar': avatar}, {'$set': {'avatar': url}})
+        UserProfile.objects.filter(email=email, avatar=avatar).update(avatar=url)
+    finally:
+        cache.delete(_avatar_migration_key(email))
 
 
 def _get_or_create_profile(email, mongo_user=None):
@@ -101,7 +144,7 @@ def _get_or_create_profile(email, mongo_user=None):
         'phone': (mongo_user or {}).get('phone', ''),
         'address': (mongo_user or {}).get('address', ''),
         'coffee_preferences': (mongo_user or {}).get('coffeePreferences', {}) or {},
-        'avatar': (mongo_user or {}).get('avatar', ''),
+        'avatar': _resolve_avatar(email, (mongo_user or {}).get('avatar', '')),
     }
     user = _get_django_user_by_email(email)
     profile = UserProfile.objects.create(email=email, user=user, **defaults)
@@ -129,10 +172,15 @@ def _backfill_orders_from_mongo(email):
     try:
         db = get_database()
         legacy_orders = list(db['orders'].find({'email': email}).sort('createdAt', -1))
+        if not legacy_orders:
+            return
         profile = UserProfile.objects.filter(email=email).first()
         profile_name = ''
         if profile:
             profile_name = f"{profile.first_name} {profile.last_name}".strip()
+        django_user = _get_django_user_by_email(email)
+        orders = []
+        timestamps = []
         for legacy in legacy_orders:
             legacy_created = legacy.get('createdAt')
             legacy_updated = legacy.get('updatedAt') or legacy_created
@@ -140,8 +188,8 @@ def _backfill_orders_from_mongo(email):
             legacy_name = extra.get('name') or extra.get('customerName') or profile_name
             legacy_phone = extra.get('phone') or extra.get('customerPhone') or (profile.phone if profile else '')
             legacy_address = extra.get('address') or extra.get('deliveryAddress') or (profile.address if profile else '')
-            order = OrderModel.objects.create(
-                user=_get_django_user_by_email(email),
+            orders.append(OrderModel(
+                user=django_user,
                 email=email,
                 order_name=legacy_name or '',
                 order_email=legacy.get('email') or email,
@@ -155,12 +203,23 @@ def _backfill_orders_from_mongo(email):
                 total_amount=Decimal(legacy.get('totalAmount') or legacy.get('total') or 0),
                 status=legacy.get('status') or 'pending',
                 extra_fields=extra
-            )
-            # Preserve original timestamps when available
-            if legacy_created:
-                OrderModel.objects.filter(id=order.id).update(created_at=legacy_created, updated_at=legacy_updated)
-    except Exception as e:
-        print(f"Order backfill failed for {email}: {e}")
+            ))
+            timestamps.append((legacy_created, legacy_updated))
+        # One INSERT for the batch instead of a create + timestamp UPDATE per legacy order.
+        with transaction.atomic():
+            orders = OrderModel.objects.bulk_create(orders)
+            # Preserve original timestamps when available (auto_now_add overrides them on insert)
+            dated = []
+            for order, (legacy_created, legacy_updated) in zip(orders, timestamps):
+                if legacy_created:
+                    order.created_at = legacy_created
+                    order.updated_at = legacy_updated
+                    dated.append(order)
+            if dated:
+                OrderModel.objects.bulk_update(dated, ['created_at', 'updated_at'])
+            record_orders_created(orders)
+    except Exception:
+        logger.exception("Order backfill failed for email=%s", email)
 
 @csrf_exempt
 def product_list(request):
@@ -196,26 +255,30 @@ def product_list(request):
 # OTP ENDPOINTS
 # ==========================================
 
+LEGACY_OTP_EXPIRY_MINUTES = 10
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
+@rate_limit('otp')
 def send_otp_email(request):
     """
-    Send OTP to user's email for password reset.
-    Expected request body: { "email": "user@example.com", "otp": "123456" }
+    Send a one-time code to the user's email.
+    Expected request body: { "email": "user@example.com" }
+    The code is generated here (any "otp" in the body is ignored) and is only valid for
+    /api/validate-otp/, never for a password reset.
     """
     try:
         data = json.loads(request.body)
         email = str(data.get('email') or '').strip().lower()
-        otp = str(data.get('otp') or '').strip()
         
-        if not email or not otp:
+        if not email:
             return JsonResponse({
                 'success': False,
-                'message': 'Email and OTP are required'
+                'message': 'Email is required'
             }, status=400)
         
-        # Save OTP to MongoDB
-        OTP.create(email, otp, expiry_minutes=10)
+        otp = generate_code()
 
         sent_at = timezone.localtime(timezone.now()).strftime('%a, %d/%m/%Y %I:%M %p')
         ok, reason = send_templated_email(
@@ -242,6 +305,9 @@ def send_otp_email(request):
                 'success': False,
                 'message': 'Unable to send OTP email'
             }, status=500)
+
+        # Stored only once delivered, replacing any earlier code for this email
+        issue_otp(email, purpose=EMAIL_VERIFICATION, code=otp, ttl_minutes=LEGACY_OTP_EXPIRY_MINUTES)
         
         return JsonResponse({
             'success': True,
@@ -279,8 +345,8 @@ def validate_otp(request):
                 'message': 'Email and OTP are required'
             }, status=400)
         
-        # Verify OTP against MongoDB
-        is_valid = OTP.verify(email, otp)
+        # Check the OTP without consuming it; attempts still count toward the limit
+        is_valid, _reason = check_otp(email, otp, purpose=EMAIL_VERIFICATION)
         
         if is_valid:
             return JsonResponse({
@@ -311,6 +377,7 @@ def validate_otp(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@rate_limit('login')
 def login(request):
     """
     User login endpoint.
@@ -354,10 +421,10 @@ def login(request):
                         try:
                             new_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
                             User.update(email, {'password': new_hash})
-                        except Exception as e:
-                            print(f"Password migration failed for {email}: {e}")
-        except Exception as e:
-            print(f"Error verifying password for {email}: {e}")
+                        except Exception:
+                            logger.exception("Password migration failed for email=%s", email)
+        except Exception:
+            logger.exception("Error verifying password for email=%s", email)
 
         if not authenticated:
             return JsonResponse({
@@ -391,21 +458,21 @@ def login(request):
             if not django_user:
                 django_user = user_model.objects.create_user(username=email, email=email, password=password)
             django_login(request, django_user, backend='django.contrib.auth.backends.ModelBackend')
-        except Exception as e:
-            print(f"Django login sync failed for {email}: {e}")
+        except Exception:
+            logger.exception("Django login sync failed for email=%s", email)
 
         # HARD BLOCK: Create profile ONLY from signup, not login
         # Persistence: ensure profile exists in DB for this user
         try:
             _get_or_create_profile(email, user)
-        except Exception as e:
-            print(f"Profile bootstrap failed for {email}: {e}")
+        except Exception:
+            logger.exception("Profile bootstrap failed for email=%s", email)
 
         # Persistence: log user login activity
         try:
             _log_activity(email, 'login')
-        except Exception as e:
-            print(f"Activity log failed for {email}: {e}")
+        except Exception:
+            logger.exception("Activity log failed for email=%s", email)
         
         # TODO: Generate JWT tokens
         
@@ -434,6 +501,7 @@ def login(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@rate_limit('signup')
 def signup(request):
     """
     User signup endpoint.
@@ -478,8 +546,8 @@ def signup(request):
             django_user.first_name = firstName
             django_user.last_name = lastName
             django_user.save()
-        except Exception as e:
-            print(f"Error creating Django user for {email}: {e}")
+        except Exception:
+            logger.exception("Error creating Django user for email=%s", email)
             return JsonResponse({
                 'message': 'Unable to create account'
             }, status=500)
@@ -496,13 +564,13 @@ def signup(request):
             }, status=500)
         try:
             password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        except Exception as e:
+        except Exception:
             if django_user:
                 try:
                     django_user.delete()
                 except Exception:
                     pass
-            print(f"Error hashing password during signup for {email}: {e}")
+            logger.exception("Error hashing password during signup for email=%s", email)
             return JsonResponse({
                 'message': 'Internal error'
             }, status=500)
@@ -510,13 +578,13 @@ def signup(request):
         # Save user to MongoDB
         try:
             user_id = User.create(firstName, lastName, email, phone, password_hash)
-        except Exception as e:
+        except Exception:
             if django_user:
                 try:
                     django_user.delete()
                 except Exception:
                     pass
-            print(f"Error creating Mongo user for {email}: {e}")
+            logger.exception("Error creating Mongo user for email=%s", email)
             return JsonResponse({
                 'message': 'Unable to create account'
             }, status=500)
@@ -530,13 +598,13 @@ def signup(request):
                 'lastName': lastName,
                 'phone': phone
             })
-        except Exception as e:
+        except Exception:
             if django_user:
                 try:
                     django_user.delete()
                 except Exception:
                     pass
-            print(f"Error creating profile during signup for {email}: {e}")
+            logger.exception("Error creating profile during signup for email=%s", email)
             return JsonResponse({
                 'message': 'Unable to create account'
             }, status=500)
@@ -554,8 +622,8 @@ def signup(request):
         try:
             if django_user:
                 django_login(request, django_user, backend='django.contrib.auth.backends.ModelBackend')
-        except Exception as e:
-            print(f"Django login sync failed for {email}: {e}")
+        except Exception:
+            logger.exception("Django login sync failed for email=%s", email)
         
         # TODO: Generate JWT tokens
         
@@ -593,8 +661,8 @@ def logout(request):
         # Persistence: log logout activity before session is cleared
         try:
             _log_activity(request.session.get('email'), 'logout')
-        except Exception as e:
-            print(f"Activity log failed for logout: {e}")
+        except Exception:
+            logger.exception("Activity log failed for logout")
 
         request.session.flush()
         
@@ -610,6 +678,7 @@ def logout(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@rate_limit('otp')
 def forgot_password(request):
     """
     Forgot password endpoint - sends OTP to user email.
@@ -631,11 +700,8 @@ def forgot_password(request):
                 'message': 'Email not found'
             }, status=400)
         
-        # Generate 6-digit OTP
-        otp = str(random.randint(100000, 999999))
-        
-        # Save OTP to MongoDB with expiry (10 minutes)
-        OTP.create(email, otp, expiry_minutes=10)
+        # Generate and store a 6-digit OTP with expiry (10 minutes)
+        otp = issue_otp(email, ttl_minutes=LEGACY_OTP_EXPIRY_MINUTES)
 
         sent_at = timezone.localtime(timezone.now()).strftime('%a, %d/%m/%Y %I:%M %p')
         ok, reason = send_templated_email(
@@ -696,8 +762,8 @@ def reset_password(request):
                 'message': 'Email, OTP, and new password are required'
             }, status=400)
         
-        # Validate OTP
-        is_valid = OTP.verify(email, otp)
+        # Validate and consume the OTP so it cannot be replayed
+        is_valid, _reason = check_otp(email, otp, consume=True)
         if not is_valid:
             return JsonResponse({
                 'message': 'Invalid or expired OTP'
@@ -708,8 +774,8 @@ def reset_password(request):
             return JsonResponse({'message': 'Server security dependency is missing'}, status=500)
         try:
             password_hash = bcrypt.hashpw(newPassword.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        except Exception as e:
-            print(f"Error hashing new password for {email}: {e}")
+        except Exception:
+            logger.exception("Error hashing new password for email=%s", email)
             return JsonResponse({'message': 'Internal error'}, status=500)
 
         # Update user password in MongoDB
@@ -786,7 +852,7 @@ def profile(request):
                 'phone': mongo_user.get('phone', ''),
                 'address': mongo_user.get('address', ''),
                 'coffeePreferences': mongo_user.get('coffeePreferences', {}) or {},
-                'avatar': mongo_user.get('avatar', ''),
+                'avatar': _resolve_avatar(email, mongo_user.get('avatar', '')),
                 'memberSince': member_since_value,
                 'lastOrderAt': last_order_at_value,
                 'lastOrderItems': last_order_items,
@@ -849,6 +915,13 @@ def profile(request):
             if key in data:
                 update_fields[key] = data.get(key)
 
+        # Avatars are stored as files; the profile only keeps the content-hashed URL.
+        if is_data_url(update_fields.get('avatar')):
+            try:
+                update_fields['avatar'], _ = avatar_url_for(update_fields['avatar'])
+            except AvatarError as e:
+                return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
         feedback_payload = data.get('feedback') or data.get('feedbacks')
 
         if not update_fields and not feedback_payload:
@@ -879,8 +952,9 @@ def profile(request):
         # Keep Mongo user in sync for existing auth flow
         try:
             User.update(email, update_fields)
-        except Exception as e:
-            print(f"Mongo profile sync failed for {email}: {e}")
+            invalidate_user_summary(email)
+        except Exception:
+            logger.exception("Mongo profile sync failed for email=%s", email)
 
         # Persistence: append feedback without overwriting existing records
         try:
@@ -895,8 +969,8 @@ def profile(request):
                         rating=Decimal(item.get('rating') or 0),
                         message=item.get('message', '')
                     )
-        except Exception as e:
-            print(f"Feedback persistence failed for {email}: {e}")
+        except Exception:
+            logger.exception("Feedback persistence failed for email=%s", email)
 
         # Update Django auth user names if available
         try:
@@ -907,14 +981,14 @@ def profile(request):
                 if 'lastName' in update_fields:
                     django_user.last_name = update_fields.get('lastName') or django_user.last_name
                 django_user.save(update_fields=['first_name', 'last_name'])
-        except Exception as e:
-            print(f"Django user sync failed for {email}: {e}")
+        except Exception:
+            logger.exception("Django user sync failed for email=%s", email)
 
         # Persistence: log profile update activity
         try:
             _log_activity(email, 'profile_updated', {'fields': list(update_fields.keys())})
-        except Exception as e:
-            print(f"Activity log failed for {email}: {e}")
+        except Exception:
+            logger.exception("Activity log failed for email=%s", email)
 
         mongo_user_refreshed = User.find_by_email(email)  # re-read profile from MongoDB after update
         user_safe = {
@@ -1029,6 +1103,27 @@ def public_feedbacks(request):
 
 
 
+@require_http_methods(["GET", "HEAD"])
+def avatar_file(request, name):
+    """Serve a stored avatar image; names are content-hashed so responses never change."""
+    if not AVATAR_NAME_RE.match(name):
+        return JsonResponse({'message': 'Avatar not found'}, status=404)
+    etag = f'"{name}"'
+    cache_control = 'public, max-age=31536000, immutable'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+    data = get_avatar_storage().open(name)
+    if data is None:
+        return JsonResponse({'message': 'Avatar not found'}, status=404)
+    response = HttpResponse(data, content_type=content_type_for(name))
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
 # ==========================================
 # PROFILE + ORDER STATS UTILITIES
 # ==========================================
@@ -1069,7 +1164,26 @@ def _get_razorpay_client():
         raise ValueError('Razorpay SDK is not installed on server')
     if not settings.RAZORPAY_KEY_ID or not settings.RAZORPAY_KEY_SECRET:
         raise ValueError('Razorpay keys are not configured')
-    return razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+    options = {}
+    base_url = getattr(settings, 'RAZORPAY_API_BASE_URL', '')
+    if base_url:
+        options['base_url'] = base_url
+    return razorpay.Client(
+        session=TimedSession(),
+        auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+        **options,
+    )
+
+def _checkout_profile_snapshot(profile):
+    """The profile fields checkout reads and must never change."""
+    return {
+        'first_name': profile.first_name,
+        'last_name': profile.last_name,
+        'email': profile.email,
+        'phone': profile.phone,
+        'address': profile.address,  # Profile address is immutable from checkout
+    }
+
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -1083,6 +1197,13 @@ def create_order(request):
         "email": "user@example.com",
         "items": []
     }
+
+    Query budget for a new order (enforced by QueryBudgetTests, flat in order history):
+    session, auth user, clientOrderId lookup, profile read, one transaction holding the
+    order INSERT, its counters and the initial status event, then the payment INSERT; 13
+    SQL queries and no Mongo. If Razorpay fails the order is deleted and its counters
+    reversed in one transaction. Loyalty stats, activity and the notification run after commit
+    (`_after_order_created`).
     """
     try:
         data = json.loads(request.body)
@@ -1136,44 +1257,41 @@ def create_order(request):
                 'orderId': client_order_id or str(existing_order.id)
             }, status=409)
 
+        # One-way sync: profile -> checkout (checkout must never update profile).
+        # The profile is only read to fill in order snapshot fields, so it is not locked.
+        profile = (
+            UserProfile.objects.only('first_name', 'last_name', 'email', 'phone', 'address')
+            .filter(email=profile_email)
+            .first()
+        )
+        profile_name = ''
+        if profile:
+            profile_name = f"{profile.first_name} {profile.last_name}".strip()
+
+        # Checkout fields can override order snapshot only (not profile)
+        checkout_name = data.get('name')
+        if not checkout_name:
+            first = data.get('firstName') or ''
+            last = data.get('lastName') or ''
+            checkout_name = f"{first} {last}".strip()
+        snapshot_name = checkout_name or profile_name or ''
+        snapshot_email = data.get('email') or (profile.email if profile else profile_email) or ''
+        snapshot_phone = data.get('phone') or (profile.phone if profile else '')
+
+        # CRITICAL: Checkout address is TEMPORARY and INDEPENDENT of profile address
+        # User can enter any delivery address during checkout without affecting profile
+        # This is the one-way flow: profile -> checkout (read-only), NEVER checkout -> profile
+        # Checkout-provided 'address' or 'deliveryAddress' only writes to order_address, never profile.address
+        checkout_address = data.get('address') or data.get('deliveryAddress')
+        snapshot_address = checkout_address or (profile.address if profile else '')
+
+        # FAIL-SAFE GUARD: snapshot profile values BEFORE checkout write
+        # This includes address so we can verify it was never modified by checkout
+        profile_before = _checkout_profile_snapshot(profile) if profile else None
+
         created_new_order = False
+        # Only the order write (and the guard that can roll it back) runs in the transaction.
         with transaction.atomic():
-            # One-way sync: profile -> checkout (checkout must never update profile)
-            # Lock the profile row to detect any accidental writes within this checkout transaction.
-            profile = UserProfile.objects.select_for_update().filter(email=profile_email).first()
-            profile_name = ''
-            if profile:
-                profile_name = f"{profile.first_name} {profile.last_name}".strip()
-
-            # Checkout fields can override order snapshot only (not profile)
-            checkout_name = data.get('name')
-            if not checkout_name:
-                first = data.get('firstName') or ''
-                last = data.get('lastName') or ''
-                checkout_name = f"{first} {last}".strip()
-            snapshot_name = checkout_name or profile_name or ''
-            snapshot_email = data.get('email') or (profile.email if profile else profile_email) or ''
-            snapshot_phone = data.get('phone') or (profile.phone if profile else '')
-
-            # CRITICAL: Checkout address is TEMPORARY and INDEPENDENT of profile address
-            # User can enter any delivery address during checkout without affecting profile
-            # This is the one-way flow: profile -> checkout (read-only), NEVER checkout -> profile
-            # Checkout-provided 'address' or 'deliveryAddress' only writes to order_address, never profile.address
-            checkout_address = data.get('address') or data.get('deliveryAddress')
-            snapshot_address = checkout_address or (profile.address if profile else '')
-
-            # FAIL-SAFE GUARD: snapshot profile values BEFORE checkout write
-            # This includes address so we can verify it was never modified by checkout
-            profile_before = None
-            if profile:
-                profile_before = {
-                    'first_name': profile.first_name,
-                    'last_name': profile.last_name,
-                    'email': profile.email,
-                    'phone': profile.phone,
-                    'address': profile.address,  # Profile address is immutable from checkout
-                }
-
             if existing_order and existing_order.status != 'cancelled':
                 # Idempotency: reuse the same order row for the same clientOrderId.
                 order = existing_order
@@ -1186,7 +1304,6 @@ def create_order(request):
                 order.email = profile_email
                 order.items = items or order.items
                 order.total_amount = amount
-                order.status = status or order.status or 'pending'
                 order.order_name = snapshot_name or order.order_name
                 order.order_email = snapshot_email or order.order_email
                 order.order_phone = snapshot_phone or order.order_phone
@@ -1201,7 +1318,6 @@ def create_order(request):
                     'email',
                     'items',
                     'total_amount',
-                    'status',
                     'extra_fields',
                     'order_name',
                     'order_email',
@@ -1213,20 +1329,28 @@ def create_order(request):
                     'customer_address',
                     'updated_at',
                 ])
+                requested_status = status or order.status or 'pending'
+                try:
+                    transition_order(order, requested_status, source='checkout')
+                except TransitionError:
+                    logger.warning(
+                        "Checkout retry kept order_id=%s at status=%s (requested %s)",
+                        order.id,
+                        order.status,
+                        requested_status,
+                    )
             else:
                 # Checkout MUST use OrderForm only (no User/Profile forms)
-                form_data = {
-                    'items': json.dumps(items or []),
-                    'total_amount': str(amount),
+                order_form = OrderForm({
+                    'items': items or [],
+                    'total_amount': amount,
                     'status': status,
-                    'extra_fields': json.dumps(extra_fields),
+                    'extra_fields': extra_fields,
                     'order_name': snapshot_name,
                     'order_email': snapshot_email,
                     'order_phone': snapshot_phone,
                     'order_address': snapshot_address,
-                }
-
-                order_form = OrderForm(form_data)
+                })
                 if not order_form.is_valid():
                     return JsonResponse({'success': False, 'message': 'Invalid order data', 'errors': order_form.errors}, status=400)
 
@@ -1246,20 +1370,17 @@ def create_order(request):
                 order.customer_address = snapshot_address
                 order.save()
                 created_new_order = True
+                # Counters and the first history event commit with the order row, so a
+                # crash between them can never leave one without the other.
+                record_order_created(order)
+                record_initial_status(order, source='checkout')
 
             # FAIL-LOUD GUARD: Verify profile data was NOT modified during checkout
             # CRITICAL: profile.address must remain unchanged (user delivery address is temporary, in order_address only)
-            # If this assertion fails, checkout view has a critical bug allowing address sync back to profile
-            if profile_before is not None:
-                profile_after = UserProfile.objects.filter(email=profile_email).first()
-                if profile_after and {
-                    'first_name': profile_after.first_name,
-                    'last_name': profile_after.last_name,
-                    'email': profile_after.email,
-                    'phone': profile_after.phone,
-                    'address': profile_after.address,  # THIS MUST NEVER CHANGE FROM CHECKOUT
-                } != profile_before:
-                    raise Exception('Checkout attempted to modify profile data (blocked). Profile address must remain immutable from checkout.')
+            # Nothing above writes the profile row, so checking the instance we read is enough;
+            # if this fails, checkout view has a critical bug allowing address sync back to profile
+            if profile_before is not None and _checkout_profile_snapshot(profile) != profile_before:
+                raise Exception('Checkout attempted to modify profile data (blocked). Profile address must remain immutable from checkout.')
 
         try:
             # Create real Razorpay order
@@ -1293,53 +1414,18 @@ def create_order(request):
             )
         except Exception:
             # Keep DB clean only for brand-new rows; retries may reuse an existing order.
+            # The status events cascade with the row; the counters are reversed alongside it.
             if created_new_order:
-                OrderModel.objects.filter(id=order.id).delete()
+                with transaction.atomic():
+                    OrderModel.objects.filter(id=order.id).delete()
+                    record_order_deleted(order)
             raise
 
         # NOTE: No profile/user writes are allowed in checkout flow.
-        stats = None
-
         if created_new_order:
-            # Persistence: update profile with order stats (CRITICAL FIX for data loss)
-            # When an order is created, profile must be updated with latest statistics
-            # so data persists across page refreshes and browser restarts
-            try:
-                profile_to_update = UserProfile.objects.filter(email=profile_email).first()
-                if profile_to_update:
-                    # Compute updated stats including this new order
-                    stats = _compute_loyalty_stats(profile_email)
-                    # CRITICAL: Save stats to database (not just computed in memory)
-                    UserProfile.objects.filter(email=profile_email).update(
-                        last_order_at=timezone.now(),
-                        last_order_items=items or [],
-                        total_orders=stats['totalOrders'],
-                        total_spent=Decimal(str(stats['totalSpent'])),
-                        loyalty_points=stats['loyaltyPoints'],
-                        member_tier=stats['memberTier']
-                    )
-            except Exception as e:
-                print(f"Profile stats update failed for {profile_email}: {e}")
-
-            # Persistence: log order creation activity
-            try:
-                _log_activity(profile_email, 'order_created', {'orderId': str(order.id), 'status': status})
-            except Exception as e:
-                print(f"Activity log failed for {profile_email}: {e}")
-
-            try:
-                notify_order_event(
-                    profile_email,
-                    'order_placed',
-                    order=order,
-                    status=order.status or status or 'pending',
-                )
-            except Exception:
-                logger.exception(
-                    "Order placed notification failed for email=%s order_id=%s",
-                    profile_email,
-                    order.id,
-                )
+            # Loyalty stats, activity log and the order-placed notification don't change the
+            # response, so they run after commit in the background queue.
+            defer(_after_order_created, order.id, status)
 
         return JsonResponse({
             'success': True,
@@ -1358,7 +1444,8 @@ def create_order(request):
                 'totalAmount': amount,
                 'status': order.status
             },
-            'stats': stats
+            # Loyalty stats are refreshed in the background; read them from the profile API.
+            'stats': None
         })
         
     except json.JSONDecodeError:
@@ -1373,6 +1460,118 @@ def create_order(request):
         }, status=500)
 
 
+# Payments in these states may still be flipped by a verification/failure signal.
+OPEN_PAYMENT_STATUSES = ('pending', 'processing', 'failed')
+
+
+def _mark_payment_verified(razorpay_order_id, razorpay_payment_id, signature=''):
+    """
+    Idempotently flip the payment for razorpay_order_id to verified and the order to paid.
+    One conditional UPDATE decides the winner; replays and concurrent callbacks change nothing.
+    Returns (payment, changed); payment is None if no record exists.
+    """
+    with transaction.atomic():
+        changed = bool(
+            PaymentModel.objects
+            .filter(razorpay_order_id=razorpay_order_id, status__in=OPEN_PAYMENT_STATUSES)
+            .update(
+                status='verified',
+                razorpay_payment_id=razorpay_payment_id,
+                updated_at=timezone.now(),
+                # Webhook confirmations carry no checkout signature; keep any stored one.
+                **({'razorpay_signature': signature} if signature else {}),
+            )
+        )
+        payment = (
+            PaymentModel.objects
+            .select_related('order')
+            .filter(razorpay_order_id=razorpay_order_id)
+            .first()
+        )
+        if changed and payment and payment.order:
+            try:
+                transition_order(payment.order, 'paid', source='payment')
+            except TransitionError as e:
+                logger.warning("Order status not moved to paid for order_id=%s: %s", payment.order_id, e)
+        if changed and payment:
+            defer(_after_payment_verified, payment.id)
+    return payment, changed
+
+
+def _mark_payment_failed(razorpay_order_id, razorpay_payment_id='', signature=''):
+    """Record a failed attempt without ever downgrading a verified payment."""
+    return bool(
+        PaymentModel.objects
+        .filter(razorpay_order_id=razorpay_order_id, status__in=OPEN_PAYMENT_STATUSES)
+        .update(
+            status='failed',
+            razorpay_payment_id=razorpay_payment_id or '',
+            razorpay_signature=signature or '',
+            updated_at=timezone.now(),
+        )
+    )
+
+
+def _after_order_created(order_id, status):
+    """Post-commit follow-up work for a new checkout order (runs in the background queue)."""
+    order = OrderModel.objects.filter(id=order_id).first()
+    if not order or not order.email:
+        return
+    email = order.email
+    # Persistence: update profile with order stats so they survive refreshes and restarts.
+    try:
+        if UserProfile.objects.filter(email=email).exists():
+            stats = _compute_loyalty_stats(email)
+            UserProfile.objects.filter(email=email).update(
+                last_order_at=order.created_at,
+                last_order_items=order.items or [],
+                total_orders=stats['totalOrders'],
+                total_spent=Decimal(str(stats['totalSpent'])),
+                loyalty_points=stats['loyaltyPoints'],
+                member_tier=stats['memberTier']
+            )
+    except Exception:
+        logger.exception("Profile stats update failed for email=%s", email)
+    try:
+        _log_activity(email, 'order_created', {'orderId': str(order.id), 'status': status})
+    except Exception:
+        logger.exception("Activity log failed for email=%s", email)
+    try:
+        notify_order_event(email, 'order_placed', order=order, status=status or 'pending')
+    except Exception:
+        logger.exception("Order placed notification failed for email=%s order_id=%s", email, order.id)
+
+
+def _after_payment_verified(payment_id):
+    """Post-commit follow-up work for a newly verified payment (runs in the background queue)."""
+    payment = PaymentModel.objects.select_related('order').filter(id=payment_id).first()
+    if not payment or not payment.email:
+        return
+    email = payment.email
+    try:
+        notify_order_event(email, 'order_status_update', order=payment.order, status='paid')
+    except Exception:
+        logger.exception(
+            "Payment notification failed for email=%s razorpay_order_id=%s",
+            email,
+            payment.razorpay_order_id,
+        )
+    try:
+        stats = _compute_loyalty_stats(email)
+        UserProfile.objects.filter(email=email).update(
+            total_orders=stats['totalOrders'],
+            total_spent=Decimal(str(stats['totalSpent'])),
+            loyalty_points=stats['loyaltyPoints'],
+            member_tier=stats['memberTier']
+        )
+    except Exception:
+        logger.exception("Profile stats update failed for email=%s", email)
+    try:
+        _log_activity(email, 'payment_verified', {'razorpayOrderId': payment.razorpay_order_id})
+    except Exception:
+        logger.exception("Activity log failed for email=%s", email)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def verify_payment(request):
@@ -1384,6 +1583,8 @@ def verify_payment(request):
         "razorpay_signature": "signature_123",
         "email": "user@example.com"
     }
+    Idempotent: duplicate callbacks for an already verified payment are no-ops.
+    Notification, loyalty stats and activity logging run after commit in the background.
     """
     try:
         data = json.loads(request.body)
@@ -1391,22 +1592,16 @@ def verify_payment(request):
         payment_id = data.get('razorpay_payment_id')
         signature = data.get('razorpay_signature')
         email = data.get('email')
-        # Defensive logging for verification
-        print(f"[PAYMENT VERIFY] Incoming: order_id={order_id}, payment_id={payment_id}, signature={signature}, email={email}")
+        logger.info("Payment verify incoming order_id=%s payment_id=%s email=%s", order_id, payment_id, email)
         if not all([order_id, payment_id, signature]):
-            print("[PAYMENT VERIFY] Missing payment details")
+            logger.warning("Payment verify missing details order_id=%s payment_id=%s", order_id, payment_id)
+            PAYMENT_VERIFICATIONS.inc(outcome='missing_details')
             return JsonResponse({
                 'verified': False,
                 'message': 'Missing payment details'
             }, status=400)
+        # Signature check is pure HMAC work: do it before touching the database.
         client = _get_razorpay_client()
-        payment = PaymentModel.objects.filter(razorpay_order_id=order_id).first()
-        if not payment:
-            print(f"[PAYMENT VERIFY] Payment record not found for order_id={order_id}")
-            return JsonResponse({
-                'verified': False,
-                'message': 'Payment record not found'
-            }, status=400)
         signature_payload = {
             'razorpay_order_id': order_id,
             'razorpay_payment_id': payment_id,
@@ -1415,67 +1610,50 @@ def verify_payment(request):
         try:
             client.utility.verify_payment_signature(signature_payload)
         except SignatureVerificationError:
-            print(f"[PAYMENT VERIFY] Invalid payment signature for order_id={order_id}, payment_id={payment_id}")
-            if payment:
-                payment.status = 'failed'
-                payment.razorpay_payment_id = payment_id or payment.razorpay_payment_id
-                payment.razorpay_signature = signature or payment.razorpay_signature
-                payment.save(update_fields=['status', 'razorpay_payment_id', 'razorpay_signature', 'updated_at'])
+            logger.warning("Payment verify invalid signature order_id=%s payment_id=%s", order_id, payment_id)
+            if not _mark_payment_failed(order_id, payment_id, signature) and not PaymentModel.objects.filter(razorpay_order_id=order_id).exists():
+                PAYMENT_VERIFICATIONS.inc(outcome='not_found')
+                return JsonResponse({
+                    'verified': False,
+                    'message': 'Payment record not found'
+                }, status=400)
+            PAYMENT_VERIFICATIONS.inc(outcome='invalid_signature')
             return JsonResponse({
                 'verified': False,
                 'message': 'Invalid payment signature'
             }, status=400)
-        if payment:
-            payment.status = 'verified'
-            payment.razorpay_payment_id = payment_id or payment.razorpay_payment_id
-            payment.razorpay_signature = signature or payment.razorpay_signature
-            payment.save(update_fields=['status', 'razorpay_payment_id', 'razorpay_signature', 'updated_at'])
-            resolved_email = email or payment.email
-            if payment.order_id:
-                OrderModel.objects.filter(id=payment.order_id).update(status='paid', updated_at=timezone.now())
-            try:
-                if resolved_email:
-                    notify_order_event(
-                        resolved_email,
-                        'order_status_update',
-                        order=payment.order if payment.order_id else None,
-                        status='paid',
-                    )
-            except Exception:
-                logger.exception(
-                    "Payment notification failed for email=%s razorpay_order_id=%s",
-                    resolved_email,
-                    order_id,
-                )
-            try:
-                if resolved_email:
-                    stats = _compute_loyalty_stats(resolved_email)
-                    UserProfile.objects.filter(email=resolved_email).update(
-                        total_orders=stats['totalOrders'],
-                        total_spent=Decimal(str(stats['totalSpent'])),
-                        loyalty_points=stats['loyaltyPoints'],
-                        member_tier=stats['memberTier']
-                    )
-            except Exception as e:
-                print(f"Profile stats update failed for {resolved_email}: {e}")
-            try:
-                if resolved_email:
-                    _log_activity(resolved_email, 'payment_verified', {'razorpayOrderId': order_id})
-            except Exception as e:
-                print(f"Activity log failed for {resolved_email}: {e}")
-        print(f"[PAYMENT VERIFY] Success for order_id={order_id}, payment_id={payment_id}")
+
+        payment, changed = _mark_payment_verified(order_id, payment_id, signature)
+        if not payment:
+            logger.warning("Payment verify record not found order_id=%s", order_id)
+            PAYMENT_VERIFICATIONS.inc(outcome='not_found')
+            return JsonResponse({
+                'verified': False,
+                'message': 'Payment record not found'
+            }, status=400)
+        if not changed and payment.status != 'verified':
+            PAYMENT_VERIFICATIONS.inc(outcome='conflict')
+            return JsonResponse({
+                'verified': False,
+                'message': f'Payment is {payment.status}'
+            }, status=409)
+        logger.info("Payment verify success order_id=%s payment_id=%s", order_id, payment_id)
+        PAYMENT_VERIFICATIONS.inc(outcome='verified' if changed else 'already_verified')
         return JsonResponse({
             'verified': True,
+            'alreadyVerified': not changed,
             'message': 'Payment verified successfully'
         })
     except json.JSONDecodeError:
-        print("[PAYMENT VERIFY] Invalid JSON")
+        logger.warning("Payment verify invalid JSON")
+        PAYMENT_VERIFICATIONS.inc(outcome='invalid_json')
         return JsonResponse({
             'verified': False,
             'message': 'Invalid JSON'
         }, status=400)
     except Exception as e:
-        print(f"[PAYMENT VERIFY] Exception: {e}")
+        logger.exception("Payment verify failed")
+        PAYMENT_VERIFICATIONS.inc(outcome='error')
         return JsonResponse({
             'verified': False,
             'message': str(e)
@@ -1524,7 +1702,10 @@ def process_payment(request):
         
         # Update order status (NEVER profile)
         if order_obj:
-            OrderModel.objects.filter(id=order_obj.id).update(status='processing', updated_at=timezone.now())
+            try:
+                transition_order(order_obj, 'processing', source='payment')
+            except TransitionError as e:
+                logger.warning("Order status not moved to processing for order_id=%s: %s", order_obj.id, e)
 
         # Persistence: update profile with latest stats after payment processing (CRITICAL FIX)
         # When payment is processed, ensure profile reflects updated order statistics
@@ -1537,14 +1718,14 @@ def process_payment(request):
                 loyalty_points=stats['loyaltyPoints'],
                 member_tier=stats['memberTier']
             )
-        except Exception as e:
-            print(f"Profile stats update failed for {email}: {e}")
+        except Exception:
+            logger.exception("Profile stats update failed for email=%s", email)
 
         # Persistence: log payment processing activity
         try:
             _log_activity(email, 'payment_processing', {'orderId': order_id})
-        except Exception as e:
-            print(f"Activity log failed for {email}: {e}")
+        except Exception:
+            logger.exception("Activity log failed for email=%s", email)
         
         return JsonResponse({
             'success': True,
@@ -1568,13 +1749,17 @@ def process_payment(request):
 # ADDITIONAL DATA ENDPOINTS
 # ==========================================
 
+ORDER_PAGE_MAX_SIZE = 100
+
+
 @csrf_exempt
 @login_required(login_url='/login/')
 @require_http_methods(["GET", "POST"])
 def get_orders(request):
     """
     Get orders for a user.
-    Session-auth only.
+    Session-auth only. GET ?limit=N[&offset=M] returns one page plus hasMore/nextOffset;
+    ?orderId= narrows it to one order; ?stats=1 adds the active-order count and spend.
     """
     try:
         email = request.user.email or request.user.username
@@ -1632,12 +1817,15 @@ def get_orders(request):
                 if not order:
                     return JsonResponse({'success': False, 'message': 'Order not found'}, status=404)
 
-                if order.status in ('delivered', 'cancelled'):
-                    return JsonResponse({'success': False, 'message': f'Cannot cancel {order.status} order'}, status=400)
-
                 # Persist cancellation (status only) and return minimal JSON as required
-                order.status = 'cancelled'
-                order.save(update_fields=['status', 'updated_at'])
+                try:
+                    changed = transition_order(order, 'cancelled', source='customer')
+                except InvalidTransition:
+                    return JsonResponse({'success': False, 'message': f'Cannot cancel {order.status} order'}, status=400)
+                except StaleTransition:
+                    return JsonResponse({'success': False, 'message': 'Order was updated concurrently, please retry'}, status=409)
+                if changed is None:
+                    return JsonResponse({'success': False, 'message': f'Cannot cancel {order.status} order'}, status=400)
 
                 # Send cancellation notification after successful status update.
                 # Use unified notification helper so all order mail follows one pipeline.
@@ -1691,26 +1879,19 @@ def get_orders(request):
                 if not order:
                     return JsonResponse({'success': False, 'message': 'Order not found'}, status=404)
 
-                current_status = str(order.status or '').strip().lower()
-                if current_status in ('delivered', 'cancelled') and normalized_status != current_status:
-                    return JsonResponse({'success': False, 'message': f'Cannot update {current_status} order'}, status=400)
-
-                last_updated = timezone.now().isoformat()
-                extra = _normalize_extra_fields(order.extra_fields)
-                history = extra.get('trackingHistory')
-                if not isinstance(history, list):
-                    history = []
-
-                if current_status != normalized_status:
-                    if not history or str((history[-1] or {}).get('status') or '').strip().lower() != normalized_status:
-                        history.append({
-                            'status': normalized_status,
-                            'timestamp': last_updated,
-                        })
-                    extra['trackingHistory'] = history
-                    order.status = normalized_status
-                    order.extra_fields = extra
-                    order.save(update_fields=['status', 'extra_fields', 'updated_at'])
+                current_status = normalize_status(order.status)
+                try:
+                    event = transition_order(order, normalized_status, source='customer')
+                except InvalidTransition:
+                    if current_status in ('delivered', 'cancelled'):
+                        message = f'Cannot update {current_status} order'
+                    else:
+                        message = f'Cannot change status from {current_status} to {normalized_status}'
+                    return JsonResponse({'success': False, 'message': message}, status=400)
+                except StaleTransition:
+                    return JsonResponse({'success': False, 'message': 'Order was updated concurrently, please retry'}, status=409)
+
+                if event is not None:
                     try:
                         event_name = 'order_confirmed' if normalized_status == 'confirmed' else 'order_status_update'
                         notify_order_event(order.email or email, event_name, order=order, status=normalized_status)
@@ -1722,15 +1903,19 @@ def get_orders(request):
                             normalized_status,
                         )
 
+                extra = _normalize_extra_fields(order.extra_fields)
                 display_order_id = str(extra.get('clientOrderId') or order.id)
-                return JsonResponse({
+                payload = {
                     'success': True,
                     'message': 'Order status updated successfully',
                     'orderId': display_order_id,
                     'status': order.status,
-                    'lastUpdated': last_updated,
-                    'trackingHistory': history,
-                })
+                    'lastUpdated': (order.updated_at or timezone.now()).isoformat(),
+                }
+                # History is only sent on request; the status event table is the source of truth.
+                if data.get('includeHistory'):
+                    payload['trackingHistory'] = status_history([order])[order.id]
+                return JsonResponse(payload)
 
             if not order_id and not client_order_id:
                 return JsonResponse({'success': False, 'message': 'Order ID is required'}, status=400)
@@ -1738,13 +1923,40 @@ def get_orders(request):
         # Persistence: migrate legacy orders if needed
         _backfill_orders_from_mongo(email)
 
-        # Persistence: fetch orders from Django DB (source of truth for checkout)
-        orders = OrderModel.objects.filter(email=email).order_by('-created_at')
+        # Persistence: fetch orders from Django DB (source of truth for checkout).
+        # ?limit=&offset= returns one page (newest first); without them, every order.
+        orders_qs = OrderModel.objects.filter(email=email).order_by('-created_at')
+        focus_order_id = str(request.GET.get('orderId') or '').strip()
+        if focus_order_id:
+            order = None
+            if focus_order_id.isdigit():
+                order = orders_qs.filter(id=int(focus_order_id)).first()
+            order = order or _find_order_by_client_order_id(focus_order_id, email=email)
+            orders_qs = orders_qs.filter(id=order.id) if order else orders_qs.none()
+        page = None
+        if request.GET.get('limit'):
+            try:
+                limit = max(1, min(int(request.GET.get('limit')), ORDER_PAGE_MAX_SIZE))
+                offset = max(0, int(request.GET.get('offset') or 0))
+            except (TypeError, ValueError):
+                return JsonResponse({'success': False, 'message': 'Invalid limit or offset'}, status=400)
+            orders = list(orders_qs[offset:offset + limit + 1])
+            page = {'offset': offset, 'hasMore': len(orders) > limit}
+            orders = orders[:limit]
+            if page['hasMore']:
+                page['nextOffset'] = offset + limit
+        else:
+            orders = list(orders_qs)
+
+        # Status history is opt-in (?history=1); by default orders carry only the latest status.
+        include_history = str(request.GET.get('history') or '').lower() in ('1', 'true', 'yes')
+        histories = status_history(orders) if include_history else {}
 
         # Normalize fields for frontend
         orders_data = []
         for order in orders:
             extra = _normalize_extra_fields(order.extra_fields)
+            extra.pop('trackingHistory', None)
             created_at_value = order.created_at.isoformat() if order.created_at else None
             updated_at_value = order.updated_at.isoformat() if order.updated_at else None
             total_amount = float(Decimal(str(order.total_amount or 0)))
@@ -1771,6 +1983,8 @@ def get_orders(request):
                 'updatedAt': updated_at_value,
                 **extra
             }
+            if include_history:
+                order_dict['trackingHistory'] = histories.get(order.id, [])
             if 'total' not in order_dict:
                 order_dict['total'] = order_dict.get('totalAmount')
             if 'date' not in order_dict:
@@ -1795,15 +2009,27 @@ def get_orders(request):
                     order_dict['dateDisplay'] = order_dict.get('createdAt')
             orders_data.append(order_dict)
 
-        return JsonResponse({
+        payload = {
             'success': True,
             'orders': orders_data,
-            'total': len(orders_data)
-        })
+            'total': len(orders_data),
+            **(page or {}),
+        }
+        # Profile stats without shipping the whole history to the browser.
+        if str(request.GET.get('stats') or '').lower() in ('1', 'true', 'yes'):
+            active = (
+                OrderModel.objects.filter(email=email)
+                .exclude(status='cancelled')
+                .aggregate(count=Count('id'), spent=Sum('total_amount'))
+            )
+            payload['stats'] = {
+                'totalOrders': active['count'],
+                'totalSpent': float(active['spent'] or 0),
+            }
+        return JsonResponse(payload)
 
     except Exception as e:
-        print("\n🔥 ERROR IN get_orders():")
-        traceback.print_exc()
+        logger.exception("get_orders failed")
         return JsonResponse({
             "success": False,
             "message": str(e)
@@ -1939,13 +2165,10 @@ def broadcast_notification(request):
         max_targets = min(len(target_emails), 500)
         target_emails = target_emails[:max_targets]
 
-        delivered = 0
-        for target in target_emails:
-            if category == 'offer':
-                notify_offer(target, title, message, send_immediately=send_immediately)
-            else:
-                notify_announcement(target, title, message, send_immediately=send_immediately)
-            delivered += 1
+        if category == 'offer':
+            delivered = broadcast_offer(target_emails, title, message, send_immediately=send_immediately)
+        else:
+            delivered = broadcast_announcement(target_emails, title, message, send_immediately=send_immediately)
 
         return JsonResponse({
             'success': True,
@@ -1958,23 +2181,131 @@ def broadcast_notification(request):
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
 
+@csrf_exempt
+@login_required(login_url='/login/')
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+@require_http_methods(["GET"])
+def order_metrics(request):
+    """
+    Staff-only dashboard metrics from the materialized counters (cheap to poll).
+    Optional query params: ?days=14 (daily rollup window, max 90)
+    """
+    try:
+        try:
+            days = int(request.GET.get('days', 14))
+        except (TypeError, ValueError):
+            days = 14
+        days = max(1, min(days, 90))
+        response = JsonResponse({'success': True, 'metrics': get_order_metrics(days=days)})
+        response['Cache-Control'] = 'private, max-age=5'
+        return response
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=500)
+
+
 # ==========================================
 # ADMIN MONGO USER MANAGEMENT
 # ==========================================
 
+# Only these fields ever leave the users collection (never password or inline avatar blobs).
+MONGO_USER_LIST_FIELDS = ('email', 'firstName', 'lastName', 'phone', 'address', 'createdAt', 'updatedAt')
+MONGO_USER_PAGE_SIZE = 50
+MONGO_USER_MAX_PAGE_SIZE = 200
+
+
+def _mongo_user_projection(requested):
+    """Build a projection from the ?fields= list, restricted to the whitelist."""
+    fields = [f.strip() for f in str(requested or '').split(',') if f.strip()]
+    fields = [f for f in fields if f in MONGO_USER_LIST_FIELDS] or list(MONGO_USER_LIST_FIELDS)
+    if 'email' not in fields:
+        fields.insert(0, 'email')
+    return fields, {f: 1 for f in fields}
+
+
+def _serialize_mongo_user(user, fields):
+    row = {'_id': str(user.get('_id')) if user.get('_id') is not None else None}
+    for field in fields:
+        value = user.get(field)
+        row[field] = value.isoformat() if hasattr(value, 'isoformat') else value
+    return row
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def _stream_mongo_users(users, fields, export_format):
+    if export_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(['_id', *fields])
+        for user in users:
+            row = _serialize_mongo_user(user, fields)
+            yield writer.writerow([row['_id'], *[
+                '' if row[f] is None else row[f] for f in fields
+            ]])
+    else:
+        for user in users:
+            yield json.dumps(_serialize_mongo_user(user, fields), default=str) + '\n'
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff or u.is_superuser)
 @csrf_exempt
 @require_http_methods(["GET"])
 def admin_mongo_users(request):
-    """List MongoDB users for admin dashboard (excludes passwords)."""
+    """
+    List MongoDB users for admin dashboard (whitelisted fields only).
+    Query params:
+      ?limit=50            page size (max 200)
+      ?after=<cursor>      cursor from the previous page's nextCursor
+      ?q=<email prefix>    case-insensitive email prefix search, paged on (emailLower, _id)
+      ?fields=email,phone  subset of the listing whitelist
+      ?format=ndjson|csv   stream every matching user instead of one page
+    """
     try:
-        db = get_database()
-        users = list(db['users'].find({}, {'password': 0}))
-        for user in users:
-            if '_id' in user:
-                user['_id'] = str(user['_id'])
-        return JsonResponse({'users': users})
+        fields, projection = _mongo_user_projection(request.GET.get('fields'))
+        email_prefix = User.normalize_email(request.GET.get('q'))
+        export_format = str(request.GET.get('format') or 'json').strip().lower()
+
+        if export_format in ('ndjson', 'csv'):
+            users = User.iter_users(email_prefix=email_prefix or None, projection=projection)
+            content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+            response = StreamingHttpResponse(
+                _stream_mongo_users(users, fields, export_format),
+                content_type=content_type,
+            )
+            response['Content-Disposition'] = f'attachment; filename="mongo-users.{export_format}"'
+            return response
+        if export_format != 'json':
+            return JsonResponse({'message': 'Unsupported format'}, status=400)
+
+        try:
+            limit = int(request.GET.get('limit', MONGO_USER_PAGE_SIZE))
+        except (TypeError, ValueError):
+            limit = MONGO_USER_PAGE_SIZE
+        limit = max(1, min(limit, MONGO_USER_MAX_PAGE_SIZE))
+
+        after = str(request.GET.get('after') or '').strip() or None
+        if after:
+            try:
+                User.parse_cursor(after)
+            except ValueError:
+                return JsonResponse({'message': 'Invalid cursor'}, status=400)
+
+        users, next_cursor = User.find_page(
+            after=after,
+            email_prefix=email_prefix or None,
+            limit=limit,
+            projection=projection,
+        )
+        return JsonResponse({
+            'users': [_serialize_mongo_user(u, fields) for u in users],
+            'nextCursor': next_cursor,
+            'hasMore': next_cursor is not None,
+        })
     except Exception as e:
         return JsonResponse({'message': str(e)}, status=500)
 
@@ -1991,6 +2322,7 @@ def admin_mongo_user_detail(request, email):
         if request.method == "DELETE":
             db = get_database()
             result = db['users'].delete_one({'email': email})
+            invalidate_user_summary(email)
             if result.deleted_count == 0:
                 return JsonResponse({'message': 'User not found'}, status=404)
             return JsonResponse({'message': 'User deleted'})
@@ -2005,6 +2337,7 @@ def admin_mongo_user_detail(request, email):
             return JsonResponse({'message': 'No fields to update'}, status=400)
 
         User.update(email, update_fields)
+        invalidate_user_summary(email)
         updated = User.find_by_email(email)
         if updated and '_id' in updated:
             updated['_id'] = str(updated['_id'])
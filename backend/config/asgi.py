@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+Serve the app through this module (e.g. `uvicorn config.asgi:application`) so the
+async order event stream at /api/orders/events/ keeps idle connections on the event
+loop instead of tying up a WSGI worker per open tab.
 """
 
 import os
@@ -45,12 +45,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.products.logs.RequestIdMiddleware',
+    'apps.products.perf.PerformanceMiddleware',
+    'apps.products.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.products.traffic.TrafficCaptureMiddleware',
+    'apps.products.profiling.ProfilingMiddleware',
+    'apps.products.memory.MemoryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -143,6 +149,10 @@ _load_dotenv()
 # Razorpay (server-side only; never expose secret to frontend)
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', '').strip()
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '').strip()
+# Optional API base URL override (e.g. a local fake gateway for tests/benchmarks)
+RAZORPAY_API_BASE_URL = os.environ.get('RAZORPAY_API_BASE_URL', '').strip()
+# Secret configured on the Razorpay dashboard webhook (signs X-Razorpay-Signature)
+RAZORPAY_WEBHOOK_SECRET = os.environ.get('RAZORPAY_WEBHOOK_SECRET', '').strip()
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
@@ -195,6 +205,233 @@ EMAIL_LOGO_PATH = os.environ.get(
     str(BASE_DIR.parent / 'frontend' / 'images' / 'logo.png')
 )
 
+# ==========================================
+# PERFORMANCE INSTRUMENTATION
+# ==========================================
+# PerformanceMiddleware adds Server-Timing (total/db/mongo/smtp/http) to responses and
+# logs one JSON line per request on apps.products.perf (WARNING at/above the slow mark).
+PERF_INSTRUMENTATION_ENABLED = os.environ.get('PERF_INSTRUMENTATION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', '1').lower() in ('1', 'true', 'yes')
+PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS', '1000'))
+
+# Slow ORM queries / Mongo commands are logged with their caller and query plan to a
+# rotating file (apps.products.slow_queries).
+SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', '1').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_MONGO_MS = float(os.environ.get('SLOW_MONGO_MS', '100'))
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', '1').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_EXPLAIN_INTERVAL = int(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', '300'))
+SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE', str(BASE_DIR / 'slow_queries.log'))
+
+# Opt-in capture of sanitized JSON API request envelopes (apps.products.traffic) for
+# `manage.py replay_traffic`. Values are reduced to shapes except for the keep-list keys.
+TRAFFIC_CAPTURE_ENABLED = os.environ.get('TRAFFIC_CAPTURE_ENABLED', '').lower() in ('1', 'true', 'yes')
+TRAFFIC_CAPTURE_FILE = os.environ.get('TRAFFIC_CAPTURE_FILE', str(BASE_DIR / 'traffic.log'))
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.environ.get('TRAFFIC_CAPTURE_SAMPLE_RATE', '1'))
+TRAFFIC_CAPTURE_PATH_PREFIX = '/api/'
+TRAFFIC_CAPTURE_USER_BUCKETS = int(os.environ.get('TRAFFIC_CAPTURE_USER_BUCKETS', '1000'))
+TRAFFIC_CAPTURE_KEEP_FIELDS = (
+    'action', 'amount', 'category', 'currency', 'id', 'limit', 'orderType', 'page', 'paymentMethod',
+    'price', 'qty', 'quantity', 'rating', 'size', 'status', 'subtotal', 'tax',
+)
+
+# ==========================================
+# LOGGING
+# ==========================================
+# Application loggers go through apps.products.logs.BackgroundHandler: records are queued
+# and written by a listener thread, so a slow stdout/disk never stalls a request. Lines
+# on the `app` handler are JSON with the request id; secrets are redacted, and only
+# LOG_INFO_SAMPLE_RATE of the INFO lines from LOG_SAMPLED_LOGGERS are kept.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_INFO_SAMPLE_RATE = float(os.environ.get('LOG_INFO_SAMPLE_RATE', '1'))
+LOG_SAMPLED_LOGGERS = ('apps.products.perf', 'apps.products.views')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'apps.products.logs.JsonFormatter'},
+        'raw': {'format': '%(message)s'},
+    },
+    'filters': {
+        'request_id': {'()': 'apps.products.logs.RequestIdFilter'},
+        'redact': {'()': 'apps.products.logs.RedactFilter'},
+        'sample': {
+            '()': 'apps.products.logs.SampleFilter',
+            'rate': LOG_INFO_SAMPLE_RATE,
+            'loggers': LOG_SAMPLED_LOGGERS,
+        },
+    },
+    'handlers': {
+        'app': {
+            'class': 'apps.products.logs.BackgroundHandler',
+            'queue_size': LOG_QUEUE_SIZE,
+            'formatter': 'json',
+            'filters': ['sample', 'redact', 'request_id'],
+        },
+        'slow_queries_file': {
+            'class': 'apps.products.logs.BackgroundHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'queue_size': LOG_QUEUE_SIZE,
+            'formatter': 'raw',
+        },
+        'traffic_capture_file': {
+            'class': 'apps.products.logs.BackgroundHandler',
+            'filename': TRAFFIC_CAPTURE_FILE,
+            'maxBytes': 50 * 1024 * 1024,
+            'backupCount': 5,
+            'queue_size': LOG_QUEUE_SIZE,
+            'formatter': 'raw',
+        },
+    },
+    'loggers': {
+        'apps': {
+            'handlers': ['app'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'apps.products.perf': {
+            'handlers': ['app'],
+            'level': os.environ.get('PERF_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'apps.products.slow_queries': {
+            'handlers': ['slow_queries_file'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'apps.products.traffic': {
+            'handlers': ['traffic_capture_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# ==========================================
+# METRICS
+# ==========================================
+# Prometheus text exposition at /api/metrics/. Scrapers authenticate with
+# `Authorization: Bearer $METRICS_TOKEN`, or connect from an address in METRICS_ALLOWED_IPS
+# (comma-separated; never list the reverse proxy's address). Staff sessions always work.
+# With several worker processes, point METRICS_MULTIPROC_DIR at a directory shared by
+# them (and emptied on server start) so every scrape reports the whole server.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR', '')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '5'))
+
+# ==========================================
+# COMPRESSION
+# ==========================================
+# Responses of these types and at least COMPRESSION_MIN_BYTES are sent br (if the brotli
+# package is installed) or gzip encoded; rendered HTML is whitespace-minified first.
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_CONTENT_TYPES = (
+    'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml',
+)
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '5'))
+COMPRESSION_MINIFY_HTML = os.environ.get('COMPRESSION_MINIFY_HTML', '1').lower() in ('1', 'true', 'yes')
+
+# ==========================================
+# PROFILING
+# ==========================================
+# Staff can profile a single request with `X-Profile: cprofile|sample` (or ?__profile=);
+# captures go to PROFILING_SPOOL_DIR and are listed at /staff-admin/profiles/.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '1').lower() in ('1', 'true', 'yes')
+PROFILING_SPOOL_DIR = os.environ.get('PROFILING_SPOOL_DIR', str(BASE_DIR / 'profiles'))
+PROFILING_MAX_CAPTURES = int(os.environ.get('PROFILING_MAX_CAPTURES', '50'))
+PROFILING_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILING_SAMPLE_INTERVAL_MS', '1'))
+
+# ==========================================
+# MEMORY DIAGNOSTICS
+# ==========================================
+# tracemalloc is off until staff start it at /api/staff/memory/ (or PYTHONTRACEMALLOC=<frames>
+# at boot). While tracing, requests whose allocation peak reaches MEMORY_ALERT_BYTES are
+# logged on apps.products.memory.
+MEMORY_TRACE_FRAMES = int(os.environ.get('MEMORY_TRACE_FRAMES', '10'))
+MEMORY_MAX_SNAPSHOTS = int(os.environ.get('MEMORY_MAX_SNAPSHOTS', '5'))
+MEMORY_ALERT_BYTES = int(os.environ.get('MEMORY_ALERT_BYTES', str(50 * 1024 * 1024)))
+
+# ==========================================
+# BACKGROUND TASKS
+# ==========================================
+# Post-commit follow-up work (notifications, stats, activity) runs on an in-process
+# thread pool; set BACKGROUND_TASKS_EAGER=1 to run it inline at commit time.
+BACKGROUND_TASK_WORKERS = int(os.environ.get('BACKGROUND_TASK_WORKERS', '4'))
+BACKGROUND_TASKS_EAGER = os.environ.get('BACKGROUND_TASKS_EAGER', '').lower() in ('1', 'true', 'yes')
+
+# ==========================================
+# LIVE ORDER EVENTS (SSE)
+# ==========================================
+# /api/orders/events/ is an async view; serve it through config.asgi for idle streams
+# that don't hold a worker thread. Streams end after ORDER_EVENTS_MAX_STREAM_SECONDS and
+# the browser reconnects with Last-Event-ID.
+ORDER_EVENTS_HEARTBEAT_SECONDS = 15
+ORDER_EVENTS_MAX_STREAM_SECONDS = 300
+ORDER_EVENTS_RETRY_MS = 3000
+# Staff feed: events arriving within this window go out as one diff; slow screens
+# beyond STAFF_FEED_QUEUE_SIZE pending diffs get a reset instead of a backlog.
+STAFF_FEED_COALESCE_SECONDS = 0.25
+STAFF_FEED_QUEUE_SIZE = 50
+
+# ==========================================
+# AVATAR STORAGE
+# ==========================================
+# Avatars live outside profile rows; profiles only store the content-hashed URL.
+# Point AVATAR_STORAGE_BACKEND at an AvatarStorage subclass for object storage.
+AVATAR_STORAGE_BACKEND = os.environ.get('AVATAR_STORAGE_BACKEND', 'apps.products.avatars.LocalAvatarStorage')
+AVATAR_ROOT = os.environ.get('AVATAR_ROOT', str(BASE_DIR / 'media' / 'avatars'))
+AVATAR_URL = '/api/avatars/'
+AVATAR_THUMBNAIL_SIZES = (256, 128, 48)  # first entry is the size profiles link to
+AVATAR_MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+
+# ==========================================
+# CACHE / OTP STORE
+# ==========================================
+# With REDIS_URL set, the default cache (and the OTP store) is shared across workers.
+REDIS_URL = os.environ.get('REDIS_URL', '').strip()
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+# Anonymous renders of the public and auth pages are cached per path and template hash;
+# set PAGE_CACHE_RELEASE (e.g. the deployed commit) to also drop them on every deploy.
+PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+PAGE_CACHE_SECONDS = int(os.environ.get('PAGE_CACHE_SECONDS', '600'))
+PAGE_CACHE_LOCAL_SECONDS = int(os.environ.get('PAGE_CACHE_LOCAL_SECONDS', '30'))
+PAGE_CACHE_LOCAL_ENTRIES = int(os.environ.get('PAGE_CACHE_LOCAL_ENTRIES', '64'))
+PAGE_CACHE_RELEASE = os.environ.get('PAGE_CACHE_RELEASE', '')
+# Profile/order-tracking pages render a cached user summary; orders are paged in by JS.
+USER_SUMMARY_CACHE_SECONDS = int(os.environ.get('USER_SUMMARY_CACHE_SECONDS', '300'))
+# Without a shared cache, OTPs fall back to the OTPToken table.
+OTP_STORE_BACKEND = os.environ.get('OTP_STORE_BACKEND') or (
+    'apps.products.otp.CacheOTPStore' if REDIS_URL else 'apps.products.otp.DatabaseOTPStore'
+)
+
+# ==========================================
+# RATE LIMITING
+# ==========================================
+# Sliding-window limits for OTP mail, login and signup, keyed by client IP and email.
+# The cache backend shares counters across workers when the cache is Redis.
+RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND', 'apps.products.ratelimit.CacheRateLimitBackend')
+# Only enable behind a proxy that overwrites X-Forwarded-For.
+RATELIMIT_TRUST_X_FORWARDED_FOR = os.environ.get('RATELIMIT_TRUST_X_FORWARDED_FOR', '').lower() in ('1', 'true', 'yes')
+RATELIMIT_RATES = {
+    'otp': {'ip': '10/m', 'email': '3/10m'},
+    'login': {'ip': '30/m', 'email': '10/5m'},
+    'signup': {'ip': '10/h'},
+}
+
 # Password reset OTP settings
 PASSWORD_RESET_OTP_EXPIRY_MINUTES = 5
 PASSWORD_RESET_OTP_MAX_ATTEMPTS = 5
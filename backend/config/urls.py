@@ -10,7 +10,7 @@ from apps.products.template_views import (
     login, signup, forgot_password, reset_password,
     customer_profile, order_tracking,
     admin_login, admin_signup, admin_forgot_password,
-    admin_reset_password, admin_dashboard, admin_mongo_users
+    admin_reset_password, admin_dashboard, admin_mongo_users, admin_profiles
 )
 
 # Base directory of the project (parent of `backend`)
@@ -50,6 +50,7 @@ urlpatterns = [
     
     # Admin Auth Pages
     path('staff-admin/mongo-users/', admin_mongo_users, name='admin_mongo_users'),
+    path('staff-admin/profiles/', admin_profiles, name='admin_profiles'),
     path('staff-admin/login/', admin_login, name='admin_login'),
     path('staff-admin/signup/', admin_signup, name='admin_signup'),
     path('staff-admin/forgot-password/', admin_forgot_password, name='admin_forgot_password'),
@@ -4,18 +4,124 @@ Provides minimal abstraction layer for common database operations.
 """
 
 from database.mongo import get_database
-from datetime import datetime, timedelta
+from datetime import datetime
+import re
 from bson.objectid import ObjectId
+from pymongo import ASCENDING, IndexModel
 
 
 class User:
     """User model for authentication and profile management"""
+
+    _indexes_ready = False
+
+    @classmethod
+    def ensure_indexes(cls):
+        """Create the email lookup and email search indexes (once per process)"""
+        if cls._indexes_ready:
+            return
+        db = get_database()
+        db['users'].create_indexes([
+            IndexModel([('email', ASCENDING)], name='email_1'),
+            IndexModel([('emailLower', ASCENDING), ('_id', ASCENDING)], name='emailLower_1__id_1'),
+        ])
+        cls._indexes_ready = True
+
+    @staticmethod
+    def normalize_email(email):
+        """Lowercased, trimmed form of an email (or email prefix) used for searching"""
+        return str(email or '').strip().lower()
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """
+        Split a listing cursor into (ObjectId, emailLower or None).
+        Raises ValueError for anything find_page did not produce.
+        """
+        object_id, separator, email_lower = str(cursor).partition(':')
+        if not ObjectId.is_valid(object_id):
+            raise ValueError('Invalid cursor')
+        return ObjectId(object_id), (email_lower if separator else None)
+
+    @staticmethod
+    def _listing_filter(after=None, email_prefix=None):
+        query = {}
+        if email_prefix:
+            # Anchored prefix regex on the lowercased copy: case-insensitive, and MongoDB
+            # still turns it into bounds on the (emailLower, _id) index
+            query['emailLower'] = {'$regex': '^' + re.escape(User.normalize_email(email_prefix))}
+        if after:
+            after_id, after_email = User.parse_cursor(after)
+            if email_prefix and after_email is not None:
+                query['$or'] = [
+                    {'emailLower': {'$gt': after_email}},
+                    {'emailLower': after_email, '_id': {'$gt': after_id}},
+                ]
+            else:
+                query['_id'] = {'$gt': after_id}
+        return query
+
+    @staticmethod
+    def _listing_sort(email_prefix=None):
+        if email_prefix:
+            return [('emailLower', ASCENDING), ('_id', ASCENDING)]
+        return [('_id', ASCENDING)]
+
+    @staticmethod
+    def find_page(after=None, email_prefix=None, limit=50, projection=None):
+        """
+        Keyset-paginated user listing: ordered by _id, or by (emailLower, _id) when
+        searching so the search is served from the compound index.
+        Returns (users, next_cursor); next_cursor is None on the last page.
+        """
+        User.ensure_indexes()
+        db = get_database()
+        if email_prefix and projection:
+            projection = {**projection, 'emailLower': 1}
+        cursor = (
+            db['users']
+            .find(User._listing_filter(after, email_prefix), projection)
+            .sort(User._listing_sort(email_prefix))
+            .limit(limit + 1)
+        )
+        users = list(cursor)
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            last = users[-1]
+            next_cursor = str(last['_id'])
+            if email_prefix:
+                next_cursor += ':' + last.get('emailLower', '')
+        return users, next_cursor
+
+    @staticmethod
+    def iter_users(email_prefix=None, projection=None, batch_size=500):
+        """Yield users one by one straight from the cursor (for streaming exports)"""
+        User.ensure_indexes()
+        db = get_database()
+        cursor = (
+            db['users']
+            .find(User._listing_filter(None, email_prefix), projection)
+            .sort(User._listing_sort(email_prefix))
+            .batch_size(batch_size)
+        )
+        try:
+            for user in cursor:
+                yield user
+        finally:
+            cursor.close()
     
     @staticmethod
-    def find_by_email(email):
+    def find_by_email(email, projection=None):
         """Find user by email"""
         db = get_database()
-        return db['users'].find_one({'email': email})
+        return db['users'].find_one({'email': email}, projection)
+
+    @staticmethod
+    def find_by_emails(emails, projection=None):
+        """Find users for many emails in one query"""
+        db = get_database()
+        return list(db['users'].find({'email': {'$in': list(emails)}}, projection))
     
     @staticmethod
     def create(firstName, lastName, email, phone, password_hash):
@@ -25,6 +131,7 @@ class User:
             'firstName': firstName,
             'lastName': lastName,
             'email': email,
+            'emailLower': User.normalize_email(email),
             'phone': phone,
             'password': password_hash,
             'createdAt': datetime.now(),
@@ -49,47 +156,6 @@ class User:
         return db['users'].find_one({'_id': ObjectId(user_id)})
 
 
-class OTP:
-    """OTP model for password reset and verification"""
-    
-    @staticmethod
-    def create(email, otp, expiry_minutes=10):
-        """Create OTP record"""
-        db = get_database()
-        otp_record = {
-            'email': email,
-            'otp': str(otp),
-            'createdAt': datetime.now(),
-            'expiresAt': datetime.now() + timedelta(minutes=expiry_minutes),
-            'verified': False
-        }
-        db['otps'].insert_one(otp_record)
-    
-    @staticmethod
-    def verify(email, otp):
-        """Verify OTP for email"""
-        db = get_database()
-        otp_record = db['otps'].find_one({
-            'email': email,
-            'otp': str(otp),
-            'expiresAt': {'$gt': datetime.now()}
-        })
-        
-        if otp_record:
-            db['otps'].update_one({'_id': otp_record['_id']}, {'$set': {'verified': True}})
-            return True
-        return False
-    
-    @staticmethod
-    def get_latest(email):
-        """Get latest OTP for email"""
-        db = get_database()
-        return db['otps'].find_one(
-            {'email': email},
-            sort=[('createdAt', -1)]
-        )
-
-
 class Order:
     """Order model for order management"""
     
@@ -1,7 +1,34 @@
+import threading
+
 from pymongo import MongoClient
 
 
+MONGO_URI = "mongodb://localhost:27017/"
+DATABASE_NAME = "coffeekaafihai_db"
+_client = None
+_client_lock = threading.Lock()
+_event_listeners = []
+
+
+def add_event_listener(listener):
+    """
+    Attach a pymongo CommandListener to the shared client (one per listener class).
+    Apps register theirs from AppConfig.ready(), before the first get_client() call.
+    """
+    with _client_lock:
+        if not any(type(existing) is type(listener) for existing in _event_listeners):
+            _event_listeners.append(listener)
+
+
+def get_client():
+    """Return the process-wide MongoClient (it pools connections; never create one per call)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(MONGO_URI, event_listeners=list(_event_listeners))
+    return _client
+
+
 def get_database():
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client["coffeekaafihai_db"]
-    return db
+    return get_client()[DATABASE_NAME]
@@ -0,0 +1,276 @@
+"""
+Drive concurrent virtual shoppers through the checkout flow and report per-step latency.
+
+    python scripts/load_test_checkout.py --shoppers 50 --concurrency 10
+    python scripts/load_test_checkout.py --orders 3 --gateway-delay-ms 150 --smtp-delay-ms 80
+    python scripts/load_test_checkout.py --json results/checkout-1.4.json
+
+Each shopper runs signup -> login -> (checkout -> verify -> order listing) x --orders.
+Everything runs in this process: the app is served by Django's threaded WSGI server on a
+throwaway SQLite database, Razorpay by a local HTTP fake, SMTP by a local sink and MongoDB
+by the in-memory stand-in from apps.products.testing. Network latency of the real
+services is excluded unless added with the --*-delay-ms options, so compare results
+produced with the same options. Post-commit work (notifications, loyalty stats) runs on
+the normal background pool; the sink's message count shows how much of it finished.
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import django
+import requests
+
+# Ensure backend/ is on sys.path so config.settings can be imported
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+RAZORPAY_KEY_ID = 'rzp_test_loadtest'
+RAZORPAY_KEY_SECRET = 'loadtest_secret'
+STEPS = ('signup', 'login', 'checkout', 'verify', 'orders')
+PASSWORD = 'Checkout-Load-1'
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.error_samples = {}
+
+    def add(self, step, seconds, ok, detail=''):
+        with self._lock:
+            self.latencies[step].append(seconds)
+            if not ok:
+                self.errors[step] += 1
+                self.error_samples.setdefault(step, detail)
+
+    def summary(self, wall_seconds):
+        steps = {}
+        for step in STEPS:
+            values = sorted(self.latencies[step])
+            steps[step] = {
+                'count': len(values),
+                'errors': self.errors[step],
+                'rps': round(len(values) / wall_seconds, 2) if wall_seconds else 0,
+                'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+                'max_ms': round((values[-1] if values else 0) * 1000, 1),
+            }
+        return steps
+
+
+class Shopper:
+    def __init__(self, base_url, number, recorder, orders):
+        self.base_url = base_url
+        self.email = f"shopper{number}-{uuid.uuid4().hex[:6]}@loadtest.example.com"
+        self.recorder = recorder
+        self.orders = orders
+        self.session = requests.Session()
+
+    def _step(self, step, method, path, expected, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=60, **kwargs)
+        except requests.RequestException as exc:
+            self.recorder.add(step, time.perf_counter() - started, False, str(exc))
+            return None
+        elapsed = time.perf_counter() - started
+        ok = response.status_code == expected
+        self.recorder.add(step, elapsed, ok, '' if ok else f"{response.status_code} {response.text[:200]}")
+        return response.json() if ok else None
+
+    def run(self):
+        signup = self._step('signup', 'POST', '/api/auth/signup/', 201, json={
+            'firstName': 'Load', 'lastName': 'Shopper', 'email': self.email,
+            'phone': '9000000000', 'password': PASSWORD,
+        })
+        if signup is None:
+            return
+        if self._step('login', 'POST', '/api/auth/login/', 200, json={'email': self.email, 'password': PASSWORD}) is None:
+            return
+        for number in range(self.orders):
+            client_order_id = f"LOAD-{uuid.uuid4().hex[:10]}"
+            order = self._step('checkout', 'POST', '/api/payment/create-order/', 200, json={
+                'amount': 240,
+                'currency': 'INR',
+                'email': self.email,
+                'clientOrderId': client_order_id,
+                'items': [{'name': 'Cold Brew', 'qty': 2, 'price': 120}],
+                'orderType': 'pickup',
+            })
+            if order is None:
+                return
+            payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+            order_id = order['razorpay_order_id']
+            signature = hmac.new(
+                RAZORPAY_KEY_SECRET.encode(), f"{order_id}|{payment_id}".encode(), hashlib.sha256,
+            ).hexdigest()
+            verified = self._step('verify', 'POST', '/api/payment/verify-payment/', 200, json={
+                'razorpay_order_id': order_id,
+                'razorpay_payment_id': payment_id,
+                'razorpay_signature': signature,
+                'email': self.email,
+            })
+            if verified is None:
+                return
+            if self._step('orders', 'GET', '/api/orders/', 200) is None:
+                return
+
+
+def boot(args, razorpay_server, smtp_sink):
+    """Configure Django against the fakes and a fresh SQLite file; returns the WSGI server."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    os.environ.update({
+        'RAZORPAY_KEY_ID': RAZORPAY_KEY_ID,
+        'RAZORPAY_KEY_SECRET': RAZORPAY_KEY_SECRET,
+        'RAZORPAY_API_BASE_URL': razorpay_server.base_url,
+        'SLOW_QUERY_LOG_ENABLED': '0',
+    })
+    # Per-request lines from the app loggers would swamp the report (and the log listener
+    # thread would compete with the server). Warnings and errors still show, except perf's
+    # slow-request warnings: under load every request is slow, and the report has the numbers.
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('PERF_LOG_LEVEL', 'ERROR')
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    settings.DEBUG = False
+    settings.DATABASES['default'].update({
+        'NAME': args.db,
+        'OPTIONS': {'timeout': 30, 'transaction_mode': 'IMMEDIATE'},
+    })
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST, settings.EMAIL_PORT = smtp_sink.server_address
+    settings.EMAIL_USE_TLS = False
+    settings.EMAIL_HOST_USER = ''
+    settings.EMAIL_HOST_PASSWORD = ''
+    settings.DEFAULT_FROM_EMAIL = 'orders@loadtest.example.com'
+    settings.RATELIMIT_ENABLED = False
+
+    call_command('migrate', verbosity=0, interactive=False)
+
+    server = ThreadedWSGIServer(('127.0.0.1', args.port), WSGIRequestHandler)
+    server.daemon_threads = True
+    server.set_app(get_wsgi_application())
+    # get_wsgi_application() re-runs logging setup; the dev server's access log is not
+    # covered by LOG_LEVEL, so silence it here.
+    logging.getLogger('django.server').setLevel(logging.ERROR)
+    return server
+
+
+def _wait_for_mail(smtp_sink, timeout=15):
+    """Give post-commit notification work a moment to drain (stops once the count settles)."""
+    deadline = time.monotonic() + timeout
+    last = -1
+    while time.monotonic() < deadline and smtp_sink.messages != last:
+        last = smtp_sink.messages
+        time.sleep(1)
+    return smtp_sink.messages
+
+
+def print_report(config, steps, wall_seconds, mail_count):
+    print(
+        f"shoppers={config['shoppers']} concurrency={config['concurrency']} orders={config['orders']} "
+        f"gateway_delay_ms={config['gateway_delay_ms']} smtp_delay_ms={config['smtp_delay_ms']}"
+    )
+    print(f"{'step':<10}{'count':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for step, row in steps.items():
+        print(
+            f"{step:<10}{row['count']:>7}{row['errors']:>8}{row['rps']:>9}"
+            f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}"
+        )
+    total = sum(row['count'] for row in steps.values())
+    print(f"wall={wall_seconds:.2f}s requests={total} throughput={total / wall_seconds:.1f} req/s emails={mail_count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--shoppers', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=5)
+    parser.add_argument('--orders', type=int, default=1, help='checkout/verify/list cycles per shopper')
+    parser.add_argument('--gateway-delay-ms', type=int, default=0)
+    parser.add_argument('--smtp-delay-ms', type=int, default=0)
+    parser.add_argument('--port', type=int, default=0, help='app server port (default: any free port)')
+    parser.add_argument('--db', default='', help='SQLite file to use (default: a temporary file)')
+    parser.add_argument('--json', default='', help='also write the results to this file')
+    args = parser.parse_args()
+
+    from apps.products.testing import FakeRazorpayServer, SMTPSink, fake_mongo
+
+    razorpay_server = FakeRazorpayServer(delay=args.gateway_delay_ms / 1000)
+    smtp_sink = SMTPSink(delay=args.smtp_delay_ms / 1000)
+    for server in (razorpay_server, smtp_sink):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        args.db = args.db or str(Path(tmp_dir) / 'loadtest.sqlite3')
+        app_server = boot(args, razorpay_server, smtp_sink)
+        threading.Thread(target=app_server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{app_server.server_address[1]}"
+
+        recorder = Recorder()
+        with fake_mongo():
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                shoppers = [Shopper(base_url, number, recorder, args.orders) for number in range(args.shoppers)]
+                list(executor.map(Shopper.run, shoppers))
+            wall_seconds = time.perf_counter() - started
+            mail_count = _wait_for_mail(smtp_sink)
+
+        app_server.shutdown()
+        from django.db import connections
+        connections.close_all()
+
+    for server in (razorpay_server, smtp_sink):
+        server.shutdown()
+        server.server_close()
+
+    config = {
+        'shoppers': args.shoppers,
+        'concurrency': args.concurrency,
+        'orders': args.orders,
+        'gateway_delay_ms': args.gateway_delay_ms,
+        'smtp_delay_ms': args.smtp_delay_ms,
+    }
+    steps = recorder.summary(wall_seconds)
+    print_report(config, steps, wall_seconds, mail_count)
+    for step, detail in recorder.error_samples.items():
+        print(f"first {step} error: {detail}")
+
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps({
+            'config': config,
+            'wall_seconds': round(wall_seconds, 3),
+            'emails': mail_count,
+            'steps': steps,
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -419,36 +419,54 @@ function saveCoffeePreferences() {
    Purpose: Handle order creation, retrieval, and filtering
 ========================================================= */
 
+// Orders per request on the profile and tracking pages; "Load more" fetches the next page.
+const ORDERS_PAGE_SIZE = 20;
+
+function getCurrentOrdersUserId() {
+    // Guests should have no orders
+    const isLoggedIn = localStorage.getItem('isLoggedIn') === 'true';
+    if (!isLoggedIn) return null;
+    return localStorage.getItem('currentUser') || localStorage.getItem('userId') || localStorage.getItem('userEmail') || null;
+}
+
 /**
- * Get all orders for the current logged-in user
+ * Give every fetched order a stable orderId (remembered per user in localStorage)
+ * @param {string} userId - Current user
+ * @param {Array} orders - Orders from /api/orders/
+ * @returns {Array} The same orders
+ */
+function normalizeFetchedOrders(userId, orders) {
+    const existingIds = new Set();
+    const orderIdMap = loadOrderIdMap(userId);
+    let mapDirty = false;
+    orders.forEach(order => {
+        if (ensureOrderIdOnce(order, existingIds, orderIdMap)) {
+            mapDirty = true;
+        }
+    });
+    if (mapDirty) {
+        saveOrderIdMap(userId, orderIdMap);
+    }
+    return orders;
+}
+
+/**
+ * Get every order for the current logged-in user (PDF export only; pages use getOrdersPage)
+ * @param {Object} [options] - { history: true } to include each order's trackingHistory
  * @returns {Promise<Array>} Array of order objects
  */
-async function getAllOrders() {
+async function getAllOrders(options = {}) {
     try {
-        // Guests should have no orders
-        const isLoggedIn = localStorage.getItem('isLoggedIn') === 'true';
-        if (!isLoggedIn) return [];
-
-        const userId = localStorage.getItem('currentUser') || localStorage.getItem('userId') || localStorage.getItem('userEmail');
+        const userId = getCurrentOrdersUserId();
         if (!userId) return [];
         
         // MongoDB Query: db.collection("orders").find({ email: userId })
-        const response = await fetch('/api/orders/', { credentials: 'same-origin' });
+        // Status history is opt-in on the API; only the tracking timeline asks for it.
+        const url = options.history ? '/api/orders/?history=1' : '/api/orders/';
+        const response = await fetch(url, { credentials: 'same-origin' });
         if (response.ok) {
             const data = await response.json();
-            const orders = Array.isArray(data.orders) ? data.orders : [];
-            const existingIds = new Set();
-            const orderIdMap = loadOrderIdMap(userId);
-            let mapDirty = false;
-            orders.forEach(order => {
-                if (ensureOrderIdOnce(order, existingIds, orderIdMap)) {
-                    mapDirty = true;
-                }
-            });
-            if (mapDirty) {
-                saveOrderIdMap(userId, orderIdMap);
-            }
-            return orders;
+            return normalizeFetchedOrders(userId, Array.isArray(data.orders) ? data.orders : []);
         }
         return [];
     } catch (e) {
@@ -457,15 +475,53 @@ async function getAllOrders() {
     }
 }
 
+/**
+ * Get one page of the current user's orders, newest first
+ * @param {Object} [options]
+ * @param {number} [options.limit=ORDERS_PAGE_SIZE] - Orders per page
+ * @param {number} [options.offset=0] - nextOffset from the previous page
+ * @param {boolean} [options.history] - Include each order's trackingHistory
+ * @param {boolean} [options.stats] - Include { totalOrders, totalSpent } for non-cancelled orders
+ * @param {string} [options.orderId] - Only this order (clientOrderId or database id)
+ * @returns {Promise<Object>} { orders, hasMore, nextOffset, stats }
+ */
+async function getOrdersPage(options = {}) {
+    const empty = { orders: [], hasMore: false, nextOffset: null, stats: null };
+    try {
+        const userId = getCurrentOrdersUserId();
+        if (!userId) return empty;
+
+        const params = new URLSearchParams({
+            limit: String(options.limit || ORDERS_PAGE_SIZE),
+            offset: String(options.offset || 0)
+        });
+        if (options.history) params.set('history', '1');
+        if (options.stats) params.set('stats', '1');
+        if (options.orderId) params.set('orderId', options.orderId);
+
+        const response = await fetch(`/api/orders/?${params}`, { credentials: 'same-origin' });
+        if (!response.ok) return empty;
+        const data = await response.json();
+        return {
+            orders: normalizeFetchedOrders(userId, Array.isArray(data.orders) ? data.orders : []),
+            hasMore: !!data.hasMore,
+            nextOffset: data.hasMore ? data.nextOffset : null,
+            stats: data.stats || null
+        };
+    } catch (e) {
+        console.error('Error loading orders page:', e);
+        return empty;
+    }
+}
+
 /**
  * Get recent orders with optional limit
  * @param {number} limit - Number of orders to return
  * @returns {Promise<Array>} Array of recent order objects
  */
 async function getRecentOrders(limit = 3) {
-    const allOrders = await getAllOrders();
-    allOrders.sort((a, b) => new Date(b.date) - new Date(a.date));
-    return allOrders.slice(0, limit);
+    const page = await getOrdersPage({ limit });
+    return page.orders;
 }
 
 /**
@@ -513,17 +569,10 @@ async function filterOrdersByDateRange(startDate, endDate) {
  * @returns {Promise<Object>} Statistics object with totalOrders, points, memberTier, totalSpent
  */
 async function calculateProfileStats() {
-    const allOrders = await getAllOrders();
-    
-    // FIX ISSUE 3: Only count non-cancelled orders for stats
-    const activeOrders = allOrders.filter(order => order.status !== 'cancelled');
-    const totalOrders = activeOrders.length;
-    
-    const totalSpent = activeOrders.reduce((sum, order) => sum + (
-        (typeof order.total === 'number') ? order.total : (
-            (typeof order.totalAmount === 'number') ? order.totalAmount : Number(order.totalAmount || order.total || order.amount || 0)
-        )
-    ), 0);
+    // FIX ISSUE 3: Only count non-cancelled orders for stats (the server sums them)
+    const page = await getOrdersPage({ limit: 1, stats: true });
+    const totalOrders = page.stats ? page.stats.totalOrders : 0;
+    const totalSpent = page.stats ? page.stats.totalSpent : 0;
     const points = Math.floor(totalSpent / 10);
     
     let memberTier = 'Bronze';
@@ -687,9 +736,127 @@ function generateOrderId(existingIds, data) {
     return candidate;
 }
 
+/**
+ * Build the profile page's card for one order
+ * @param {Object} order - Order from /api/orders/
+ * @returns {string} HTML
+ */
+function renderProfileOrderItem(order) {
+    const displayOrderId = order.orderId || '';
+
+    // Get status text for display
+    function getStatusText(status) {
+        const statusMap = {
+            'pending': 'Order Placed',
+            'confirmed': 'Confirmed',
+            'preparing': 'Preparing',
+            'ready': 'Ready for Pickup',
+            'delivered': 'Delivered',
+            'cancelled': 'Cancelled'
+        };
+        return statusMap[status] || status;
+    }
+    
+    const orderStatus = order.status || (order.paymentStatus === 'paid' ? 'completed' : 'pending');
+    const statusText = getStatusText(orderStatus);
+    const statusClass = `status-${orderStatus}`;
+    
+    // Build items summary
+    let itemsSummary = '';
+    if (Array.isArray(order.items)) {
+        itemsSummary = order.items.map(i => `${i.name || i.title || 'Item'} x ${i.quantity || 1}`).join(', ');
+    } else {
+        itemsSummary = order.items || '';
+    }
+
+    const orderDateSource = order.createdAt || order.date || order.orderDate || order.dateDisplay || '';
+    const dateDisplay = formatOrderDate(orderDateSource);
+    
+    function formatOrderDate(dateStr) {
+        const d = dateStr ? new Date(dateStr) : null;
+        if (!d || isNaN(d.getTime())) return '';
+        const parts = new Intl.DateTimeFormat('en-GB', {
+            timeZone: 'Asia/Kolkata',
+            day: '2-digit',
+            month: 'short',
+            year: 'numeric',
+            hour: 'numeric',
+            minute: '2-digit',
+            hour12: true
+        }).formatToParts(d);
+        const map = {};
+        parts.forEach(p => { map[p.type] = p.value; });
+        const dayPeriod = (map.dayPeriod || '').toLowerCase();
+        return `${map.day} ${map.month} ${map.year}, ${map.hour}:${map.minute} ${dayPeriod}`.trim();
+    }
+    
+    const totalAmount = (typeof order.total === 'number') ? order.total : 
+                       (typeof order.totalAmount === 'number') ? order.totalAmount : 
+                       (order.total ? Number(order.total) : 
+                       (order.totalAmount ? Number(order.totalAmount) : 
+                       (order.subtotal ? order.subtotal + (order.tax || 0) : 0)));
+
+    const canCancel = order.status !== 'delivered' && order.status !== 'cancelled';
+
+    const orderHTML = `
+        <div class="order-item">
+            <div class="order-header">
+                <span class="order-id">${displayOrderId}</span>
+                <span class="order-status ${statusClass}">${statusText}</span>
+            </div>
+            <div class="order-details">
+                <p class="mb-1">${itemsSummary}</p>
+                <small class="text-muted">${dateDisplay}</small>
+            </div>
+            <div class="order-total">Total: ₹${totalAmount}</div>
+            <div style="margin-top:12px;display:flex;gap:10px;flex-wrap:wrap">
+                <a href="/order-tracking/?orderId=${encodeURIComponent(displayOrderId)}" class="btn btn-sm" style="background:linear-gradient(135deg,#6f4e37,#8b5e3c);color:#fff;border-radius:12px;padding:8px 14px;text-decoration:none">&nbsp;<i class="fas fa-route"></i>&nbsp;Track</a>
+                ${canCancel ? `<button class="btn btn-sm btn-danger profile-cancel-order" data-order-id="${displayOrderId}" style="padding:8px 14px;border-radius:12px">&nbsp;<i class="fas fa-times-circle"></i>&nbsp;Cancel</button>` : ''}
+            </div>
+        </div>
+    `;
+    return orderHTML;
+}
+
+/**
+ * Append orders to the container, wiring only the new cards' cancel buttons
+ * @param {HTMLElement} ordersContainer - recentOrdersContainer
+ * @param {Array} orders - Orders to append
+ * @param {number} limit - Display limit for refresh after cancel
+ */
+function appendProfileOrderItems(ordersContainer, orders, limit) {
+    const chunk = document.createElement('div');
+    chunk.innerHTML = orders.map(renderProfileOrderItem).join('');
+    ordersContainer.appendChild(chunk);
+    attachCancelOrderHandlers(chunk, limit);
+}
+
+/**
+ * Add a "Load more orders" button that fetches the page starting at nextOffset
+ * @param {HTMLElement} ordersContainer - recentOrdersContainer
+ * @param {number} nextOffset - Offset of the next page
+ */
+function appendLoadMoreOrdersButton(ordersContainer, nextOffset) {
+    const button = document.createElement('button');
+    button.type = 'button';
+    button.className = 'btn btn-sm load-more-orders';
+    button.style.cssText = 'margin-top:12px;border-radius:12px;padding:8px 14px;border:1px solid #8b5e3c;color:#6f4e37;background:#fff';
+    button.innerHTML = '<i class="fas fa-chevron-down"></i>&nbsp;Load more orders';
+    button.addEventListener('click', async () => {
+        button.disabled = true;
+        const page = await getOrdersPage({ offset: nextOffset });
+        button.remove();
+        appendProfileOrderItems(ordersContainer, page.orders);
+        if (page.hasMore) {
+            appendLoadMoreOrdersButton(ordersContainer, page.nextOffset);
+        }
+    });
+    ordersContainer.appendChild(button);
+}
+
 /**
  * Display recent orders in the UI
- * @param {number} limit - Optional limit for number of orders to display
+ * @param {number} limit - Optional limit; without it the first page is shown with "Load more"
  */
 async function displayRecentOrders(limit) {
     const ordersContainer = document.getElementById('recentOrdersContainer');
@@ -697,16 +864,11 @@ async function displayRecentOrders(limit) {
 
     ordersContainer.innerHTML = '';
 
-    let ordersToShow;
-    if (typeof limit === 'number') {
-        ordersToShow = await getRecentOrders(limit);
-    } else {
-        // Show all orders by default, sorted by date desc
-        const all = await getAllOrders();
-        ordersToShow = all.sort((a, b) => new Date(b.date) - new Date(a.date));
-    }
+    // Newest first from the API, one page at a time
+    const paged = typeof limit !== 'number';
+    const page = await getOrdersPage({ limit: paged ? ORDERS_PAGE_SIZE : limit });
 
-    if (!ordersToShow || ordersToShow.length === 0) {
+    if (page.orders.length === 0) {
         ordersContainer.innerHTML = `
             <div class="no-orders">
                 <i class="fas fa-coffee"></i>
@@ -717,85 +879,10 @@ async function displayRecentOrders(limit) {
         return;
     }
 
-    ordersToShow.forEach(order => {
-        const displayOrderId = order.orderId || '';
-
-        // Get status text for display
-        function getStatusText(status) {
-            const statusMap = {
-                'pending': 'Order Placed',
-                'confirmed': 'Confirmed',
-                'preparing': 'Preparing',
-                'ready': 'Ready for Pickup',
-                'delivered': 'Delivered',
-                'cancelled': 'Cancelled'
-            };
-            return statusMap[status] || status;
-        }
-        
-        const orderStatus = order.status || (order.paymentStatus === 'paid' ? 'completed' : 'pending');
-        const statusText = getStatusText(orderStatus);
-        const statusClass = `status-${orderStatus}`;
-        
-        // Build items summary
-        let itemsSummary = '';
-        if (Array.isArray(order.items)) {
-            itemsSummary = order.items.map(i => `${i.name || i.title || 'Item'} x ${i.quantity || 1}`).join(', ');
-        } else {
-            itemsSummary = order.items || '';
-        }
-
-        const orderDateSource = order.createdAt || order.date || order.orderDate || order.dateDisplay || '';
-        const dateDisplay = formatOrderDate(orderDateSource);
-        
-        function formatOrderDate(dateStr) {
-            const d = dateStr ? new Date(dateStr) : null;
-            if (!d || isNaN(d.getTime())) return '';
-            const parts = new Intl.DateTimeFormat('en-GB', {
-                timeZone: 'Asia/Kolkata',
-                day: '2-digit',
-                month: 'short',
-                year: 'numeric',
-                hour: 'numeric',
-                minute: '2-digit',
-                hour12: true
-            }).formatToParts(d);
-            const map = {};
-            parts.forEach(p => { map[p.type] = p.value; });
-            const dayPeriod = (map.dayPeriod || '').toLowerCase();
-            return `${map.day} ${map.month} ${map.year}, ${map.hour}:${map.minute} ${dayPeriod}`.trim();
-        }
-        
-        const totalAmount = (typeof order.total === 'number') ? order.total : 
-                           (typeof order.totalAmount === 'number') ? order.totalAmount : 
-                           (order.total ? Number(order.total) : 
-                           (order.totalAmount ? Number(order.totalAmount) : 
-                           (order.subtotal ? order.subtotal + (order.tax || 0) : 0)));
-
-        const canCancel = order.status !== 'delivered' && order.status !== 'cancelled';
-
-        const orderHTML = `
-            <div class="order-item">
-                <div class="order-header">
-                    <span class="order-id">${displayOrderId}</span>
-                    <span class="order-status ${statusClass}">${statusText}</span>
-                </div>
-                <div class="order-details">
-                    <p class="mb-1">${itemsSummary}</p>
-                    <small class="text-muted">${dateDisplay}</small>
-                </div>
-                <div class="order-total">Total: ₹${totalAmount}</div>
-                <div style="margin-top:12px;display:flex;gap:10px;flex-wrap:wrap">
-                    <a href="/order-tracking/?orderId=${encodeURIComponent(displayOrderId)}" class="btn btn-sm" style="background:linear-gradient(135deg,#6f4e37,#8b5e3c);color:#fff;border-radius:12px;padding:8px 14px;text-decoration:none">&nbsp;<i class="fas fa-route"></i>&nbsp;Track</a>
-                    ${canCancel ? `<button class="btn btn-sm btn-danger profile-cancel-order" data-order-id="${displayOrderId}" style="padding:8px 14px;border-radius:12px">&nbsp;<i class="fas fa-times-circle"></i>&nbsp;Cancel</button>` : ''}
-                </div>
-            </div>
-        `;
-        ordersContainer.innerHTML += orderHTML;
-    });
-
-    // Attach cancel button handlers
-    attachCancelOrderHandlers(ordersContainer, limit);
+    appendProfileOrderItems(ordersContainer, page.orders, limit);
+    if (paged && page.hasMore) {
+        appendLoadMoreOrdersButton(ordersContainer, page.nextOffset);
+    }
     updateProfileStats();
 }
 
@@ -844,9 +931,9 @@ async function addNewOrder(orderData, options = {}) {
     // Preserve incoming orderData shape
     const newOrder = Object.assign({}, orderData || {});
 
-    // Ensure an orderId/id exists
-    const allOrders = await getAllOrders();
-    const safeOrders = Array.isArray(allOrders) ? allOrders : [];
+    // Ensure an orderId/id exists (checked against the latest page, not the whole history)
+    const { orders: recentOrders } = await getOrdersPage();
+    const safeOrders = Array.isArray(recentOrders) ? recentOrders : [];
     const existingIds = new Set(
         safeOrders
             .map(o => o.orderId)
@@ -950,10 +1037,20 @@ class OrdersManager {
 
     /**
      * Get all orders
+     * @param {Object} [options] - { history: true } to include each order's trackingHistory
      * @returns {Promise<Array>} Array of all orders
      */
-    async getOrders() {
-        return await getAllOrders();
+    async getOrders(options = {}) {
+        return await getAllOrders(options);
+    }
+
+    /**
+     * Get one page of orders, newest first
+     * @param {Object} [options] - See getOrdersPage: limit, offset, history, stats, orderId
+     * @returns {Promise<Object>} { orders, hasMore, nextOffset, stats }
+     */
+    async getOrdersPage(options = {}) {
+        return await getOrdersPage(options);
     }
 
     /**
@@ -963,8 +1060,8 @@ class OrdersManager {
      */
     async getOrderById(orderId) {
         // MongoDB Query: db.collection("orders").findOne(...)
-        const allOrders = await getAllOrders();
-        return allOrders.find(order => 
+        const page = await getOrdersPage({ orderId, limit: 1 });
+        return page.orders.find(order => 
             (order.orderId && order.orderId === orderId)
         );
     }
@@ -1054,7 +1151,8 @@ class OrdersManager {
                 action: 'update_status',
                 orderId: order._id || order.id || order.orderId || orderId,
                 clientOrderId: order.clientOrderId || order.orderId || null,
-                status: normalizedStatus
+                status: normalizedStatus,
+                includeHistory: true
             };
             const resp = await fetch('/api/orders/', {
                 method: 'POST',
@@ -1086,6 +1184,27 @@ class OrdersManager {
         return true;
     }
 
+    /**
+     * Subscribe to live status changes for the current user's orders (Server-Sent Events).
+     * The browser reconnects on its own and resumes from the last event id it saw.
+     * @param {function(Object)} onEvent - Called with { id, orderDbId, status, previousStatus, timestamp }
+     * @returns {function()} Unsubscribe function
+     */
+    subscribeToStatusEvents(onEvent) {
+        if (typeof EventSource === 'undefined' || localStorage.getItem('isLoggedIn') !== 'true') {
+            return () => {};
+        }
+        const source = new EventSource('/api/orders/events/', { withCredentials: true });
+        source.addEventListener('status', (e) => {
+            try {
+                onEvent(JSON.parse(e.data));
+            } catch (err) {
+                console.error('Error handling order event:', err);
+            }
+        });
+        return () => source.close();
+    }
+
     /**
      * Get human-readable status text
      * @param {string} status - Status code
@@ -2697,6 +2816,7 @@ window.DynamicProfileManager = {
     
     // Order Management
     getAllOrders,
+    getOrdersPage,
     getRecentOrders,
     filterOrdersByDateRange,
     calculateProfileStats,